@@ -12,6 +12,10 @@ import datetime
 import json
 from sqlalchemy.orm import Session
 import models
+import critical_path
+import recommendation_engine
+import risk_engine
+import working_calendar
 
 # Configuration
 USE_OPENAI = False  # Set to True to use OpenAI API
@@ -176,32 +180,26 @@ class AIAssistant:
     def suggest_schedule(
         subtasks: List[Dict[str, str]],
         start_date: datetime.date,
-        skip_weekends: bool = True
+        skip_weekends: bool = True,
+        holidays: Optional[List[datetime.date]] = None
     ) -> List[Dict[str, any]]:
         """
         Generate smart schedule for subtasks
         
+        Subtasks run back to back on the working calendar in half-day slots,
+        so a 0.5-day subtask can share a day with the next one. Weekends (if
+        skip_weekends) and holidays are skipped in closed form (working_calendar).
+        
         Returns: List of subtasks with planned_start and planned_end dates
         """
+        calendar = working_calendar.WorkingCalendar(holidays or [], skip_weekends=skip_weekends)
         scheduled_tasks = []
-        current_date = start_date
+        slot = calendar.slot_of(start_date)
         
         for subtask in subtasks:
-            task_start = current_date
-            
-            # Calculate end date based on estimated days
-            days = float(subtask.get("estimated_days", 1))
-            days_added = 0
-            task_end = task_start
-            
-            while days_added < days:
-                task_end += datetime.timedelta(days=1)
-                
-                # Skip weekends if needed
-                if skip_weekends and task_end.weekday() >= 5:  # Saturday = 5, Sunday = 6
-                    continue
-                
-                days_added += 1
+            slots = calendar.duration_slots(subtask.get("estimated_days", 1))
+            task_start = calendar.date_of_slot(slot)
+            task_end = calendar.date_of_slot(slot + slots - 1)
             
             scheduled_tasks.append({
                 "subtask_name": subtask["subtask_name"],
@@ -210,13 +208,8 @@ class AIAssistant:
                 "planned_end": task_end.strftime("%Y-%m-%d")
             })
             
-            # Next task starts after this one ends
-            current_date = task_end + datetime.timedelta(days=1)
-            
-            # Skip weekends for next task start
-            if skip_weekends:
-                while current_date.weekday() >= 5:
-                    current_date += datetime.timedelta(days=1)
+            # Next task starts in the next free half-day
+            slot += slots
         
         return scheduled_tasks
     
@@ -230,194 +223,28 @@ class AIAssistant:
         """
         Enhanced AI-powered resource recommendation
         
+        Scoring runs on the precomputed resource x skill matrix in
+        recommendation_engine (vectorized, incremental rebuild).
+        
         Returns: Top N recommended resources with match scores
         """
-        resources = db.query(models.Resource).filter(
-            models.Resource.is_active == True,
-            models.Resource.position.notin_(["Customer", "Vendor", "Other"])
-        ).all()
-        
-        if not resources:
-            return []
-        
-        scored_resources = []
-        
-        for resource in resources:
-            score = 0
-            reasons = []
-            
-            # Get current workload
-            tasks_old = db.query(models.Task).filter(
-                models.Task.assigned_resource_id == resource.id,
-                models.Task.actual_progress < 100
-            ).count()
-            
-            task_ids_new = db.query(models.TaskResource.task_id).filter(
-                models.TaskResource.resource_id == resource.id
-            ).all()
-            tasks_new = db.query(models.Task).filter(
-                models.Task.id.in_([t.task_id for t in task_ids_new]),
-                models.Task.actual_progress < 100
-            ).count()
-            
-            current_workload = tasks_old + tasks_new
-            
-            # 1. Skill Match (0-50 points)
-            # Parse skills if it's a string
-            resource_skills = resource.skills
-            if isinstance(resource_skills, str):
-                try:
-                    import json
-                    resource_skills = json.loads(resource_skills)
-                except:
-                    resource_skills = {}
-            elif not isinstance(resource_skills, dict):
-                resource_skills = {}
-            
-            if resource_skills and required_skills:
-                matched_skills = 0
-                total_skill_level = 0
-                
-                for skill in required_skills:
-                    skill_level = resource_skills.get(skill, 0)
-                    if skill_level > 0:
-                        matched_skills += 1
-                        total_skill_level += skill_level
-                        reasons.append(f"{skill}: {skill_level}/10")
-                
-                if matched_skills > 0:
-                    skill_score = (matched_skills / len(required_skills)) * 30
-                    skill_quality = (total_skill_level / matched_skills) * 2
-                    score += skill_score + skill_quality
-            
-            # 2. Speed Score (0-20 points)
-            if resource.speed_score:
-                score += resource.speed_score * 2
-                reasons.append(f"Speed: {resource.speed_score}/10")
-            
-            # 3. Quality Score (0-20 points)
-            if resource.quality_score:
-                score += resource.quality_score * 2
-                reasons.append(f"Quality: {resource.quality_score}/10")
-            
-            # 4. Workload Factor (0-10 points penalty)
-            # Less workload = higher score
-            if current_workload == 0:
-                workload_bonus = 10
-            elif current_workload <= 2:
-                workload_bonus = 5
-            elif current_workload <= 5:
-                workload_bonus = 0
-            else:
-                workload_bonus = -10
-            
-            score += workload_bonus
-            reasons.append(f"Current tasks: {current_workload}")
-            
-            scored_resources.append({
-                "resource": resource,
-                "score": score,
-                "reasons": reasons,
-                "current_workload": current_workload,
-                "match_percentage": min(score, 100)
-            })
-        
-        # Sort by score (descending)
-        scored_resources.sort(key=lambda x: x["score"], reverse=True)
-        
-        return scored_resources[:top_n]
+        return recommendation_engine.engine.recommend(db, required_skills, top_n=top_n)
     
     @staticmethod
     def predict_risk(task: models.Task, db: Session) -> Dict[str, any]:
         """
         Predict task risk level using AI
         
+        Uses the same batch code path as generate_insights (risk_engine).
+        
         Returns: Risk assessment with score and factors
         """
-        risk_score = 0
-        risk_factors = []
-        
-        # 1. Schedule Risk
-        if task.planned_end:
-            days_remaining = (task.planned_end - datetime.date.today()).days
-            
-            if days_remaining < 0:
-                risk_score += 40
-                risk_factors.append(f"⚠️ Overdue by {abs(days_remaining)} days")
-            elif days_remaining <= 2:
-                risk_score += 30
-                risk_factors.append(f"⚠️ Due in {days_remaining} days")
-            elif days_remaining <= 7:
-                risk_score += 15
-                risk_factors.append(f"⏰ Due in {days_remaining} days")
-        
-        # 2. Progress Risk
-        if task.planned_start and task.planned_end:
-            total_duration = (task.planned_end - task.planned_start).days
-            elapsed_duration = (datetime.date.today() - task.planned_start).days
-            
-            if total_duration > 0 and elapsed_duration > 0:
-                expected_progress = (elapsed_duration / total_duration) * 100
-                progress_gap = expected_progress - task.actual_progress
-                
-                if progress_gap > 30:
-                    risk_score += 30
-                    risk_factors.append(f"📉 {progress_gap:.0f}% behind schedule")
-                elif progress_gap > 15:
-                    risk_score += 15
-                    risk_factors.append(f"📊 {progress_gap:.0f}% behind schedule")
-        
-        # 3. Resource Risk
-        assigned_count = db.query(models.TaskResource).filter(
-            models.TaskResource.task_id == task.id
-        ).count()
-        
-        if assigned_count == 0 and not task.assigned_resource_id:
-            risk_score += 20
-            risk_factors.append("👤 No resource assigned")
-        
-        # 4. Dependency Risk (if task is blocked)
-        # (This would require a dependencies table - placeholder for now)
-        
-        # Determine risk level
-        if risk_score >= 70:
-            risk_level = "Critical"
-            risk_color = "red"
-        elif risk_score >= 50:
-            risk_level = "High"
-            risk_color = "orange"
-        elif risk_score >= 30:
-            risk_level = "Medium"
-            risk_color = "yellow"
-        else:
-            risk_level = "Low"
-            risk_color = "green"
-        
-        return {
-            "risk_score": min(risk_score, 100),
-            "risk_level": risk_level,
-            "risk_color": risk_color,
-            "risk_factors": risk_factors,
-            "recommendations": AIAssistant._get_risk_recommendations(risk_factors)
-        }
+        return risk_engine.score_tasks(db, [task])[0]
     
     @staticmethod
     def _get_risk_recommendations(risk_factors: List[str]) -> List[str]:
         """Generate recommendations based on risk factors"""
-        recommendations = []
-        
-        for factor in risk_factors:
-            if "Overdue" in factor or "Due in" in factor:
-                recommendations.append("🎯 Consider extending deadline or adding resources")
-            if "behind schedule" in factor:
-                recommendations.append("⚡ Increase task priority and check blockers")
-            if "No resource assigned" in factor:
-                recommendations.append("👥 Assign qualified resource immediately")
-        
-        if not recommendations:
-            recommendations.append("✅ Continue monitoring task progress")
-        
-        return recommendations
+        return risk_engine.risk_recommendations(risk_factors)
     
     @staticmethod
     def generate_insights(project_id: int, db: Session) -> Dict[str, any]:
@@ -445,10 +272,12 @@ class AIAssistant:
         in_progress_tasks = len([t for t in tasks if 0 < t.actual_progress < 100])
         not_started_tasks = len([t for t in tasks if t.actual_progress == 0])
         
-        # Risk analysis
+        # Risk analysis (batch - one pass over all tasks)
         high_risk_tasks = []
-        for task in tasks:
-            risk = AIAssistant.predict_risk(task, db)
+        assignment_counts = risk_engine.get_assignment_counts(db, project_id=project_id)
+        calendars = {project_id: working_calendar.get_calendar(db, project_id)}
+        schedule = critical_path.schedule_map(db, [project_id], calendars)
+        for task, risk in zip(tasks, risk_engine.assess_tasks(tasks, assignment_counts, calendars=calendars, schedule=schedule)):
             if risk["risk_level"] in ["High", "Critical"]:
                 high_risk_tasks.append({
                     "task": task,
@@ -0,0 +1,61 @@
+"""
+Benchmark: Weekly Report export latency
+- openpyxl: the previous path (load_workbook + save on every export)
+- cold:     template cache empty (zip read + patch + write)
+- warm:     template already cached (patch + write only)
+
+Usage: python bench_excel.py [--weeks 52] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import excel_engine
+
+TEMPLATE = "templates_excel/WeeklyReport_PH(PU).xlsx"
+
+
+def measure(func, repeat: int) -> float:
+    """Returns: median milliseconds per call"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    snapshots = [(week, week * 100.0 / args.weeks, week * 90.0 / args.weeks) for week in range(1, args.weeks + 1)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "weekly.xlsx")
+
+        def cold():
+            excel_engine.clear_template_cache()
+            excel_engine.render_weekly_report(snapshots, TEMPLATE, output)
+
+        results = [
+            ("openpyxl", measure(lambda: excel_engine.render_weekly_report_openpyxl(snapshots, TEMPLATE, output), args.repeat)),
+            ("cold", measure(cold, args.repeat)),
+        ]
+        excel_engine.render_weekly_report(snapshots, TEMPLATE, output)
+        results.append(("warm", measure(lambda: excel_engine.render_weekly_report(snapshots, TEMPLATE, output), args.repeat)))
+
+    baseline = results[0][1]
+    print(f"Weekly Report, {args.weeks} weeks, median of {args.repeat}\n")
+    print(f"{'path':<10} {'ms':>10} {'speedup':>8}")
+    print("-" * 30)
+    for name, ms in results:
+        print(f"{name:<10} {ms:>10.1f} {baseline / ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Benchmark: query plans and timings of the hot queries before / after the
+indexes declared in models.py (migration 11 in migrations.py)
+
+Builds a throw-away SQLite database with 100k tasks, runs each query without
+the secondary indexes, creates them, runs ANALYZE and runs the queries again.
+
+Usage: python bench_indexes.py [--tasks 100000] [--repeat 20]
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+
+from models import Base
+
+QUERIES = [
+    ("tasks of project",
+     "SELECT * FROM tasks WHERE project_id = :project_id"),
+    ("open tasks of project",
+     "SELECT id, actual_progress FROM tasks WHERE project_id = :project_id AND actual_progress < 100"),
+    ("risk filter + sort",
+     "SELECT * FROM tasks WHERE project_id = :project_id AND ai_risk_score >= 50 "
+     "ORDER BY ai_risk_score DESC"),
+    ("resource dated tasks",
+     "SELECT id, planned_start, planned_end FROM tasks WHERE assigned_resource_id = :resource_id "
+     "AND planned_start IS NOT NULL AND planned_end IS NOT NULL"),
+    ("resource multi-assign",
+     "SELECT t.id, t.planned_start FROM task_resources tr JOIN tasks t ON t.id = tr.task_id "
+     "WHERE tr.resource_id = :resource_id"),
+    ("task assignees",
+     "SELECT resource_id FROM task_resources WHERE task_id = :task_id"),
+    ("tasks of function",
+     "SELECT * FROM tasks WHERE function_id = :function_id"),
+    ("tasks of phase",
+     "SELECT * FROM tasks WHERE phase_id = :phase_id"),
+    ("open issues of project",
+     "SELECT * FROM issues WHERE project_id = :project_id AND status = 'Open' ORDER BY created_at DESC"),
+    ("issues by status",
+     "SELECT * FROM issues WHERE status = 'Open' ORDER BY created_at DESC LIMIT 100"),
+    ("issues by severity",
+     "SELECT * FROM issues WHERE severity = 'Critical' ORDER BY created_at DESC LIMIT 100"),
+    ("task history",
+     "SELECT * FROM activity_logs WHERE task_id = :task_id ORDER BY created_at DESC LIMIT 50"),
+    ("project history",
+     "SELECT * FROM activity_logs WHERE project_id = :project_id ORDER BY created_at DESC LIMIT 50"),
+    ("weekly snapshots",
+     "SELECT * FROM weekly_snapshots WHERE project_id = :project_id ORDER BY week_number"),
+]
+
+
+def build_dataset(engine, n_tasks: int, seed: int = 42):
+    """สร้างข้อมูลทดสอบ (สัดส่วนใกล้เคียงการใช้งานจริง)"""
+    rng = random.Random(seed)
+    n_projects = max(1, n_tasks // 2000)
+    n_resources = max(1, n_tasks // 300)
+    today = datetime.date.today()
+    now = datetime.datetime.now()
+
+    with engine.begin() as conn:
+        conn.execute(Base.metadata.tables["projects"].insert(), [
+            {"id": p, "name": f"Project {p}"} for p in range(1, n_projects + 1)
+        ])
+        conn.execute(Base.metadata.tables["resources"].insert(), [
+            {"id": r, "full_name": f"Resource {r}", "is_active": True} for r in range(1, n_resources + 1)
+        ])
+        conn.execute(Base.metadata.tables["project_phases"].insert(), [
+            {"id": p, "project_id": (p - 1) // 5 + 1, "phase_name": f"Phase {p}"} for p in range(1, n_projects * 5 + 1)
+        ])
+        conn.execute(Base.metadata.tables["project_functions"].insert(), [
+            {"id": f, "project_id": (f - 1) // 20 + 1, "function_name": f"Function {f}", "function_code": f"FUNC-{f:06d}"}
+            for f in range(1, n_projects * 20 + 1)
+        ])
+
+        tasks = []
+        for i in range(1, n_tasks + 1):
+            project_id = rng.randint(1, n_projects)
+            start = today + datetime.timedelta(days=rng.randint(-120, 120))
+            tasks.append({
+                "id": i,
+                "task_id": f"T-{i:07d}",
+                "project_id": project_id,
+                "task_name": f"Task {i}",
+                "task_type": rng.choice(["Dev", "Admin", "Procurement", "Fix"]),
+                "assigned_resource_id": rng.randint(1, n_resources) if rng.random() < 0.8 else None,
+                "actual_progress": rng.choice([0, 0, 25, 50, 75, 100, 100]),
+                "planned_start": start if rng.random() < 0.9 else None,
+                "planned_end": start + datetime.timedelta(days=rng.randint(1, 30)),
+                "phase_id": (project_id - 1) * 5 + rng.randint(1, 5),
+                "function_id": (project_id - 1) * 20 + rng.randint(1, 20),
+                "ai_risk_score": rng.choice([0, 0, 15, 30, 45, 60, 75, 90]),
+            })
+        conn.execute(Base.metadata.tables["tasks"].insert(), tasks)
+
+        conn.execute(Base.metadata.tables["task_resources"].insert(), [
+            {"task_id": rng.randint(1, n_tasks), "resource_id": rng.randint(1, n_resources)}
+            for _ in range(n_tasks * 3 // 2)
+        ])
+        conn.execute(Base.metadata.tables["issues"].insert(), [
+            {
+                "project_id": rng.randint(1, n_projects),
+                "issue_title": f"Issue {i}",
+                "status": rng.choice(["Open", "In Progress", "Resolved", "Closed"]),
+                "severity": rng.choice(["Low", "Medium", "High", "Critical"]),
+                "created_at": now - datetime.timedelta(minutes=rng.randint(0, 500000)),
+            }
+            for i in range(n_tasks // 5)
+        ])
+        conn.execute(Base.metadata.tables["activity_logs"].insert(), [
+            {
+                "task_id": rng.randint(1, n_tasks),
+                "project_id": rng.randint(1, n_projects) if rng.random() < 0.3 else None,
+                "action_type": "updated",
+                "description": "bench",
+                "created_at": now - datetime.timedelta(minutes=rng.randint(0, 500000)),
+            }
+            for _ in range(n_tasks * 2)
+        ])
+        conn.execute(Base.metadata.tables["weekly_snapshots"].insert(), [
+            {"project_id": p, "week_number": w, "plan_acc": w, "actual_acc": w}
+            for p in range(1, n_projects + 1) for w in range(1, 53)
+        ])
+
+    return {"project_id": n_projects // 2 or 1, "resource_id": n_resources // 2 or 1,
+            "task_id": n_tasks // 2, "function_id": 7, "phase_id": 3}
+
+
+def drop_secondary_indexes(engine):
+    """ลบ index ที่ประกาศใน models (ยกเว้น unique / primary key) เพื่อวัดค่า baseline"""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if not index.unique and not all(c.primary_key for c in index.columns):
+                    conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+
+def create_secondary_indexes(engine):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def run_queries(engine, params, repeat: int):
+    """Returns: {name: (plan, milliseconds per query)}"""
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES:
+            plan = " | ".join(row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql), params))
+            conn.execute(text(sql), params).fetchall()  # warm-up
+            started = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(text(sql), params).fetchall()
+            results[name] = (plan, (time.perf_counter() - started) * 1000 / repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        drop_secondary_indexes(engine)
+
+        started = time.perf_counter()
+        params = build_dataset(engine, args.tasks)
+        print(f"Dataset: {args.tasks:,} tasks ({time.perf_counter() - started:.1f}s)\n")
+
+        before = run_queries(engine, params, args.repeat)
+        create_secondary_indexes(engine)
+        after = run_queries(engine, params, args.repeat)
+        engine.dispose()
+
+    print(f"{'query':<24} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    print("-" * 56)
+    for name, _ in QUERIES:
+        b, a = before[name][1], after[name][1]
+        print(f"{name:<24} {b:>10.2f} {a:>10.2f} {b / a if a else float('inf'):>7.1f}x")
+
+    print("\nQuery plans")
+    for name, _ in QUERIES:
+        print(f"\n{name}\n  before: {before[name][0]}\n  after:  {after[name][0]}")
+
+
+if __name__ == "__main__":
+    main()
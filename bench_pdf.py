@@ -0,0 +1,107 @@
+"""
+Benchmark: per-PDF render time of report_engine
+- add_font: the previous path (every PDF parses the Sarabun TTFs with add_font)
+- cold:     font registry empty (parse once + render)
+- warm:     fonts already in the registry (render only)
+
+Usage: python bench_pdf.py [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+import report_engine
+
+PROJECT_DATA = {
+    "name": "ระบบบริหารโครงการ (Project Control Tower)",
+    "customer": "บริษัท ตัวอย่าง จำกัด",
+    "methodology": "Waterfall",
+    "is_recovery_mode": False,
+    "progress": 62.5,
+    "tasks_total": 120,
+    "tasks_completed": 71,
+    "issues_open": 8,
+    "issues_critical": 2,
+    "milestones": [
+        {"name": f"ส่งมอบงานงวดที่ {i} / Delivery {i}", "due_date": f"2026-1{i}-15", "status": "In Progress"}
+        for i in range(3)
+    ],
+    "resources": [
+        {"name": f"สมชาย {i}", "role": "Developer", "task_count": i + 2} for i in range(6)
+    ],
+    "ai_summary": "Project is at 62.5% completion. Urgent attention required for 2 critical issues. ",
+}
+
+ONSITE_DATA = {
+    "project_name": PROJECT_DATA["name"],
+    "customer_profile": SimpleNamespace(company_name="บริษัท ตัวอย่าง จำกัด", address="กรุงเทพฯ 10110"),
+    "responder_profile": SimpleNamespace(company_name="aiD Co., Ltd.", address="Bangkok 10500"),
+    "selected_tasks": [SimpleNamespace(task_id=f"CUSPRO{i:03d}", task_name=f"ทดสอบระบบ {i}") for i in range(8)],
+    "selected_functions": [SimpleNamespace(function_code=f"FURE-{i:03d}", function_name=f"รายงาน {i}") for i in range(5)],
+    "description": "สรุปผลการประชุมและข้อตกลงร่วมกัน / Meeting summary and agreed actions.",
+    "customer_signature_name": "ผู้แทนลูกค้า",
+    "responder_signature_name": "ผู้จัดการโครงการ",
+}
+
+
+def add_font_each_pdf(pdf) -> str:
+    """การลงทะเบียนฟอนต์แบบเดิม (ก่อนมี registry)"""
+    font_path = os.path.join(os.getcwd(), report_engine.FONT_FILES[""])
+    bold_font_path = os.path.join(os.getcwd(), report_engine.FONT_FILES["B"])
+    if not os.path.exists(font_path):
+        return report_engine.FALLBACK_FONT_FAMILY
+    pdf.add_font(report_engine.FONT_FAMILY, "", font_path)
+    if os.path.exists(bold_font_path):
+        pdf.add_font(report_engine.FONT_FAMILY, "B", bold_font_path)
+    return report_engine.FONT_FAMILY
+
+
+def measure(func, repeat: int) -> float:
+    """Returns: median milliseconds per call"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    reports = [
+        ("project", report_engine.generate_project_pdf, PROJECT_DATA),
+        ("onsite", report_engine.generate_onsite_consensus_pdf, ONSITE_DATA),
+    ]
+    registry = report_engine.register_fonts
+
+    print(f"PDF render, median of {args.repeat}\n")
+    print(f"{'report':<9} {'path':<10} {'ms':>8} {'speedup':>8} {'bytes':>8}")
+    print("-" * 47)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "report.pdf")
+        for name, generate, data in reports:
+            def cold():
+                report_engine.clear_font_cache()
+                generate(data, output)
+
+            report_engine.register_fonts = add_font_each_pdf
+            try:
+                baseline = measure(lambda: generate(data, output), args.repeat)
+                results = [("add_font", baseline, os.path.getsize(output))]
+            finally:
+                report_engine.register_fonts = registry
+            results.append(("cold", measure(cold, args.repeat), os.path.getsize(output)))
+            results.append(("warm", measure(lambda: generate(data, output), args.repeat), os.path.getsize(output)))
+
+            for path, ms, size in results:
+                print(f"{name:<9} {path:<10} {ms:>8.1f} {baseline / ms:>7.1f}x {size:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Critical Path Engine for aiD_PM
+Critical Path Method (CPM) over a project's finish-to-start dependencies:
+- Topological sort (Kahn) with cycle detection
+- Forward pass: early start / early finish
+- Backward pass: late start / late finish
+- Total slack, critical tasks and dependency delay
+
+Durations, lags and slack are counted in working days on the project's
+calendar (working_calendar), and every pass is O(tasks + dependencies).
+"""
+
+import datetime
+import math
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, aliased
+
+import models
+import working_calendar
+
+# Used when a task has no planned dates
+HOURS_PER_DAY = 8
+
+
+class DependencyCycleError(ValueError):
+    """Dependencies form a cycle, so the project cannot be scheduled"""
+
+    def __init__(self, task_ids: Iterable[int]):
+        self.task_ids = sorted(task_ids)
+        super().__init__(f"Dependency cycle between tasks: {self.task_ids}")
+
+
+def task_duration(task: models.Task, calendar: working_calendar.WorkingCalendar) -> int:
+    """ระยะเวลาของ Task เป็นวันทำงาน (อย่างน้อย 1 วัน)"""
+    if task.planned_start and task.planned_end and task.planned_end >= task.planned_start:
+        return max(1, calendar.working_days_between(task.planned_start, task.planned_end + datetime.timedelta(days=1)))
+    if task.estimated_hours:
+        return max(1, math.ceil(task.estimated_hours / HOURS_PER_DAY))
+    return 1
+
+
+def topological_order(task_ids: List[int], successors: Dict[int, List[Tuple[int, int]]]) -> List[int]:
+    """
+    เรียง Tasks ตาม dependency (Kahn's algorithm)
+
+    Raises: DependencyCycleError พร้อม Tasks ที่อยู่ใน (หรือถูกบล็อกโดย) วงวน
+    """
+    indegree = dict.fromkeys(task_ids, 0)
+    for task_id in task_ids:
+        for successor_id, _ in successors.get(task_id, ()):
+            indegree[successor_id] += 1
+
+    queue = deque(task_id for task_id in task_ids if indegree[task_id] == 0)
+    order = []
+    while queue:
+        task_id = queue.popleft()
+        order.append(task_id)
+        for successor_id, _ in successors.get(task_id, ()):
+            indegree[successor_id] -= 1
+            if indegree[successor_id] == 0:
+                queue.append(successor_id)
+
+    if len(order) < len(task_ids):
+        raise DependencyCycleError(task_id for task_id, degree in indegree.items() if degree > 0)
+    return order
+
+
+def compute_schedule(
+    tasks: List[models.Task],
+    dependencies: Iterable[Tuple[int, int, int]],
+    calendar: Optional[working_calendar.WorkingCalendar] = None
+) -> Dict[str, any]:
+    """
+    Forward / backward pass ของทั้งโปรเจกต์
+
+    Args:
+        dependencies: [(predecessor_id, successor_id, lag_days), ...]
+
+    Returns: {project_start, project_finish, critical_path: [task ids], tasks: {task_id: {...}}}
+    """
+    calendar = calendar or working_calendar.DEFAULT_CALENDAR
+    if not tasks:
+        return {"project_start": None, "project_finish": None, "critical_path": [], "tasks": {}}
+
+    by_id = {task.id: task for task in tasks}
+    successors = defaultdict(list)
+    for predecessor_id, successor_id, lag in dependencies:
+        if predecessor_id in by_id and successor_id in by_id:
+            successors[predecessor_id].append((successor_id, lag or 0))
+
+    task_ids = list(by_id)
+    order = topological_order(task_ids, successors)
+    duration = {task_id: task_duration(by_id[task_id], calendar) for task_id in task_ids}
+
+    # Tasks ที่ไม่มีวันเริ่ม ให้เริ่มพร้อมโปรเจกต์ (วันเริ่มแรกสุด หรือวันนี้)
+    planned_starts = [t.planned_start for t in tasks if t.planned_start]
+    base = calendar.working_day_index(min(planned_starts) if planned_starts else datetime.date.today())
+
+    # Forward pass (index แบบ end-exclusive)
+    early_start = {
+        task_id: calendar.working_day_index(by_id[task_id].planned_start) if by_id[task_id].planned_start else base
+        for task_id in task_ids
+    }
+    early_finish = {}
+    for task_id in order:
+        early_finish[task_id] = early_start[task_id] + duration[task_id]
+        for successor_id, lag in successors.get(task_id, ()):
+            early_start[successor_id] = max(early_start[successor_id], early_finish[task_id] + lag)
+
+    # Backward pass
+    project_finish = max(early_finish.values())
+    late_finish = {}
+    for task_id in reversed(order):
+        late_finish[task_id] = min(
+            (late_finish[s] - duration[s] - lag for s, lag in successors.get(task_id, ())),
+            default=project_finish
+        )
+
+    result = {}
+    critical_path = []
+    for task_id in order:
+        task = by_id[task_id]
+        late_start = late_finish[task_id] - duration[task_id]
+        slack = late_start - early_start[task_id]
+        planned_finish = calendar.working_day_index(task.planned_end + datetime.timedelta(days=1)) if task.planned_end else None
+        if slack <= 0:
+            critical_path.append(task_id)
+        result[task_id] = {
+            "duration": duration[task_id],
+            "early_start": calendar.date_of_index(early_start[task_id]),
+            "early_finish": calendar.date_of_index(early_finish[task_id] - 1),
+            "late_start": calendar.date_of_index(late_start),
+            "late_finish": calendar.date_of_index(late_finish[task_id] - 1),
+            "slack": slack,
+            "is_critical": slack <= 0,
+            # วันทำงานที่ predecessors ดัน early finish เลย planned_end
+            "dependency_delay": max(0, early_finish[task_id] - planned_finish) if planned_finish is not None else 0,
+        }
+
+    return {
+        "project_start": calendar.date_of_index(min(early_start.values())),
+        "project_finish": calendar.date_of_index(project_finish - 1),
+        "critical_path": critical_path,
+        "tasks": result,
+    }
+
+
+# ===== Database helpers =====
+
+def load_dependencies(db: Session, project_ids: Iterable[int]) -> Dict[int, List[Tuple[int, int, int]]]:
+    """Dependencies ของหลายโปรเจกต์ใน 1 query - Returns: {project_id: [(pred, succ, lag), ...]}"""
+    project_ids = list(project_ids)
+    if not project_ids:
+        return {}
+
+    successor = aliased(models.Task)
+    rows = db.query(
+        successor.project_id,
+        models.TaskDependency.predecessor_id,
+        models.TaskDependency.successor_id,
+        models.TaskDependency.lag_days,
+    ).join(successor, successor.id == models.TaskDependency.successor_id).filter(
+        successor.project_id.in_(project_ids)
+    ).all()
+
+    result = defaultdict(list)
+    for project_id, predecessor_id, successor_id, lag in rows:
+        result[project_id].append((predecessor_id, successor_id, lag or 0))
+    return result
+
+
+def analyze_project(
+    db: Session,
+    project_id: int,
+    calendar: Optional[working_calendar.WorkingCalendar] = None
+) -> Dict[str, any]:
+    """CPM ของโปรเจกต์เดียว (Raises: DependencyCycleError)"""
+    tasks = db.query(models.Task).filter(models.Task.project_id == project_id).all()
+    dependencies = load_dependencies(db, [project_id]).get(project_id, [])
+    calendar = calendar or working_calendar.get_calendar(db, project_id)
+    return compute_schedule(tasks, dependencies, calendar)
+
+
+def schedule_map(
+    db: Session,
+    project_ids: Iterable[int],
+    calendars: Optional[Dict[int, working_calendar.WorkingCalendar]] = None
+) -> Dict[int, Dict[str, any]]:
+    """
+    ผล CPM ต่อ Task ของทุกโปรเจกต์ที่มี dependency (ใช้ใน risk_engine)
+    โปรเจกต์ที่ไม่มี dependency หรือมีวงวนจะไม่อยู่ในผลลัพธ์
+
+    Returns: {task_id: {duration, early_start, ..., slack, is_critical, dependency_delay}}
+    """
+    dependencies = load_dependencies(db, {pid for pid in project_ids if pid is not None})
+    if not dependencies:
+        return {}
+
+    tasks_by_project = defaultdict(list)
+    for task in db.query(models.Task).filter(models.Task.project_id.in_(list(dependencies))).all():
+        tasks_by_project[task.project_id].append(task)
+
+    result = {}
+    for project_id, links in dependencies.items():
+        calendar = calendars[project_id] if calendars is not None else working_calendar.DEFAULT_CALENDAR
+        try:
+            result.update(compute_schedule(tasks_by_project[project_id], links, calendar)["tasks"])
+        except DependencyCycleError as e:
+            print(f"[CRITICAL-PATH] Project {project_id}: {e}")
+    return result
+
+
+def projects_with_dependencies(db: Session, project_ids: Iterable[int]) -> List[int]:
+    """โปรเจกต์ (จาก project_ids) ที่มี dependency อย่างน้อย 1 รายการ"""
+    return list(load_dependencies(db, project_ids))
+
+
+def would_create_cycle(db: Session, project_id: int, predecessor_id: int, successor_id: int) -> bool:
+    """ตรวจว่าการเพิ่ม predecessor -> successor จะทำให้เกิดวงวนหรือไม่ (BFS จาก successor)"""
+    if predecessor_id == successor_id:
+        return True
+
+    successors = defaultdict(list)
+    for pred, succ, _ in load_dependencies(db, [project_id]).get(project_id, []):
+        successors[pred].append(succ)
+
+    seen = {successor_id}
+    queue = deque([successor_id])
+    while queue:
+        for nxt in successors.get(queue.popleft(), ()):
+            if nxt == predecessor_id:
+                return True
+            if nxt not in seen:
+                seen.add(nxt)
+                queue.append(nxt)
+    return False
@@ -4,10 +4,35 @@ Handles bulk task operations with strict validation
 """
 import csv
 import io
+import pickle
+import tempfile
 from datetime import datetime
-from typing import List, Dict, Tuple
-from sqlalchemy.orm import Session
+from itertools import chain, groupby
+from typing import Iterator, List, Dict, Optional, Tuple
+from sqlalchemy.orm import Session, aliased
 import models
+import id_allocator
+import progress_service
+import recommendation_engine
+import risk_engine
+from database import is_lock_error
+
+# Rows per bulk insert / update statement during import
+IMPORT_CHUNK_SIZE = 1000
+# Above this many imported rows the risk / recommendation engines do a full refresh
+IMPORT_FULL_REFRESH_ROWS = 10000
+# Row errors returned by an import (the total count is always reported)
+MAX_IMPORT_ERRORS = 100
+# Tried in order for uploaded bytes; iso-8859-1 accepts anything
+IMPORT_ENCODINGS = ("utf-8-sig", "cp1252", "iso-8859-1")
+REQUIRED_COLUMNS = ["Task Name", "Planned Start", "Planned End"]
+# Rows fetched from the database / written per streamed chunk during export
+EXPORT_CHUNK_ROWS = 1000
+
+EXPORT_HEADER = [
+    "Task ID", "Task Name", "Task Type", "Weight Score", "Phase",
+    "Assigned Resources", "Planned Start", "Planned End", "Progress"
+]
 
 
 def validate_date_format(date_str: str) -> Tuple[bool, str]:
@@ -53,272 +78,384 @@ def format_date_for_export(date_obj) -> str:
     return date_obj.strftime("%Y%m%d")
 
 
+def _export_rows(project_id: int, db: Session):
+    """
+    แถว CSV ของทุก Task ในโปรเจกต์จาก joined query เดียว (อ่านทีละ EXPORT_CHUNK_ROWS แถว)
+    Task ที่มีหลาย Resource จะได้หลายแถวติดกันจาก join - รวมชื่อเป็นแถวเดียว
+    """
+    task = models.Task
+    primary = aliased(models.Resource)
+    assignee = aliased(models.Resource)
+    query = (
+        db.query(
+            task.id, task.task_id, task.task_name, task.task_type, task.weight_score,
+            models.ProjectPhase.phase_name, task.planned_start, task.planned_end, task.actual_progress,
+            primary.full_name, assignee.full_name,
+        )
+        .outerjoin(models.ProjectPhase, models.ProjectPhase.id == task.phase_id)
+        .outerjoin(primary, primary.id == task.assigned_resource_id)
+        .outerjoin(models.TaskResource, models.TaskResource.task_id == task.id)
+        .outerjoin(assignee, assignee.id == models.TaskResource.resource_id)
+        .filter(task.project_id == project_id)
+        .order_by(task.id, models.TaskResource.id)
+        .yield_per(EXPORT_CHUNK_ROWS)
+    )
+
+    for _, joined in groupby(query, key=lambda row: row[0]):
+        first = next(joined)
+        resource_names = [first[9]] if first[9] else []
+        for row in chain([first], joined):
+            if row[10] and row[10] not in resource_names:
+                resource_names.append(row[10])
+        yield [
+            first.task_id or f"TMP{first.id:03d}",  # Use new task_id or generate temporary ID
+            first.task_name,
+            first.task_type,
+            first.weight_score,
+            first.phase_name or "",
+            ",".join(resource_names),
+            format_date_for_export(first.planned_start),
+            format_date_for_export(first.planned_end),
+            int(first.actual_progress),
+        ]
+
+
+def iter_tasks_csv(project_id: int, db: Session) -> Iterator[str]:
+    """
+    Stream all tasks for a project as CSV text chunks (UTF-8 BOM + header first)
+    Memory stays constant regardless of project size
+    """
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
+    writer.writerow(EXPORT_HEADER)
+    yield '\ufeff' + output.getvalue()
+
+    buffered = 0
+    for row in _export_rows(project_id, db):
+        if buffered == 0:
+            output.seek(0)
+            output.truncate()
+        writer.writerow(row)
+        buffered += 1
+        if buffered == EXPORT_CHUNK_ROWS:
+            yield output.getvalue()
+            buffered = 0
+    if buffered:
+        yield output.getvalue()
+
+
 def export_tasks_to_csv(project_id: int, db: Session) -> str:
     """
     Export all tasks for a project to CSV format
     Returns CSV string content with proper Unicode support
     """
-    tasks = db.query(models.Task).filter(models.Task.project_id == project_id).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
-    
-    # Write header
-    writer.writerow([
-        "Task ID", "Task Name", "Task Type", "Weight Score", "Phase",
-        "Assigned Resources", "Planned Start", "Planned End", "Progress"
-    ])
-    
-    # Write tasks
-    for task in tasks:
-        # Get phase name
-        phase_name = ""
-        if task.phase_id:
-            phase = db.query(models.ProjectPhase).filter(models.ProjectPhase.id == task.phase_id).first()
-            if phase:
-                phase_name = phase.phase_name
-        
-        # Get assigned resources
-        resource_names = []
-        if task.assigned_resource_id:
-            resource = db.query(models.Resource).filter(models.Resource.id == task.assigned_resource_id).first()
-            if resource:
-                resource_names.append(resource.full_name)
-        
-        # Get multi-assigned resources
-        task_resources = db.query(models.TaskResource).filter(models.TaskResource.task_id == task.id).all()
-        for tr in task_resources:
-            resource = db.query(models.Resource).filter(models.Resource.id == tr.resource_id).first()
-            if resource and resource.full_name not in resource_names:
-                resource_names.append(resource.full_name)
-        
-        writer.writerow([
-            task.task_id or f"TMP{task.id:03d}",  # Use new task_id or generate temporary ID
-            task.task_name,
-            task.task_type,
-            task.weight_score,
-            phase_name,
-            ",".join(resource_names),
-            format_date_for_export(task.planned_start),
-            format_date_for_export(task.planned_end),
-            int(task.actual_progress)
-        ])
-    
-    return output.getvalue()
+    return "".join(iter_tasks_csv(project_id, db))[1:]
 
 
 def generate_blank_template() -> str:
     """Generate blank CSV template with headers only and proper Unicode support"""
     output = io.StringIO()
     writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
-    writer.writerow([
-        "Task ID", "Task Name", "Task Type", "Weight Score", "Phase",
-        "Assigned Resources", "Planned Start", "Planned End", "Progress"
-    ])
+    writer.writerow(EXPORT_HEADER)
     return output.getvalue()
 
 
-def validate_csv_file(csv_content: str, project_id: int, db: Session) -> Tuple[bool, List[str]]:
+# ==================== Validate & Stage Import ====================
+# 1) ไฟล์ถูกอ่านทีละแถวครั้งเดียวโดยไม่แตะฐานข้อมูล: แถวที่ตรวจ/แปลงค่าแล้วถูกพักไว้ในไฟล์ชั่วคราว
+#    ถ้าพบ error แถวใดก็ตาม จะตรวจต่อจนจบไฟล์เพื่อรายงาน แล้วจบโดยไม่เขียนอะไรเลย
+# 2) เมื่อทั้งไฟล์ผ่านแล้วเท่านั้น จึงเปิด write transaction (จอง Task ID / insert / update ทีละ chunk)
+#    lock ของ SQLite / sequence ของ PostgreSQL จึงถูกถือแค่ช่วงเขียน ไม่ใช่ตลอดการอัพโหลด
+
+def _row_error(row_num: int, column: str, message: str) -> Dict:
+    return {"row": row_num, "column": column, "message": message}
+
+
+def _convert_row(row: Dict[str, str], row_num: int) -> Tuple[Dict, List[Dict]]:
     """
-    Validate entire CSV file before import with Unicode support
-    Returns: (is_valid, error_messages)
+    ตรวจและแปลงแถว CSV ในครั้งเดียว
+    Returns: (values, errors) - values ใช้ได้เมื่อ errors ว่างเท่านั้น
     """
     errors = []
-    
-    try:
-        # Handle potential BOM and ensure proper Unicode handling
-        if csv_content.startswith('\ufeff'):
-            csv_content = csv_content[1:]
-        
-        reader = csv.DictReader(io.StringIO(csv_content))
-        
-        # Check required columns
-        required_columns = ["Task Name", "Planned Start", "Planned End"]
-        if not all(col in reader.fieldnames for col in required_columns):
-            missing = [col for col in required_columns if col not in reader.fieldnames]
-            errors.append(f"Missing required columns: {', '.join(missing)}")
-            return False, errors
-        
-        # Validate each row
-        for row_num, row in enumerate(reader, start=2):  # Start at 2 (header is row 1)
-            # Check mandatory fields
-            if not row.get("Task Name", "").strip():
-                errors.append(f"Row {row_num}: Missing Task Name")
-            
-            if not row.get("Planned Start", "").strip():
-                errors.append(f"Row {row_num}: Missing Planned Start")
-            
-            if not row.get("Planned End", "").strip():
-                errors.append(f"Row {row_num}: Missing Planned End")
-            
-            # Validate date formats
-            planned_start = row.get("Planned Start", "").strip()
-            if planned_start:
-                is_valid, error_msg = validate_date_format(planned_start)
-                if not is_valid:
-                    errors.append(f"Row {row_num}: {error_msg}")
-            
-            planned_end = row.get("Planned End", "").strip()
-            if planned_end:
-                is_valid, error_msg = validate_date_format(planned_end)
-                if not is_valid:
-                    errors.append(f"Row {row_num}: {error_msg}")
-            
-            # Validate date logic (end >= start)
-            if planned_start and planned_end:
-                try:
-                    start_date = parse_date(planned_start)
-                    end_date = parse_date(planned_end)
-                    if start_date and end_date and end_date < start_date:
-                        errors.append(f"Row {row_num}: Planned End must be >= Planned Start")
-                except:
-                    pass  # Already caught by format validation
-        
-        return len(errors) == 0, errors
-    
-    except Exception as e:
-        errors.append(f"CSV parsing error: {str(e)}")
-        return False, errors
+    task_name = (row.get("Task Name") or "").strip()
+    if not task_name:
+        errors.append(_row_error(row_num, "Task Name", "Missing Task Name"))
+
+    dates = {}
+    for column in ("Planned Start", "Planned End"):
+        value = (row.get(column) or "").strip()
+        if not value:
+            errors.append(_row_error(row_num, column, f"Missing {column}"))
+            continue
+        is_valid, error_msg = validate_date_format(value)
+        if is_valid:
+            dates[column] = parse_date(value)
+        else:
+            errors.append(_row_error(row_num, column, error_msg))
+    if len(dates) == 2 and dates["Planned End"] < dates["Planned Start"]:
+        errors.append(_row_error(row_num, "Planned End", "Planned End must be >= Planned Start"))
+
+    numbers = {}
+    for column, default in (("Weight Score", 1.0), ("Progress", 0.0)):
+        value = (row.get(column) or "").strip()
+        try:
+            numbers[column] = float(value) if value else default
+        except ValueError:
+            errors.append(_row_error(row_num, column, f"Invalid number '{value}'"))
+
+    if errors:
+        return {}, errors
+    return {
+        "task_id": (row.get("Task ID") or "").strip(),
+        "task_name": task_name,
+        "task_type": (row.get("Task Type") or "").strip() or "Dev",
+        "weight_score": numbers["Weight Score"],
+        "phase_name": (row.get("Phase") or "").strip(),
+        "resource_names": [n.strip() for n in (row.get("Assigned Resources") or "").split(",") if n.strip()],
+        "planned_start": dates["Planned Start"],
+        "planned_end": dates["Planned End"],
+        "actual_progress": numbers["Progress"],
+    }, []
+
+
+def _missing_columns(fieldnames) -> List[str]:
+    return [col for col in REQUIRED_COLUMNS if col not in (fieldnames or [])]
+
+
+class _ImportContext:
+    """Lookup maps ของโปรเจกต์ที่โหลดครั้งเดียวก่อน import (ไม่ query ต่อแถว)"""
+
+    def __init__(self, project_id: int, db: Session):
+        task = models.Task
+        rows = db.query(task.id, task.task_id, task.weight_score, task.actual_progress).filter(
+            task.project_id == project_id
+        ).order_by(task.id).all()
+        # id -> [weight, progress] ปัจจุบัน (อัพเดทตามแถวที่ import เพื่อคำนวณ delta ได้ถูกต้อง)
+        self.task_state = {row.id: [row.weight_score, row.actual_progress] for row in rows}
+        self.task_by_code = {row.task_id: row.id for row in rows if row.task_id}
+
+        self.phase_by_name = {}
+        for phase_id, phase_name in db.query(models.ProjectPhase.id, models.ProjectPhase.phase_name).filter(
+            models.ProjectPhase.project_id == project_id
+        ).order_by(models.ProjectPhase.id):
+            self.phase_by_name.setdefault(phase_name, phase_id)
+
+        self.resource_by_name = {}
+        for resource_id, full_name in db.query(models.Resource.id, models.Resource.full_name).order_by(models.Resource.id):
+            self.resource_by_name.setdefault(full_name, resource_id)
 
+        self.assignments = set(
+            db.query(models.TaskResource.task_id, models.TaskResource.resource_id)
+            .join(task, task.id == models.TaskResource.task_id)
+            .filter(task.project_id == project_id)
+            .all()
+        )
 
-def import_tasks_from_csv(project_id: int, csv_content: str, db: Session) -> Dict:
+    def match_task(self, code: str):
+        """id ของ Task เดิมจาก Task ID (หรือ id แบบตัวเลขของรูปแบบเก่า)"""
+        if not code:
+            return None
+        if code in self.task_by_code:
+            return self.task_by_code[code]
+        if code.isdigit() and int(code) in self.task_state:
+            return int(code)
+        return None
+
+
+def _bulk_write(method, model, mappings: List[Dict]):
+    for start in range(0, len(mappings), IMPORT_CHUNK_SIZE):
+        method(model, mappings[start:start + IMPORT_CHUNK_SIZE])
+
+
+class _ImportStage:
+    """แถวที่ผ่านการตรวจแล้ว - เขียนลง write transaction ทีละ IMPORT_CHUNK_SIZE แถว (ยังไม่ commit)"""
+
+    def __init__(self, project_id: int, db: Session):
+        self.project_id = project_id
+        self.db = db
+        self.context = _ImportContext(project_id, db)
+        self.project = db.query(models.Project).filter(models.Project.id == project_id).first()
+        self.inserts = []         # (mapping, resource_ids) - id ได้หลัง insert
+        self.updates = []
+        self.assignments = []     # TaskResource ที่ต้องเพิ่ม
+        self.deltas = [0.0, 0.0]  # running totals ของ Project.progress
+        self.created_count = 0
+        self.updated_count = 0
+
+    def add(self, values: Dict):
+        context = self.context
+        resource_ids = [context.resource_by_name[n] for n in values.pop("resource_names") if n in context.resource_by_name]
+        phase_name = values.pop("phase_name")
+        values["phase_id"] = context.phase_by_name.get(phase_name) if phase_name else None
+        task_id = context.match_task(values.pop("task_id"))
+
+        weight, weighted = progress_service.task_contribution(values["weight_score"], values["actual_progress"])
+        self.deltas[0] += weight
+        self.deltas[1] += weighted
+
+        if task_id is None:
+            self.inserts.append(({"project_id": self.project_id, **values}, resource_ids))
+        else:
+            old = context.task_state[task_id]
+            weight, weighted = progress_service.task_contribution(*old)
+            self.deltas[0] -= weight
+            self.deltas[1] -= weighted
+            old[:] = [values["weight_score"], values["actual_progress"]]
+
+            self.updates.append({"id": task_id, **values})
+            for resource_id in resource_ids:
+                if (task_id, resource_id) not in context.assignments:
+                    context.assignments.add((task_id, resource_id))
+                    self.assignments.append({"task_id": task_id, "resource_id": resource_id})
+
+        if len(self.inserts) + len(self.updates) >= IMPORT_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        db = self.db
+        if self.inserts:
+            # Reserve the chunk's new Task IDs in one allocation
+            codes = id_allocator.allocate_task_ids(db, self.project.customer, self.project.name, len(self.inserts))
+            for (mapping, _), code in zip(self.inserts, codes):
+                mapping["task_id"] = code
+            db.bulk_insert_mappings(models.Task, [mapping for mapping, _ in self.inserts])
+
+            # id ของ Tasks ใหม่ใน 1 query (return_defaults จะ insert ทีละแถว)
+            id_by_code = dict(db.query(models.Task.task_id, models.Task.id).filter(models.Task.task_id.in_(codes)))
+            for mapping, resource_ids in self.inserts:
+                mapping["id"] = id_by_code[mapping["task_id"]]
+                for resource_id in dict.fromkeys(resource_ids):
+                    self.assignments.append({"task_id": mapping["id"], "resource_id": resource_id})
+
+        _bulk_write(db.bulk_update_mappings, models.Task, self.updates)
+        _bulk_write(db.bulk_insert_mappings, models.TaskResource, self.assignments)
+
+        self.created_count += len(self.inserts)
+        self.updated_count += len(self.updates)
+
+        # Bulk mappings ไม่ผ่าน flush hooks: แจ้ง risk / recommendation เอง
+        # (ไฟล์ใหญ่ขอ refresh ทั้งหมดแทนการจำ id ทุกแถว)
+        full = self.created_count + self.updated_count > IMPORT_FULL_REFRESH_ROWS
+        touched = [mapping["id"] for mapping, _ in self.inserts] + [m["id"] for m in self.updates]
+        risk_engine.mark_tasks_changed(db, touched, full=full)
+        recommendation_engine.mark_workload_changed(db, {a["resource_id"] for a in self.assignments}, touched, full=full)
+        self.inserts, self.updates, self.assignments = [], [], []
+
+    def finish(self):
+        self.flush()
+        if self.deltas[0] != 0.0 or self.deltas[1] != 0.0:
+            progress_service.apply_project_deltas(self.db, {self.project_id: self.deltas})
+
+
+def _import_result(success: bool, message: str, created: int = 0, updated: int = 0,
+                   row_errors: List[Dict] = (), error_count: int = 0, errors: List[str] = None) -> Dict:
+    row_errors = list(row_errors)
+    return {
+        "status": "success" if success else "error",
+        "success": success,
+        "created_count": created,
+        "updated_count": updated,
+        "errors": errors if errors is not None else [f"Row {e['row']}: {e['message']}" for e in row_errors],
+        "row_errors": row_errors,
+        "error_count": error_count or len(row_errors),
+        "errors_truncated": error_count > len(row_errors),
+        "message": message,
+    }
+
+
+def _open_text(source, encoding: str):
+    """str / bytes / binary file-like -> text stream สำหรับ csv (อ่านทีละส่วน ไม่ decode ทั้งไฟล์)"""
+    if isinstance(source, str):
+        return io.StringIO(source[1:] if source.startswith('\ufeff') else source, newline="")
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    source.seek(0)
+    return io.TextIOWrapper(source, encoding=encoding, newline="")
+
+
+def _validate_rows(text, staged) -> Optional[Dict]:
     """
-    Import tasks from CSV file with Unicode support
-    Returns: {"success": bool, "created": int, "updated": int, "errors": []}
+    Pass 1 (ไม่แตะฐานข้อมูล): ตรวจ/แปลงทุกแถว แล้วพักแถวที่ถูกต้องไว้ใน staged (pickle ทีละแถว)
+    Returns: ผลลัพธ์ error ถ้าไฟล์ไม่ผ่าน, None ถ้าทุกแถวถูกต้อง
     """
-    # Validate first
-    is_valid, errors = validate_csv_file(csv_content, project_id, db)
-    if not is_valid:
-        return {
-            "status": "error",
-            "success": False,
-            "created_count": 0,
-            "updated_count": 0,
-            "errors": errors,
-            "message": "Validation failed"
-        }
-    
-    created_count = 0
-    updated_count = 0
-    
-    try:
-        # Handle potential BOM and ensure proper Unicode handling
-        if csv_content.startswith('\ufeff'):
-            csv_content = csv_content[1:]
-            
-        reader = csv.DictReader(io.StringIO(csv_content))
-        
-        for row in reader:
-            task_id = row.get("Task ID", "").strip()
-            task_name = row.get("Task Name", "").strip()
-            task_type = row.get("Task Type", "Dev").strip() or "Dev"
-            weight_score = float(row.get("Weight Score", "1.0").strip() or "1.0")
-            phase_name = row.get("Phase", "").strip()
-            resource_names = row.get("Assigned Resources", "").strip()
-            planned_start = parse_date(row.get("Planned Start", ""))
-            planned_end = parse_date(row.get("Planned End", ""))
-            progress = float(row.get("Progress", "0").strip() or "0")
-            
-            # Find phase by name
-            phase_id = None
-            if phase_name:
-                phase = db.query(models.ProjectPhase).filter(
-                    models.ProjectPhase.project_id == project_id,
-                    models.ProjectPhase.phase_name == phase_name
-                ).first()
-                if phase:
-                    phase_id = phase.id
-            
-            # Update or Create
-            task_to_update = None
-            if task_id:
-                # Try to find by task_id first (new format)
-                task_to_update = db.query(models.Task).filter(
-                    models.Task.task_id == task_id,
-                    models.Task.project_id == project_id
-                ).first()
-                
-                # If not found and it's numeric, try old ID lookup
-                if not task_to_update and task_id.isdigit():
-                    task_to_update = db.query(models.Task).filter(
-                        models.Task.id == int(task_id),
-                        models.Task.project_id == project_id
-                    ).first()
-            
-            if task_to_update:
-                # Update existing task
-                task_to_update.task_name = task_name
-                task_to_update.task_type = task_type
-                task_to_update.weight_score = weight_score
-                task_to_update.phase_id = phase_id
-                task_to_update.planned_start = planned_start
-                task_to_update.planned_end = planned_end
-                task_to_update.actual_progress = progress
-                updated_count += 1
-                task = task_to_update
-            else:
-                # Create new task with auto-generated task_id
-                # Import generate_task_id function
-                import main
-                new_task_id = main.generate_task_id(
-                    db.query(models.Project).filter(models.Project.id == project_id).first().customer,
-                    db.query(models.Project).filter(models.Project.id == project_id).first().name,
-                    db
-                )
-                
-                task = models.Task(
-                    task_id=new_task_id,
-                    project_id=project_id,
-                    task_name=task_name,
-                    task_type=task_type,
-                    weight_score=weight_score,
-                    phase_id=phase_id,
-                    planned_start=planned_start,
-                    planned_end=planned_end,
-                    actual_progress=progress
-                )
-                db.add(task)
-                created_count += 1
-            
-            db.flush()  # Get task ID for resource assignment
-            
-            # Handle resource assignment (optional, skip if not found)
-            if resource_names:
-                names = [n.strip() for n in resource_names.split(",")]
-                for name in names:
-                    resource = db.query(models.Resource).filter(
-                        models.Resource.full_name == name
-                    ).first()
-                    if resource:
-                        # Check if already assigned
-                        existing = db.query(models.TaskResource).filter(
-                            models.TaskResource.task_id == task.id,
-                            models.TaskResource.resource_id == resource.id
-                        ).first()
-                        if not existing:
-                            task_resource = models.TaskResource(
-                                task_id=task.id,
-                                resource_id=resource.id
-                            )
-                            db.add(task_resource)
-        
-        db.commit()
-        return {
-            "status": "success",
-            "success": True,
-            "created_count": created_count,
-            "updated_count": updated_count,
-            "errors": [],
-            "message": f"Successfully imported {created_count + updated_count} tasks"
-        }
-    
-    except Exception as e:
-        db.rollback()
-        return {
-            "status": "error",
-            "success": False,
-            "created_count": 0,
-            "updated_count": 0,
-            "errors": [f"Import failed: {str(e)}"],
-            "message": str(e)
-        }
+    reader = csv.DictReader(text)
+    missing = _missing_columns(reader.fieldnames)
+    if missing:
+        return _import_result(False, "Validation failed", errors=[f"Missing required columns: {', '.join(missing)}"])
+
+    row_errors = []
+    error_count = 0
+    for row_num, row in enumerate(reader, start=2):  # Start at 2 (header is row 1)
+        values, errors = _convert_row(row, row_num)
+        if errors:
+            error_count += len(errors)
+            row_errors.extend(errors[:MAX_IMPORT_ERRORS - len(row_errors)])
+        elif not error_count:
+            pickle.dump(values, staged, pickle.HIGHEST_PROTOCOL)
+
+    if error_count:
+        return _import_result(False, "Validation failed", row_errors=row_errors, error_count=error_count)
+    return None
+
+
+def _staged_rows(staged) -> Iterator[Dict]:
+    staged.seek(0)
+    while True:
+        try:
+            yield pickle.load(staged)
+        except EOFError:
+            return
+
+
+def _write_rows(project_id: int, staged, db: Session) -> Dict:
+    """Pass 2: เขียนแถวที่พักไว้ใน transaction เดียว (เริ่มหลังตรวจครบทั้งไฟล์แล้ว)"""
+    # ปิด read transaction ที่ค้างจากก่อน parse: lookup และการเขียนใช้ snapshot ปัจจุบัน
+    db.rollback()
+    stage = _ImportStage(project_id, db)
+    for values in _staged_rows(staged):
+        stage.add(values)
+    stage.finish()
+    db.commit()
+    total = stage.created_count + stage.updated_count
+    return _import_result(True, f"Successfully imported {total} tasks", stage.created_count, stage.updated_count)
+
+
+def import_tasks_from_csv(project_id: int, source, db: Session) -> Dict:
+    """
+    Validate and import tasks from CSV in a single streaming pass
+    source: str, bytes or a binary file-like object (e.g. UploadFile.file);
+    binary input is decoded incrementally, trying IMPORT_ENCODINGS in order
+    Nothing is written unless every row is valid; the write transaction starts
+    only after the whole file has been validated
+    Returns: {"success": bool, "created_count": int, "updated_count": int,
+              "errors": [str], "row_errors": [{row, column, message}], "error_count": int, ...}
+    """
+    encodings = (None,) if isinstance(source, str) else IMPORT_ENCODINGS
+    with tempfile.TemporaryFile() as staged:
+        for encoding in encodings:
+            text = _open_text(source, encoding)
+            staged.seek(0)
+            staged.truncate()
+            try:
+                failed = _validate_rows(text, staged)
+                break
+            except UnicodeDecodeError:
+                # ไฟล์ไม่ใช่ encoding นี้: อ่านใหม่ด้วย encoding ถัดไป
+                continue
+            except csv.Error as e:
+                return _import_result(False, str(e), errors=[f"CSV parsing error: {str(e)}"])
+            except Exception as e:
+                return _import_result(False, str(e), errors=[f"Import failed: {str(e)}"])
+            finally:
+                if isinstance(text, io.TextIOWrapper):
+                    text.detach()  # อย่าปิดไฟล์ของผู้เรียก
+        if failed:
+            return failed
+
+        try:
+            return _write_rows(project_id, staged, db)
+        except Exception as e:
+            db.rollback()
+            if is_lock_error(e):
+                # ให้ retry_on_locked ของ endpoint ลองใหม่
+                raise
+            return _import_result(False, str(e), errors=[f"Import failed: {str(e)}"])
@@ -1,7 +1,209 @@
+import datetime
+import hashlib
+import os
+import re
+import threading
+import zipfile
+from itertools import chain, groupby
+from typing import Dict, NamedTuple, Optional, Tuple
+
 import openpyxl
-from sqlalchemy.orm import Session
+from lxml import etree
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from sqlalchemy.orm import Session, aliased
 import models
 
+# ==================== Template Cache ====================
+# การ parse Template ที่มี style / chart จำนวนมากด้วย openpyxl ใช้เวลาเกือบทั้งหมดของการ export
+# จึงเก็บไฟล์ .xlsx (zip) ไว้ในหน่วยความจำครั้งเดียว (โหลดใหม่เมื่อ mtime/size เปลี่ยน)
+# แล้วแก้เฉพาะ XML ของ cell ที่ต้องเติมข้อมูล ส่วนอื่น (style, chart, รูป) คัดลอกตามเดิม
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_NS = {"m": _MAIN_NS}
+_CALC_CHAIN = "xl/calcChain.xml"
+
+
+def _column_index(ref: str) -> int:
+    """"AB12" -> 28"""
+    index = 0
+    for ch in re.match(r"[A-Z]+", ref).group(0):
+        index = index * 26 + ord(ch) - 64
+    return index
+
+
+class TemplateWorkbook:
+    """Template .xlsx ที่โหลดไว้แล้ว - save_patched() เขียนไฟล์ใหม่โดยแก้เฉพาะ cell ที่ระบุ"""
+
+    def __init__(self, path: str):
+        with zipfile.ZipFile(path) as archive:
+            self.entries = [(info, archive.read(info)) for info in archive.infolist()]
+        parts = {info.filename: data for info, data in self.entries}
+
+        # ชื่อ Sheet -> path ของ XML ใน zip
+        rels = etree.fromstring(parts["xl/_rels/workbook.xml.rels"])
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+        workbook = etree.fromstring(parts["xl/workbook.xml"])
+        self.sheet_parts = {}
+        for sheet in workbook.iterfind("m:sheets/m:sheet", _NS):
+            target = targets[sheet.get(f"{{{_REL_NS}}}id")]
+            self.sheet_parts[sheet.get("name")] = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+        self.sheetnames = list(self.sheet_parts)
+
+    def _patch_sheet(self, data: bytes, cells: Dict[Tuple[int, int], object]) -> bytes:
+        root = etree.fromstring(data)
+        sheet_data = root.find("m:sheetData", _NS)
+        rows = {int(row.get("r")): row for row in sheet_data.iterfind("m:row", _NS)}
+
+        for (row_num, col_num), value in sorted(cells.items()):
+            row = rows.get(row_num)
+            if row is None:
+                row = etree.Element(f"{{{_MAIN_NS}}}row", r=str(row_num))
+                following = [r for n, r in rows.items() if n > row_num]
+                if following:
+                    min(following, key=lambda r: int(r.get("r"))).addprevious(row)
+                else:
+                    sheet_data.append(row)
+                rows[row_num] = row
+            row.attrib.pop("spans", None)
+
+            ref = f"{get_column_letter(col_num)}{row_num}"
+            cell = None
+            for existing in row.iterfind("m:c", _NS):
+                if existing.get("r") == ref:
+                    cell = existing
+                    break
+                if _column_index(existing.get("r")) > col_num:
+                    cell = etree.Element(f"{{{_MAIN_NS}}}c", r=ref)
+                    existing.addprevious(cell)
+                    break
+            if cell is None:
+                cell = etree.SubElement(row, f"{{{_MAIN_NS}}}c", r=ref)
+
+            # เก็บ style (s) ไว้ แทนที่สูตร / ค่าเดิมด้วยค่าใหม่
+            for child in list(cell):
+                cell.remove(child)
+            cell.attrib.pop("t", None)
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                cell.set("t", "b")
+                etree.SubElement(cell, f"{{{_MAIN_NS}}}v").text = "1" if value else "0"
+            elif isinstance(value, (int, float)):
+                etree.SubElement(cell, f"{{{_MAIN_NS}}}v").text = repr(value)
+            else:
+                cell.set("t", "inlineStr")
+                inline = etree.SubElement(cell, f"{{{_MAIN_NS}}}is")
+                etree.SubElement(inline, f"{{{_MAIN_NS}}}t").text = str(value)
+
+        return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    @staticmethod
+    def _without_calc_chain(name: str, data: bytes) -> bytes:
+        """ลบ calcChain ออกจาก workbook rels / content types และสั่งให้ Excel คำนวณใหม่ตอนเปิด"""
+        if name == "[Content_Types].xml":
+            return re.sub(rb'<Override[^>]*PartName="/xl/calcChain.xml"[^>]*/>', b"", data)
+        if name == "xl/_rels/workbook.xml.rels":
+            return re.sub(rb'<Relationship[^>]*Target="(/xl/)?calcChain.xml"[^>]*/>', b"", data)
+        if name == "xl/workbook.xml":
+            root = etree.fromstring(data)
+            calc = root.find("m:calcPr", _NS)
+            if calc is None:
+                calc = etree.SubElement(root, f"{{{_MAIN_NS}}}calcPr")
+            calc.set("fullCalcOnLoad", "1")
+            return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+        return data
+
+    def save_patched(self, output_path: str, cells: Dict[str, Dict[Tuple[int, int], object]]):
+        """
+        เขียน Template ลง output_path พร้อมค่าใหม่
+
+        Args:
+            cells: {sheet_name: {(row, column): value}} (column เริ่มที่ 1)
+        """
+        patched = {self.sheet_parts[name]: values for name, values in cells.items() if values}
+        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for info, data in self.entries:
+                if info.filename == _CALC_CHAIN:
+                    continue  # ชี้ไปยังสูตรที่อาจถูกแทนที่แล้ว - Excel สร้างใหม่เอง
+                if info.filename in patched:
+                    data = self._patch_sheet(data, patched[info.filename])
+                else:
+                    data = self._without_calc_chain(info.filename, data)
+                archive.writestr(info, data, compress_type=zipfile.ZIP_DEFLATED)
+        return output_path
+
+
+_template_cache: Dict[str, Tuple[int, int, TemplateWorkbook]] = {}
+_template_lock = threading.Lock()
+
+
+def load_template(template_path: str) -> TemplateWorkbook:
+    """Template จาก cache (โหลดใหม่เมื่อไฟล์ถูกแก้ไข)"""
+    stat = os.stat(template_path)
+    key = os.path.abspath(template_path)
+    with _template_lock:
+        cached = _template_cache.get(key)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+    template = TemplateWorkbook(template_path)
+    with _template_lock:
+        _template_cache[key] = (stat.st_mtime_ns, stat.st_size, template)
+    return template
+
+
+def clear_template_cache():
+    with _template_lock:
+        _template_cache.clear()
+
+
+# ==================== Weekly Report ====================
+
+def collect_weekly_data(db: Session, project_id: int):
+    """ข้อมูลของ Weekly Report: Snapshots สำหรับ PB Curve [(week_number, plan_acc, actual_acc)]"""
+    return db.query(
+        models.WeeklySnapshot.week_number, models.WeeklySnapshot.plan_acc, models.WeeklySnapshot.actual_acc
+    ).filter(
+        models.WeeklySnapshot.project_id == project_id
+    ).order_by(models.WeeklySnapshot.week_number).all()
+
+
+PB_CURVE_SHEET = "PB Curve"
+PB_CURVE_START_ROW = 41
+
+
+def weekly_report_cells(snapshots) -> Dict[Tuple[int, int], object]:
+    """ค่า PB Curve ที่ต้องเติม {(row, column): value}"""
+    cells = {}
+    # เริ่มหยอดข้อมูลที่แถว 41 ตามพิกัดในไฟล์ของคุณ
+    for i, (week_number, plan_acc, actual_acc) in enumerate(snapshots):
+        row = PB_CURVE_START_ROW + i
+        cells[(row, 2)] = week_number  # Column B
+        cells[(row, 3)] = plan_acc     # Column C
+        cells[(row, 4)] = actual_acc   # Column D
+    return cells
+
+
+def render_weekly_report(snapshots, template_path: str, output_path: str):
+    """เติมข้อมูล PB Curve ลง Template (จาก cache) แล้วบันทึกเป็น output_path"""
+    template = load_template(template_path)
+    cells = weekly_report_cells(snapshots) if PB_CURVE_SHEET in template.sheetnames else {}
+    return template.save_patched(output_path, {PB_CURVE_SHEET: cells})
+
+
+def render_weekly_report_openpyxl(snapshots, template_path: str, output_path: str):
+    """วิธีเดิม: โหลด Template ทั้งไฟล์ด้วย openpyxl ทุกครั้ง (ใช้เทียบใน bench_excel.py)"""
+    wb = openpyxl.load_workbook(template_path)
+    if PB_CURVE_SHEET in wb.sheetnames:
+        sheet = wb[PB_CURVE_SHEET]
+        for (row, column), value in weekly_report_cells(snapshots).items():
+            sheet.cell(row=row, column=column).value = value
+    wb.save(output_path)
+    return output_path
+
+
 def export_weekly_report(db: Session, project_id: int, template_path: str, output_path: str):
     """
     สร้าง Weekly Report จาก Template โดยเติมข้อมูล PB Curve
@@ -15,22 +217,185 @@ def export_weekly_report(db: Session, project_id: int, template_path: str, outpu
     Returns:
         output_path: ที่อยู่ไฟล์ที่สร้างเสร็จ
     """
-    # โหลดไฟล์ต้นฉบับที่คุณแชร์มา
-    wb = openpyxl.load_workbook(template_path)
-    
-    # ดึงข้อมูล Snapshots เพื่อไปทำ PB Curve
-    snapshots = db.query(models.WeeklySnapshot).filter(
-        models.WeeklySnapshot.project_id == project_id
-    ).order_by(models.WeeklySnapshot.week_number).all()
-    
-    if "PB Curve" in wb.sheetnames:
-        sheet = wb["PB Curve"]
-        # เริ่มหยอดข้อมูลที่แถว 41 ตามพิกัดในไฟล์ของคุณ
-        start_row = 41
-        for i, snap in enumerate(snapshots):
-            sheet.cell(row=start_row + i, column=2).value = snap.week_number  # Column B
-            sheet.cell(row=start_row + i, column=3).value = snap.plan_acc    # Column C
-            sheet.cell(row=start_row + i, column=4).value = snap.actual_acc  # Column D
+    return render_weekly_report(collect_weekly_data(db, project_id), template_path, output_path)
+
+
+# ==================== Daily Progress ====================
+# Template เดิม (Daily_Progress_PH(PU).xls) เป็น .xls ซึ่ง openpyxl เปิดไม่ได้ จึงสร้างไฟล์ .xlsx ใหม่
+# ด้วย write-only mode (เขียนทีละแถวลงไฟล์ หน่วยความจำไม่โตตามจำนวน Task)
+# โดยใช้ตำแหน่งแถว / คอลัมน์ตาม layout ของแต่ละ Template (DAILY_LAYOUTS)
+
+DAILY_QUERY_CHUNK = 1000
+
+
+class DailyRow(NamedTuple):
+    task_id: str
+    task_name: str
+    task_type: str
+    phase: str
+    assignees: str
+    planned_start: Optional[datetime.date]
+    planned_end: Optional[datetime.date]
+    weight: float
+    plan_progress: float
+    actual_progress: float
+    variance: float
+
+
+class DailyColumn(NamedTuple):
+    header: str
+    field: str                      # ชื่อ field ของ DailyRow
+    width: float = 12
+    number_format: Optional[str] = None
+
+
+class DailyLayout(NamedTuple):
+    sheet: str
+    title_row: int                  # ชื่อโปรเจกต์ + วันที่รายงาน
+    header_row: int                 # หัวตาราง (Task เริ่มแถวถัดไป)
+    columns: Tuple[DailyColumn, ...]
+
+
+_DATE_FORMAT = "dd/mm/yyyy"
+_PERCENT_FORMAT = "0.0"
+
+DEFAULT_DAILY_LAYOUT = DailyLayout("Daily Progress", 1, 3, (
+    DailyColumn("Task ID", "task_id", 14),
+    DailyColumn("Task Name", "task_name", 40),
+    DailyColumn("Type", "task_type", 12),
+    DailyColumn("Phase", "phase", 20),
+    DailyColumn("Assignees", "assignees", 28),
+    DailyColumn("Planned Start", "planned_start", 13, _DATE_FORMAT),
+    DailyColumn("Planned End", "planned_end", 13, _DATE_FORMAT),
+    DailyColumn("Weight", "weight", 9, "0.00"),
+    DailyColumn("Plan %", "plan_progress", 9, _PERCENT_FORMAT),
+    DailyColumn("Actual %", "actual_progress", 9, _PERCENT_FORMAT),
+    DailyColumn("Variance %", "variance", 11, _PERCENT_FORMAT),
+))
+
+# Layout ต่อ Template (ชื่อไฟล์) - ตำแหน่งตาม sheet "Daily Plan" ของ Template PH(PU):
+# ชื่อรายงานแถว 2, หัวตารางแถว 10 เริ่มคอลัมน์ E
+DAILY_LAYOUTS: Dict[str, DailyLayout] = {
+    "Daily_Progress_PH(PU).xls": DailyLayout("Daily Plan", 2, 10, (
+        DailyColumn("", "", 2),
+    ) * 4 + DEFAULT_DAILY_LAYOUT.columns),
+}
+
+
+def daily_layout(template_path: str) -> DailyLayout:
+    return DAILY_LAYOUTS.get(os.path.basename(template_path), DEFAULT_DAILY_LAYOUT)
+
+
+def plan_progress(start: Optional[datetime.date], end: Optional[datetime.date], today: datetime.date) -> float:
+    """% ตามแผน ณ วันนี้ (เส้นตรงตามจำนวนวันระหว่าง planned_start ถึง planned_end)"""
+    if not start or not end:
+        return 0.0
+    if today >= end:
+        return 100.0
+    if today < start:
+        return 0.0
+    return round(((today - start).days + 1) * 100.0 / ((end - start).days + 1), 1)
+
+
+def _daily_rows(db: Session, project_id: int, today: datetime.date):
+    """DailyRow ของทุก Task จาก joined query เดียว (Task ที่มีหลาย Resource รวมชื่อเป็นแถวเดียว)"""
+    task = models.Task
+    primary = aliased(models.Resource)
+    assignee = aliased(models.Resource)
+    query = (
+        db.query(
+            task.id, task.task_id, task.task_name, task.task_type, models.ProjectPhase.phase_name,
+            task.planned_start, task.planned_end, task.weight_score, task.actual_progress,
+            primary.full_name, assignee.full_name,
+        )
+        .outerjoin(models.ProjectPhase, models.ProjectPhase.id == task.phase_id)
+        .outerjoin(primary, primary.id == task.assigned_resource_id)
+        .outerjoin(models.TaskResource, models.TaskResource.task_id == task.id)
+        .outerjoin(assignee, assignee.id == models.TaskResource.resource_id)
+        .filter(task.project_id == project_id)
+        .order_by(models.ProjectPhase.id, task.planned_start, task.id, models.TaskResource.id)
+        .yield_per(DAILY_QUERY_CHUNK)
+    )
+
+    for _, joined in groupby(query, key=lambda row: row[0]):
+        first = next(joined)
+        names = [first[9]] if first[9] else []
+        for row in chain([first], joined):
+            if row[10] and row[10] not in names:
+                names.append(row[10])
+        plan = plan_progress(first.planned_start, first.planned_end, today)
+        actual = first.actual_progress or 0.0
+        yield DailyRow(
+            first.task_id, first.task_name, first.task_type, first.phase_name or "", ", ".join(names),
+            first.planned_start, first.planned_end, first.weight_score or 0.0, plan, actual, actual - plan,
+        )
+
+
+def collect_daily_data(db: Session, project_id: int):
+    """
+    ข้อมูลของ Daily Progress Report: (ชื่อโปรเจกต์, วันที่รายงาน, DailyRow iterator)
+    แถวถูกอ่านจากฐานข้อมูลระหว่างเขียนไฟล์ (ใช้ db ต่อจนกว่า render_daily_progress จะเสร็จ)
+    """
+    today = datetime.date.today()
+    project_name = db.query(models.Project.name).filter(models.Project.id == project_id).scalar()
+    return project_name or "", today, _daily_rows(db, project_id, today)
+
+
+def daily_data_digest(db: Session, project_id: int) -> str:
+    """sha256 ของข้อมูล Daily Progress Report (อ่านแถวแบบ stream - ใช้เป็น cache key โดยไม่เก็บทุกแถว)"""
+    project_name, today, rows = collect_daily_data(db, project_id)
+    digest = hashlib.sha256(repr((project_name, today)).encode("utf-8"))
+    for row in rows:
+        digest.update(repr(tuple(row)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def render_daily_progress(data, template_path: str, output_path: str):
+    """เขียน Daily Progress Report (.xlsx) แบบ write-only ตาม layout ของ Template"""
+    project_name, report_date, rows = data
+    layout = daily_layout(template_path)
+
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet(layout.sheet)
+    for index, column in enumerate(layout.columns, start=1):
+        sheet.column_dimensions[get_column_letter(index)].width = column.width
+    sheet.freeze_panes = f"A{layout.header_row + 1}"
+
+    def styled(value, font=None, fill=None, number_format=None):
+        cell = WriteOnlyCell(sheet, value=value)
+        if font:
+            cell.font = font
+        if fill:
+            cell.fill = fill
+        if number_format:
+            cell.number_format = number_format
+        return cell
+
+    # write-only เขียนได้ทีละแถวจากบนลงล่างเท่านั้น
+    first_column = next(i for i, column in enumerate(layout.columns) if column.field)
+    lead = [None] * first_column
+    for row in range(1, layout.header_row):
+        if row == layout.title_row:
+            sheet.append(lead + [styled(f"Daily Progress Report - {project_name}", Font(bold=True, size=14))])
+        elif row == layout.title_row + 1:
+            sheet.append(lead + [styled(report_date, number_format=_DATE_FORMAT)])
+        else:
+            sheet.append([])
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill("solid", fgColor="305496")
+    sheet.append([
+        styled(column.header, header_font, header_fill) if column.field else None
+        for column in layout.columns
+    ])
+
+    formats = [column.number_format for column in layout.columns]
+    for row in rows:
+        values = [getattr(row, column.field) if column.field else None for column in layout.columns]
+        sheet.append([
+            styled(value, number_format=fmt) if fmt and value is not None else value
+            for value, fmt in zip(values, formats)
+        ])
 
     wb.save(output_path)
     return output_path
@@ -38,7 +403,7 @@ def export_weekly_report(db: Session, project_id: int, template_path: str, outpu
 
 def export_daily_progress(db: Session, project_id: int, template_path: str, output_path: str):
     """
-    สร้าง Daily Progress Report จาก Template
+    สร้าง Daily Progress Report (.xlsx) ตาม layout ของ Template
     
     Args:
         db: Database session
@@ -49,21 +414,4 @@ def export_daily_progress(db: Session, project_id: int, template_path: str, outp
     Returns:
         output_path: ที่อยู่ไฟล์ที่สร้างเสร็จ
     """
-    # โหลดไฟล์ต้นฉบับ
-    wb = openpyxl.load_workbook(template_path)
-    
-    # ดึงข้อมูล Tasks ของโปรเจกต์
-    tasks = db.query(models.Task).filter(
-        models.Task.project_id == project_id
-    ).all()
-    
-    # สามารถเพิ่ม logic การเติมข้อมูลตามโครงสร้างของ Template
-    # ตัวอย่าง: เติมข้อมูลใน Sheet แรก
-    if wb.sheetnames:
-        sheet = wb[wb.sheetnames[0]]
-        # เพิ่ม logic การเติมข้อมูลตามต้องการ
-        # sheet.cell(row=X, column=Y).value = data
-    
-    wb.save(output_path)
-    return output_path
-
+    return render_daily_progress(collect_daily_data(db, project_id), template_path, output_path)
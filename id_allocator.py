@@ -0,0 +1,111 @@
+"""
+ID Allocator for aiD_PM
+Sequence-backed allocation of human-readable codes:
+- Task IDs: 3 chars of customer + 3 chars of project + running number (CUSPRO001)
+- Function codes: one global running number (FURE-001)
+
+Each prefix has one row in `id_sequences`. Reserving N numbers is a single
+UPDATE ... RETURNING inside the caller's transaction, so concurrent requests
+queue on that row and can never receive the same number, and a rolled-back
+request gives its numbers back. A new sequence is seeded once from the highest
+number already in use (one range scan on the unique index).
+
+Numbers are zero-padded to at least NUMBER_WIDTH digits; after 999 the codes
+simply grow (CUSPRO1000).
+"""
+
+import re
+from typing import Callable, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+
+NUMBER_WIDTH = 3
+FUNCTION_CODE_PREFIX = "FURE-"
+
+_sequences = models.IdSequence.__table__
+
+
+def format_code(prefix: str, number: int) -> str:
+    return f"{prefix}{number:0{NUMBER_WIDTH}d}"
+
+
+def max_code_number(db: Session, column, prefix: str) -> int:
+    """เลขสูงสุดของ code ที่ขึ้นต้นด้วย prefix (range scan บน index ของ column)"""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    pattern = re.compile(rf"^{re.escape(prefix)}(\d+)$")
+    numbers = [
+        int(match.group(1))
+        for (code,) in db.query(column).filter(column >= prefix, column < upper)
+        if code and (match := pattern.match(code))
+    ]
+    return max(numbers, default=0)
+
+
+def _insert_if_missing(db: Session, name: str, last_value: int):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        statement = sqlite.insert(_sequences).on_conflict_do_nothing(index_elements=["name"])
+    elif dialect == "postgresql":
+        statement = postgresql.insert(_sequences).on_conflict_do_nothing(index_elements=["name"])
+    else:
+        statement = _sequences.insert()
+    db.execute(statement.values(name=name, last_value=last_value))
+
+
+def reserve(db: Session, name: str, count: int = 1, seed: Optional[Callable[[], int]] = None) -> int:
+    """
+    จองเลข count ตัวติดกันจาก sequence `name` (ใน transaction ของ db, ยังไม่ commit)
+
+    Args:
+        seed: คืนค่าเลขล่าสุดที่ใช้ไปแล้ว (เรียกครั้งเดียวตอนสร้าง sequence ใหม่)
+
+    Returns: เลขตัวแรกของช่วงที่จองได้
+    """
+    if count < 1:
+        raise ValueError("count must be >= 1")
+
+    statement = (
+        update(_sequences)
+        .where(_sequences.c.name == name)
+        .values(last_value=_sequences.c.last_value + count)
+        .returning(_sequences.c.last_value)
+    )
+    row = db.execute(statement).first()
+    if row is None:
+        _insert_if_missing(db, name, seed() if seed else 0)
+        row = db.execute(statement).first()
+    return row[0] - count + 1
+
+
+# ===== Task IDs =====
+
+def task_id_prefix(customer: Optional[str], project_name: Optional[str]) -> str:
+    """3 ตัวอักษรจากลูกค้า + 3 ตัวอักษรจากชื่อโปรเจกต์ (ตัดช่องว่าง/อักขระพิเศษ)"""
+    customer_clean = re.sub(r'[^A-Za-z0-9]', '', customer or 'GEN')[:3].upper().ljust(3, 'X')
+    project_clean = re.sub(r'[^A-Za-z0-9]', '', project_name or 'PRJ')[:3].upper().ljust(3, 'X')
+    return f"{customer_clean}{project_clean}"
+
+
+def allocate_task_ids(db: Session, customer: Optional[str], project_name: Optional[str], count: int = 1) -> List[str]:
+    """จอง Task ID ใหม่ count ตัวสำหรับโปรเจกต์ (ใช้กับ bulk import ได้ในครั้งเดียว)"""
+    prefix = task_id_prefix(customer, project_name)
+    first = reserve(
+        db, f"task:{prefix}", count,
+        seed=lambda: max_code_number(db, models.Task.task_id, prefix)
+    )
+    return [format_code(prefix, number) for number in range(first, first + count)]
+
+
+# ===== Function codes =====
+
+def allocate_function_codes(db: Session, count: int = 1) -> List[str]:
+    """จอง Function Code ใหม่ count ตัว (FURE-001, ...) - ใช้ทั้งสร้างทีละตัวและ bulk upload"""
+    first = reserve(
+        db, f"function:{FUNCTION_CODE_PREFIX}", count,
+        seed=lambda: max_code_number(db, models.ProjectFunction.function_code, FUNCTION_CODE_PREFIX)
+    )
+    return [format_code(FUNCTION_CODE_PREFIX, number) for number in range(first, first + count)]
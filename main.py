@@ -1,22 +1,31 @@
 from fastapi import FastAPI, Depends, HTTPException, Form, Request, File, UploadFile
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
 from typing import List, Optional
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, ConfigDict
 import datetime
 import os
-import re
 import shutil
 import threading
 import time
 
 import models
-from database import engine, get_db, init_db
-import excel_engine
-import report_engine
+import database
+from database import engine, get_db, init_db, retry_on_locked, SessionLocal
+import forecast_engine
+import id_allocator
+import report_jobs
+import critical_path
+import progress_service
+import resource_leveling
+import risk_engine
+import workload_service
+import working_calendar
 from ai_assistant import ai_assistant
 
 def auto_backup_worker():
@@ -35,11 +44,11 @@ def auto_backup_worker():
     while True:
         try:
             # Perform backup
-            if os.path.exists("pm_system.db"):
+            if not database.IS_SQLITE or os.path.exists(engine.url.database or ""):
                 timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                 backup_filename = f"aiD_PM_auto_backup_{timestamp}.db"
                 backup_path = os.path.join(BACKUP_DIR, backup_filename)
-                shutil.copy("pm_system.db", backup_path)
+                database.backup_database(backup_path)
                 
                 # Rotation logic: Keep only the last MAX_BACKUPS
                 files = [f for f in os.listdir(BACKUP_DIR) if f.startswith("aiD_PM_auto_backup_") and f.endswith(".db")]
@@ -53,65 +62,32 @@ def auto_backup_worker():
             
         time.sleep(INTERVAL)
 
-# Start auto-backup thread as a daemon
-threading.Thread(target=auto_backup_worker, daemon=True).start()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Server startup: runs once in the serving process only - not on import, so spawned
+    worker processes (portfolio_report) that re-import this module start nothing"""
+    # Start auto-backup thread as a daemon
+    threading.Thread(target=auto_backup_worker, daemon=True).start()
 
-# สร้างตารางในฐานข้อมูล
-init_db()
+    # สร้างตารางในฐานข้อมูล
+    init_db()
 
-def generate_task_id(customer: str, project_name: str, db: Session) -> str:
-    """Generate unique Task ID: 3 chars from customer + 3 chars from project + 3-digit running number"""
-    # Extract 3 characters from customer (remove spaces and special chars)
-    customer_clean = re.sub(r'[^A-Za-z0-9]', '', customer or 'GEN')[:3].upper().ljust(3, 'X')
-    
-    # Extract 3 characters from project name (remove spaces and special chars)  
-    project_clean = re.sub(r'[^A-Za-z0-9]', '', project_name or 'PRJ')[:3].upper().ljust(3, 'X')
-    
-    # Create base prefix
-    base_prefix = f"{customer_clean}{project_clean}"
-    
-    # Find all existing Task IDs with this prefix
-    existing_tasks = db.query(models.Task).filter(
-        models.Task.task_id.like(f"{base_prefix}%")
-    ).all()
-    
-    # Get existing numbers for this prefix
-    used_numbers = []
-    for existing_task in existing_tasks:
-        if (existing_task.task_id and 
-            len(existing_task.task_id) >= 6 and 
-            existing_task.task_id.startswith(base_prefix)):
-            try:
-                num = int(existing_task.task_id[-3:])
-                used_numbers.append(num)
-            except ValueError:
-                continue
-    
-    # Find the next available number
-    next_number = 1
-    while next_number in used_numbers:
-        next_number += 1
-    
-    # Format with leading zeros
-    return f"{base_prefix}{next_number:03d}"
+    # Start risk-score refresh thread (date rollover + task changes)
+    risk_engine.worker.start(SessionLocal)
 
+    # Start report worker pool (PDF / Excel exports)
+    report_jobs.queue.start(SessionLocal)
+    yield
 
-def generate_function_code(project_id: int, db: Session) -> str:
-    """Generate unique Function Code format: FURE-001"""
-    # Find the maximum existing numeric suffix for FURE-XXX
-    existing_functions = db.query(models.ProjectFunction).all()
+def generate_task_id(customer: str, project_name: str, db: Session) -> str:
+    """Generate unique Task ID: 3 chars from customer + 3 chars from project + running number (>= 3 digits)"""
+    # Reserved from the prefix sequence inside the caller's transaction (race-free)
+    return id_allocator.allocate_task_ids(db, customer, project_name)[0]
 
-    used_numbers = []
-    for f in existing_functions:
-        if f.function_code and f.function_code.startswith("FURE-"):
-            try:
-                num = int(f.function_code.split("-")[1])
-                used_numbers.append(num)
-            except (ValueError, IndexError):
-                continue
 
-    next_number = max(used_numbers) + 1 if used_numbers else 1
-    return f"FURE-{next_number:03d}"
+def generate_function_code(project_id: int, db: Session) -> str:
+    """Generate unique Function Code format: FURE-001 (global sequence, race-free)"""
+    return id_allocator.allocate_function_codes(db)[0]
 
 
 def get_timeline_months(start_date, end_date):
@@ -146,7 +122,7 @@ def get_timeline_months(start_date, end_date):
     return months
 
 
-app = FastAPI(title="Smart PM Control Tower (aiD_PM)", version="1.5.0 - AI Powered")
+app = FastAPI(title="Smart PM Control Tower (aiD_PM)", version="1.5.0 - AI Powered", lifespan=lifespan)
 
 # ตั้งค่า Templates และ Static files
 templates = Jinja2Templates(directory="templates")
@@ -235,7 +211,8 @@ class TaskResponse(BaseModel):
     planned_end: Optional[datetime.date]
     actual_progress: float
     assigned_resource_id: Optional[int]
-    ai_risk_score: float
+    ai_risk_score: Optional[float] = None
+    ai_risk_computed_at: Optional[datetime.datetime] = None
 
 class WeeklySnapshotCreate(BaseModel):
     project_id: int
@@ -345,24 +322,19 @@ async def dashboard(request: Request, db: Session = Depends(get_db)):
         models.Task.actual_progress < 100
     ).all()
     
-    # คำนวณ Progress จริงสำหรับแต่ละโปรเจกต์ (Value-Based)
+    # คำนวณ Progress จริงสำหรับแต่ละโปรเจกต์ (Value-Based) - grouped query เดียว
+    progress_map = progress_service.get_progress_map(db, [p.id for p in projects])
+    function_counts = progress_service.get_function_count_map(db)
+    
     projects_with_progress = []
     for project in projects:
-        tasks = db.query(models.Task).filter(models.Task.project_id == project.id).all()
-        
-        if tasks:
-            total_weight = sum(t.weight_score for t in tasks)
-            weighted_progress = sum((t.actual_progress / 100) * t.weight_score for t in tasks)
-            progress = (weighted_progress / total_weight * 100) if total_weight > 0 else 0
-        else:
-            progress = 0
-        
+        summary = progress_map[project.id]
         projects_with_progress.append({
             'project': project,
-            'progress': round(progress, 1),
-            'task_count': len(tasks),
-            'completed_tasks': len([t for t in tasks if t.actual_progress == 100]),
-            'function_count': db.query(models.ProjectFunction).filter(models.ProjectFunction.project_id == project.id).count()
+            'progress': round(summary['progress'], 1),
+            'task_count': summary['task_count'],
+            'completed_tasks': summary['completed_tasks'],
+            'function_count': function_counts.get(project.id, 0)
         })
     
     return templates.TemplateResponse("dashboard.html", {
@@ -497,23 +469,31 @@ async def settings_page(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.get("/kanban", response_class=HTMLResponse)
-async def kanban_page(request: Request, project_id: Optional[int] = None, db: Session = Depends(get_db)):
+async def kanban_page(
+    request: Request,
+    project_id: Optional[int] = None,
+    min_risk: Optional[float] = None,
+    sort: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """หน้า Kanban Board"""
     projects = db.query(models.Project).all()
     all_resources = db.query(models.Resource).all()  # Add resources for task display
     
     # Filter tasks by project if specified
+    query = db.query(models.Task)
     if project_id:
-        tasks = db.query(models.Task).filter(models.Task.project_id == project_id).all()
-    else:
-        tasks = db.query(models.Task).all()
+        query = query.filter(models.Task.project_id == project_id)
+    tasks = risk_engine.apply_risk_query(query, min_risk, sort).all()
     
     return templates.TemplateResponse("kanban.html", {
         "request": request,
         "projects": projects,
         "tasks": tasks,
         "all_resources": all_resources,  # Add resources to template context
-        "selected_project_id": project_id
+        "selected_project_id": project_id,
+        "min_risk": min_risk,
+        "sort": sort
     })
 
 @app.get("/workload", response_class=HTMLResponse)
@@ -521,35 +501,8 @@ async def workload_page(request: Request, db: Session = Depends(get_db)):
     """หน้า Team Workload - แสดง Workload ของแต่ละ Resource (รองรับ Multi-Assign)"""
     resources = db.query(models.Resource).filter(models.Resource.is_active == True).all()
     
-    # คำนวณ workload สำหรับแต่ละ resource
-    workload_data = []
-    for resource in resources:
-        # Get tasks from both old (assigned_resource_id) and new (task_resources) system
-        tasks_old = db.query(models.Task).filter(models.Task.assigned_resource_id == resource.id).all()
-        
-        # Get tasks from multi-assign table
-        task_ids_new = db.query(models.TaskResource.task_id).filter(
-            models.TaskResource.resource_id == resource.id
-        ).all()
-        tasks_new = db.query(models.Task).filter(
-            models.Task.id.in_([t.task_id for t in task_ids_new])
-        ).all()
-        
-        # Combine and deduplicate
-        all_tasks = {t.id: t for t in tasks_old + tasks_new}.values()
-        tasks = list(all_tasks)
-        
-        workload_data.append({
-            'resource': resource,
-            'tasks': tasks,
-            'task_count': len(tasks),
-            'todo_count': len([t for t in tasks if t.actual_progress == 0]),
-            'in_progress_count': len([t for t in tasks if 0 < t.actual_progress < 100]),
-            'completed_count': len([t for t in tasks if t.actual_progress == 100])
-        })
-    
-    # Sort by task count (descending)
-    workload_data.sort(key=lambda x: x['task_count'], reverse=True)
+    # คำนวณ workload สำหรับแต่ละ resource (batched - จำนวน query คงที่)
+    workload_data = workload_service.get_workload_data(db, resources)
     
     projects = db.query(models.Project).all()
     
@@ -576,18 +529,11 @@ async def management_control_page(request: Request, db: Session = Depends(get_db
     resources_with_skills = 0
     total_speed = 0
     
+    workload_map = workload_service.get_workload_counts(db, [r.id for r in resources])
+    
     for resource in resources:
         # Count tasks
-        tasks_old = db.query(models.Task).filter(models.Task.assigned_resource_id == resource.id).all()
-        task_ids_new = db.query(models.TaskResource.task_id).filter(
-            models.TaskResource.resource_id == resource.id
-        ).all()
-        tasks_new = db.query(models.Task).filter(
-            models.Task.id.in_([t.task_id for t in task_ids_new])
-        ).all()
-        all_resource_tasks = {t.id: t for t in tasks_old + tasks_new}.values()
-        task_count = len(list(all_resource_tasks))
-        workload_counts.append(task_count)
+        workload_counts.append(workload_map[resource.id]['task_count'])
         
         # Count skills
         if resource.skills:
@@ -661,12 +607,21 @@ async def calendar_page(request: Request, project_id: Optional[int] = None, db:
     
     # Sort by date
     upcoming_tasks.sort(key=lambda t: t.planned_end if t.planned_end else datetime.date.max)
+    upcoming_tasks = upcoming_tasks[:10]  # Limit to 10
+    
+    # Working days left (per-project holidays)
+    calendars = working_calendar.get_calendars(db, {t.project_id for t in upcoming_tasks})
+    working_days_left = {
+        t.id: calendars[t.project_id].working_days_between(today, t.planned_end + datetime.timedelta(days=1))
+        for t in upcoming_tasks
+    }
     
     return templates.TemplateResponse("calendar.html", {
         "request": request,
         "projects": projects,
         "selected_project_id": project_id,
-        "upcoming_tasks": upcoming_tasks[:10],  # Limit to 10
+        "upcoming_tasks": upcoming_tasks,
+        "working_days_left": working_days_left,
         "this_week_tasks": this_week_tasks,
         "next_week_tasks": next_week_tasks,
         "overdue_tasks": overdue_tasks,
@@ -713,6 +668,24 @@ async def calendar_grid_page(
         'actual_progress': float(t.actual_progress)
     } for t in tasks])
     
+    # Non-working days of the month (weekends are shaded by the template)
+    holiday_query = db.query(models.Holiday).filter(
+        models.Holiday.holiday_date >= datetime.date(current_year, current_month, 1),
+        models.Holiday.holiday_date < (
+            datetime.date(current_year + 1, 1, 1) if current_month == 12
+            else datetime.date(current_year, current_month + 1, 1)
+        )
+    )
+    if project_id:
+        holiday_query = holiday_query.filter(
+            (models.Holiday.project_id.is_(None)) | (models.Holiday.project_id == project_id)
+        )
+    else:
+        holiday_query = holiday_query.filter(models.Holiday.project_id.is_(None))
+    holidays_json = json.dumps({
+        h.holiday_date.strftime('%Y-%m-%d'): h.name or 'Holiday' for h in holiday_query.all()
+    })
+    
     month_names = ['January', 'February', 'March', 'April', 'May', 'June',
                    'July', 'August', 'September', 'October', 'November', 'December']
     
@@ -723,7 +696,8 @@ async def calendar_grid_page(
         "current_month": current_month,
         "current_year": current_year,
         "current_month_name": month_names[current_month - 1],
-        "tasks_json": tasks_json
+        "tasks_json": tasks_json,
+        "holidays_json": holidays_json
     })
 
 @app.get("/tracking", response_class=HTMLResponse)
@@ -740,6 +714,7 @@ async def tracking_page(request: Request, project_id: Optional[int] = None, db:
     # หากเลือก Project เฉพาะเจาะจง จะแสดงข้อมูล Hierarchy
     hierarchy = []
     all_tasks = []
+    cycle_task_ids = []
     date_range = {'start': None, 'end': None, 'duration': 0}
 
     if project_id:
@@ -752,6 +727,28 @@ async def tracking_page(request: Request, project_id: Optional[int] = None, db:
         # ดึง Tasks ทั้งหมดของโปรเจกต์ (รวมที่ไม่มี Function)
         all_tasks = db.query(models.Task).filter(models.Task.project_id == project_id).all()
 
+        # Critical path (early/late dates + slack ต่อ Task)
+        try:
+            schedule = critical_path.compute_schedule(
+                all_tasks,
+                critical_path.load_dependencies(db, [project_id]).get(project_id, []),
+                working_calendar.get_calendar(db, project_id)
+            )["tasks"]
+        except critical_path.DependencyCycleError as e:
+            schedule = {}
+            cycle_task_ids = e.task_ids
+
+        def schedule_fields(t):
+            info = schedule.get(t.id)
+            if not info:
+                return {}
+            return {
+                'early_start': info['early_start'].strftime('%Y-%m-%d'),
+                'late_finish': info['late_finish'].strftime('%Y-%m-%d'),
+                'slack': info['slack'],
+                'is_critical': info['is_critical']
+            }
+
         # Helper to build hierarchy
         def build_node(func):
             # Tasks linked to this function
@@ -771,7 +768,8 @@ async def tracking_page(request: Request, project_id: Optional[int] = None, db:
                     'progress': float(t.actual_progress),
                     'planned_start': t.planned_start.strftime('%Y-%m-%d') if t.planned_start else None,
                     'planned_end': t.planned_end.strftime('%Y-%m-%d') if t.planned_end else None,
-                    'assigned_to': t.assigned_resource.nickname if t.assigned_resource else None
+                    'assigned_to': t.assigned_resource.nickname if t.assigned_resource else None,
+                    **schedule_fields(t)
                 } for t in func_tasks]
             
             all_children = children + task_nodes
@@ -814,6 +812,7 @@ async def tracking_page(request: Request, project_id: Optional[int] = None, db:
                     'progress': float(t.actual_progress),
                     'planned_start': t.planned_start.strftime('%Y-%m-%d') if t.planned_start else None,
                     'planned_end': t.planned_end.strftime('%Y-%m-%d') if t.planned_end else None,
+                    **schedule_fields(t)
                 } for t in orphan_tasks]
             })
 
@@ -833,7 +832,8 @@ async def tracking_page(request: Request, project_id: Optional[int] = None, db:
         "selected_project_id": project_id,
         "selected_project": selected_project,
         "hierarchy_json": json.dumps(hierarchy),
-        "date_range_json": json.dumps(date_range)
+        "date_range_json": json.dumps(date_range),
+        "cycle_task_ids": cycle_task_ids
     })
 
 # ==================== Issue Management Routes ====================
@@ -1361,18 +1361,6 @@ async def upload_functions(
     decoded = content.decode("utf-8-sig")
     csv_reader = csv.DictReader(StringIO(decoded))
     
-    # Pre-compute next available FURE number to avoid UNIQUE constraint errors
-    # when generate_function_code() can't see yet-uncommitted rows
-    existing_functions = db.query(models.ProjectFunction).all()
-    used_numbers = set()
-    for f in existing_functions:
-        if f.function_code and f.function_code.startswith("FURE-"):
-            try:
-                used_numbers.add(int(f.function_code.split("-")[1]))
-            except (ValueError, IndexError):
-                pass
-    next_num = max(used_numbers) + 1 if used_numbers else 1
-
     rows_to_add = []
     for row in csv_reader:
         function_name = row.get("function_name", "").strip()
@@ -1389,16 +1377,8 @@ async def upload_functions(
             
         description = row.get("description", "").strip()
         
-        # Generate code locally without re-querying DB
-        while next_num in used_numbers:
-            next_num += 1
-        function_code = f"FURE-{next_num:03d}"
-        used_numbers.add(next_num)
-        next_num += 1
-        
         rows_to_add.append(models.ProjectFunction(
             project_id=project_id,
-            function_code=function_code,
             function_name=function_name,
             category=category,
             priority=priority,
@@ -1408,6 +1388,9 @@ async def upload_functions(
         ))
 
     if rows_to_add:
+        # Reserve one block of codes for the whole file
+        for function, function_code in zip(rows_to_add, id_allocator.allocate_function_codes(db, len(rows_to_add))):
+            function.function_code = function_code
         db.add_all(rows_to_add)
         db.commit()
         
@@ -1431,14 +1414,19 @@ async def ai_breakdown_task(
     task_name: str = Form(...),
     task_type: str = Form(...),
     start_date: str = Form(...),
-    skip_weekends: bool = Form(True)
+    skip_weekends: bool = Form(True),
+    project_id: Optional[int] = Form(None),
+    db: Session = Depends(get_db)
 ):
     """AI endpoint to break down a task into subtasks"""
     subtasks = ai_assistant.breakdown_task(task_name, task_type)
     
-    # Add smart scheduling
+    # Add smart scheduling (public holidays + project holidays)
     start = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
-    scheduled = ai_assistant.suggest_schedule(subtasks, start, skip_weekends)
+    holidays = working_calendar.load_holidays(db, [project_id] if project_id else [])
+    scheduled = ai_assistant.suggest_schedule(
+        subtasks, start, skip_weekends, holidays[None] + holidays.get(project_id, [])
+    )
     
     return {
         "success": True,
@@ -1502,6 +1490,33 @@ async def ai_predict_risk(task_id: int, db: Session = Depends(get_db)):
         **risk_assessment
     }
 
+@app.get("/api/ai/risk")
+async def ai_risk_scores(project_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """AI endpoint to score every task of a project (or all projects) in one pass"""
+    if project_id is not None:
+        project = db.query(models.Project).filter(models.Project.id == project_id).first()
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+    
+    scored = risk_engine.score_project(db, project_id)
+    scored.sort(key=lambda item: item[1]["risk_score"], reverse=True)
+    
+    return {
+        "success": True,
+        "project_id": project_id,
+        "total_tasks": len(scored),
+        "risks": [
+            {
+                "task_id": task.id,
+                "task_code": task.task_id,
+                "task_name": task.task_name,
+                "project_id": task.project_id,
+                **risk
+            }
+            for task, risk in scored
+        ]
+    }
+
 @app.get("/api/ai/project-insights/{project_id}")
 async def ai_project_insights(project_id: int, db: Session = Depends(get_db)):
     """AI endpoint to generate project insights"""
@@ -1524,8 +1539,8 @@ async def download_backup():
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     backup_file = f"aiD_PM_backup_{timestamp}.db"
     
-    # Create backup
-    shutil.copy('pm_system.db', backup_file)
+    # Create backup (online backup API - includes pages still in the WAL)
+    database.backup_database(backup_file)
     
     return FileResponse(
         backup_file,
@@ -1538,19 +1553,31 @@ async def restore_backup(file: UploadFile = File(...)):
     """Restore database from backup file"""
     import shutil
     
+    import sqlite3
+    
     # Save uploaded file
     with open("pm_system_new.db", "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
     
     # Backup current DB
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    shutil.copy('pm_system.db', f'pm_system_backup_{timestamp}.db')
+    database.backup_database(f'pm_system_backup_{timestamp}.db')
     
     # Replace with new DB
-    shutil.move('pm_system_new.db', 'pm_system.db')
+    try:
+        database.restore_database("pm_system_new.db")
+    except sqlite3.DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid backup file: {e}")
+    finally:
+        os.remove("pm_system_new.db")
     
     return {"status": "success", "message": "Database restored successfully"}
 
+@app.get("/api/system/database")
+async def database_diagnostics():
+    """API: ค่า SQLite engine profile (WAL / pragmas / busy timeout) ที่ใช้อยู่"""
+    return database.get_engine_diagnostics()
+
 @app.get("/projects/list", response_class=HTMLResponse)
 async def projects_list_page(request: Request, db: Session = Depends(get_db)):
     """หน้ารายการโปรเจกต์ทั้งหมด"""
@@ -1558,15 +1585,8 @@ async def projects_list_page(request: Request, db: Session = Depends(get_db)):
     current_week = datetime.date.today().isocalendar()[1]
     
     # Build a separate dict to avoid setting attributes on ORM objects
-    project_progress = {}
-    for project in projects:
-        tasks = db.query(models.Task).filter(models.Task.project_id == project.id).all()
-        total_weight = sum(t.weight_score for t in tasks)
-        if total_weight > 0:
-            weighted_progress = sum((t.actual_progress / 100) * t.weight_score for t in tasks)
-            project_progress[project.id] = round((weighted_progress / total_weight) * 100, 1)
-        else:
-            project_progress[project.id] = 0.0
+    progress_map = progress_service.get_progress_map(db, [p.id for p in projects])
+    project_progress = {pid: round(summary['progress'], 1) for pid, summary in progress_map.items()}
     
     return templates.TemplateResponse("projects.html", {
         "request": request,
@@ -1635,6 +1655,12 @@ async def project_details_page(project_id: int, request: Request, db: Session =
         models.ProjectNote.project_id == project_id
     ).order_by(models.ProjectNote.created_at.desc()).all()
     
+    # Monte Carlo completion forecast
+    try:
+        forecast = forecast_engine.forecast_project(db, project_id)
+    except critical_path.DependencyCycleError:
+        forecast = None
+    
     return templates.TemplateResponse("project_details.html", {
         "request": request,
         "project": project,
@@ -1647,7 +1673,8 @@ async def project_details_page(project_id: int, request: Request, db: Session =
         "issues": issues,
         "functions": functions,
         "months_data": months_data,
-        "notes": notes
+        "notes": notes,
+        "forecast": forecast
     })
 
 @app.get("/projects/{project_id}/history", response_class=HTMLResponse)
@@ -1676,7 +1703,13 @@ async def create_project_page(request: Request):
     })
 
 @app.get("/tasks", response_class=HTMLResponse)
-async def tasks_page(request: Request, project_id: Optional[int] = None, db: Session = Depends(get_db)):
+async def tasks_page(
+    request: Request,
+    project_id: Optional[int] = None,
+    min_risk: Optional[float] = None,
+    sort: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """Tasks management page"""
     projects = db.query(models.Project).all()
     tasks = []
@@ -1684,7 +1717,8 @@ async def tasks_page(request: Request, project_id: Optional[int] = None, db: Ses
     
     selected_project_id = project_id
     if selected_project_id:
-        tasks = db.query(models.Task).filter(models.Task.project_id == selected_project_id).all()
+        query = db.query(models.Task).filter(models.Task.project_id == selected_project_id)
+        tasks = risk_engine.apply_risk_query(query, min_risk, sort).all()
         phases = db.query(models.ProjectPhase).filter(models.ProjectPhase.project_id == selected_project_id).all()
         
     return templates.TemplateResponse("tasks.html", {
@@ -1692,7 +1726,9 @@ async def tasks_page(request: Request, project_id: Optional[int] = None, db: Ses
         "projects": projects,
         "selected_project_id": selected_project_id,
         "tasks": tasks,
-        "phases": phases
+        "phases": phases,
+        "min_risk": min_risk,
+        "sort": sort
     })
 
 @app.get("/tasks/create", response_class=HTMLResponse)
@@ -1878,6 +1914,7 @@ async def create_project_form(
     return RedirectResponse(url=f"/projects/{project.id}/details", status_code=303)
 
 @app.post("/tasks/create")
+@retry_on_locked
 async def create_task_form(
     project_id: int = Form(...),
     task_name: str = Form(...),
@@ -1925,8 +1962,7 @@ async def create_task_form(
             status="not_started"
         )
         db.add(new_func)
-        db.commit()
-        db.refresh(new_func)
+        db.flush()  # commit together with the task (and its reserved codes)
         validated_function_id = new_func.id
     elif function_id and function_id.strip() and function_id != "custom":
         try:
@@ -1968,6 +2004,7 @@ async def create_task_form(
     return RedirectResponse(url=redirect_target, status_code=303)
 
 @app.post("/tasks/{task_id}/edit")
+@retry_on_locked
 async def edit_task_form(
     task_id: int,
     task_name: str = Form(...),
@@ -2071,6 +2108,7 @@ async def get_task_detail(task_id: int, db: Session = Depends(get_db)):
     }
 
 @app.post("/tasks/{task_id}/update")
+@retry_on_locked
 async def update_task_api(
     task_id: int,
     task_name: Optional[str] = Form(None),
@@ -2118,80 +2156,50 @@ async def delete_task_post(task_id: int, db: Session = Depends(get_db)):
 # ==================== CSV Import/Export Endpoints ====================
 
 import csv_handler
-from fastapi.responses import Response
+from fastapi.responses import StreamingResponse
 
 @app.get("/projects/{project_id}/tasks/export")
 @app.get("/projects/{project_id}/export-csv")  # Backward compatibility alias
 async def export_tasks_csv(project_id: int, db: Session = Depends(get_db)):
-    """Export all tasks for a project as CSV file"""
+    """Export all tasks for a project as CSV file (streamed, UTF-8 with BOM)"""
     # Check if project exists
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Get tasks count
-    tasks_count = db.query(models.Task).filter(models.Task.project_id == project_id).count()
-    
-    # Generate CSV
-    if tasks_count > 0:
-        csv_content = csv_handler.export_tasks_to_csv(project_id, db)
-    else:
-        # Return blank template if no tasks
-        csv_content = csv_handler.generate_blank_template()
+    def stream():
+        # Session ของตัวเอง: response ยังส่งต่ออยู่หลัง request dependency ปิดไปแล้ว
+        export_db = SessionLocal()
+        try:
+            for chunk in csv_handler.iter_tasks_csv(project_id, export_db):
+                yield chunk.encode('utf-8')
+        finally:
+            export_db.close()
     
-    # Return as downloadable file
+    # A project without tasks exports the header only (same as the blank template)
     filename = f"tasks_project_{project_id}_{datetime.datetime.now().strftime('%Y%m%d')}.csv"
-    
-    # Encode as UTF-8 with BOM for proper Unicode support
-    csv_bytes = '\ufeff'.encode('utf-8') + csv_content.encode('utf-8')
-    
-    return Response(
-        content=csv_bytes,
+    return StreamingResponse(
+        stream(),
         media_type="text/csv; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 @app.post("/projects/{project_id}/tasks/import")
+@retry_on_locked
 async def import_tasks_csv(
     project_id: int,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    """Import tasks from CSV file with strict validation"""
+    """Import tasks from CSV file with strict validation (streamed, single pass)"""
     # Check if project exists
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Read CSV content with better encoding handling
-    try:
-        csv_content = await file.read()
-        # Try UTF-8 first, then fall back to other encodings
-        try:
-            csv_text = csv_content.decode('utf-8')
-        except UnicodeDecodeError:
-            # Try UTF-8 with BOM
-            try:
-                csv_text = csv_content.decode('utf-8-sig')
-            except UnicodeDecodeError:
-                # Fall back to Windows encoding
-                try:
-                    csv_text = csv_content.decode('cp1252')
-                except UnicodeDecodeError:
-                    # Last resort: ISO-8859-1
-                    csv_text = csv_content.decode('iso-8859-1')
-    except Exception as e:
-        return {
-            "status": "error",
-            "success": False,
-            "created_count": 0,
-            "updated_count": 0,
-            "errors": [f"File read error: {str(e)}"],
-            "message": f"File read error: {str(e)}"
-        }
-    
-    # Import tasks
-    result = csv_handler.import_tasks_from_csv(project_id, csv_text, db)
+    # The upload is decoded and parsed incrementally (UTF-8, then cp1252, then ISO-8859-1)
+    # on a worker thread, so a large file does not block the event loop
+    result = await run_in_threadpool(csv_handler.import_tasks_from_csv, project_id, file.file, db)
     
     return result
 
@@ -2253,6 +2261,7 @@ async def api_recommend_resource(task_type: str, db: Session = Depends(get_db)):
     return get_system_recommendation(task_type, db)
 
 @app.post("/api/tasks/{task_id}/progress")
+@retry_on_locked
 async def api_update_task_progress(task_id: int, progress: float = Form(...), db: Session = Depends(get_db)):
     """API: อัพเดทความคืบหน้าของ Task"""
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
@@ -2271,26 +2280,11 @@ async def api_update_task_progress(task_id: int, progress: float = Form(...), db
     )
     db.add(activity)
     
-    # --- Data Sync: Update Project Progress ---
-    project = db.query(models.Project).filter(models.Project.id == task.project_id).first()
-    if project:
-        # Recalculate project progress
-        project_tasks = db.query(models.Task).filter(models.Task.project_id == project.id).all()
-        if project_tasks:
-            total_weight = sum(t.weight_score for t in project_tasks)
-            # Note: We use the NEW progress for the current task, but it's already set in 'task' object
-            # However, 'task' object in session might not be fully flushed for query re-fetch? 
-            # Actually, since we modified 'task' which is attached to session, it should be fine.
-            # Let's calculate manually to be safe and efficient without re-querying everything if possible,
-            # but re-querying is safer for consistency.
-            
-            # Use the values from the list we just queried, which includes the updated task (because same session)
-            weighted_progress = sum((t.actual_progress / 100) * t.weight_score for t in project_tasks)
-            new_project_progress = (weighted_progress / total_weight * 100) if total_weight > 0 else 0
-            
-            project.progress = new_project_progress
-            
+    # --- Data Sync: Project Progress ---
+    # Project.progress ถูกอัพเดทแบบ incremental (delta) ตอน flush โดย progress_service
     db.commit()
+    project = db.query(models.Project).filter(models.Project.id == task.project_id).first()
+    
     return {"status": "success", "task_id": task_id, "progress": progress, "project_progress": project.progress if project else None}
 
 @app.get("/api/tasks/{task_id}/comments")
@@ -2340,13 +2334,18 @@ async def add_task_comment(task_id: int, comment_text: str = Form(...), user_nam
     }
 
 @app.get("/api/tasks")
-async def get_tasks_by_project(project_id: Optional[int] = None, db: Session = Depends(get_db)):
-    """API: ดึง Tasks ตาม Project"""
+async def get_tasks_by_project(
+    project_id: Optional[int] = None,
+    min_risk: Optional[float] = None,
+    sort: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """API: ดึง Tasks ตาม Project (กรอง/เรียงตาม risk ได้)"""
     query = db.query(models.Task)
     if project_id:
         query = query.filter(models.Task.project_id == project_id)
     
-    tasks = query.all()
+    tasks = risk_engine.apply_risk_query(query, min_risk, sort).all()
     return {
         "tasks": [
             {
@@ -2355,7 +2354,9 @@ async def get_tasks_by_project(project_id: Optional[int] = None, db: Session = D
                 "task_type": t.task_type,
                 "actual_progress": float(t.actual_progress),
                 "planned_start": t.planned_start.strftime("%Y-%m-%d") if t.planned_start else None,
-                "planned_end": t.planned_end.strftime("%Y-%m-%d") if t.planned_end else None
+                "planned_end": t.planned_end.strftime("%Y-%m-%d") if t.planned_end else None,
+                "ai_risk_score": t.ai_risk_score,
+                "ai_risk_computed_at": t.ai_risk_computed_at.isoformat() if t.ai_risk_computed_at else None
             }
             for t in tasks
         ]
@@ -2382,17 +2383,13 @@ async def take_weekly_snapshot(project_id: int, db: Session = Depends(get_db)):
     สร้าง Weekly Snapshot จากความคืบหน้าปัจจุบัน
     คำนวณแบบ Value-Based (Weighted Progress)
     """
-    # 1. ดึงงานทั้งหมดในโปรเจกต์
-    tasks = db.query(models.Task).filter(models.Task.project_id == project_id).all()
+    # 1-2. คำนวณ % สะสมแบบถ่วงน้ำหนัก (Weighted Progress) ด้วย aggregate query
+    summary = progress_service.get_project_progress(db, project_id)
     
-    if not tasks:
+    if summary["task_count"] == 0:
         raise HTTPException(status_code=404, detail="No tasks found for this project")
     
-    # 2. คำนวณ % สะสมแบบถ่วงน้ำหนัก (Weighted Progress)
-    total_weight = sum(t.weight_score for t in tasks)
-    actual_weighted = sum((t.actual_progress / 100) * t.weight_score for t in tasks)
-    
-    actual_acc_percent = (actual_weighted / total_weight) * 100 if total_weight > 0 else 0
+    actual_acc_percent = summary["progress"]
     
     # 3. หา Week Number ปัจจุบัน (ISO week)
     current_week = datetime.date.today().isocalendar()[1]
@@ -2510,19 +2507,27 @@ def update_project(project_id: int, project_update: ProjectCreate, db: Session =
 @app.post("/tasks", response_model=TaskResponse)
 def create_task(task: TaskCreate, db: Session = Depends(get_db)):
     """API: สร้าง Task ใหม่"""
-    db_task = models.Task(**task.dict())
+    project = db.query(models.Project).filter(models.Project.id == task.project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    db_task = models.Task(**task.dict(), task_id=generate_task_id(project.customer, project.name, db))
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
     return db_task
 
 @app.get("/tasks", response_model=List[TaskResponse])
-def get_tasks(project_id: Optional[int] = None, db: Session = Depends(get_db)):
-    """API: ดึงรายการ Tasks (ตัวกรองตามโปรเจกต์ได้)"""
+def get_tasks(
+    project_id: Optional[int] = None,
+    min_risk: Optional[float] = None,
+    sort: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """API: ดึงรายการ Tasks (ตัวกรองตามโปรเจกต์ / risk ได้, sort=risk เรียงตามความเสี่ยง)"""
     query = db.query(models.Task)
     if project_id:
         query = query.filter(models.Task.project_id == project_id)
-    tasks = query.all()
+    tasks = risk_engine.apply_risk_query(query, min_risk, sort).all()
     return tasks
 
 @app.get("/tasks/{task_id}", response_model=TaskResponse)
@@ -2593,151 +2598,62 @@ async def toggle_phase_recovery(phase_id: int, db: Session = Depends(get_db)):
     
     return {"status": "success", "is_recovery_mode": phase.is_recovery_mode}
 
-# ==================== Excel Export ====================
+# ==================== Report Jobs ====================
+# Reports are rendered by report_jobs.queue in the background: the export
+# endpoints return a job (202) and the client polls status, then downloads
+
+def _report_job_response(job: models.ReportJob) -> JSONResponse:
+    return JSONResponse(status_code=202, content=report_jobs.job_info(job))
 
 @app.get("/export/weekly/{project_id}")
 def export_weekly_report_endpoint(project_id: int, db: Session = Depends(get_db)):
-    """ส่งออก Weekly Report เป็น Excel"""
-    template_path = "templates_excel/WeeklyReport_PH(PU).xlsx"
-    output_path = f"exports/WeeklyReport_Project_{project_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    
-    # Create exports directory if it doesn't exist
-    os.makedirs("exports", exist_ok=True)
-    
-    if not os.path.exists(template_path):
+    """ส่งออก Weekly Report เป็น Excel (background job)"""
+    if not db.query(models.Project.id).filter(models.Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    if not os.path.exists(report_jobs.WEEKLY_TEMPLATE):
         raise HTTPException(status_code=404, detail="Template file not found")
-    
-    try:
-        result_path = excel_engine.export_weekly_report(db, project_id, template_path, output_path)
-        return FileResponse(result_path, filename=os.path.basename(result_path))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
+    return _report_job_response(report_jobs.queue.submit(db, "weekly_excel", project_id=project_id))
 
 @app.get("/export/daily/{project_id}")
 def export_daily_progress_endpoint(project_id: int, db: Session = Depends(get_db)):
-    """ส่งออก Daily Progress Report เป็น Excel"""
-    template_path = "templates_excel/Daily_Progress_PH(PU).xls"
-    output_path = f"exports/DailyProgress_Project_{project_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xls"
-    
-    # Create exports directory if it doesn't exist
-    os.makedirs("exports", exist_ok=True)
-    
-    if not os.path.exists(template_path):
-        raise HTTPException(status_code=404, detail="Template file not found")
-    
-    try:
-        result_path = excel_engine.export_daily_progress(db, project_id, template_path, output_path)
-        return FileResponse(result_path, filename=os.path.basename(result_path))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
-
-# ==================== PDF Report Export ====================
+    """ส่งออก Daily Progress Report เป็น Excel (background job)"""
+    if not db.query(models.Project.id).filter(models.Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    return _report_job_response(report_jobs.queue.submit(db, "daily_excel", project_id=project_id))
 
 @app.get("/report/pdf/{project_id}")
-async def export_project_pdf_endpoint(project_id: int, db: Session = Depends(get_db)):
-    """Generate and export a 1-page Project Performance PDF Report"""
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project:
+def export_project_pdf_endpoint(project_id: int, db: Session = Depends(get_db)):
+    """Generate a 1-page Project Performance PDF Report (background job)"""
+    if not db.query(models.Project.id).filter(models.Project.id == project_id).first():
         raise HTTPException(status_code=404, detail="Project not found")
-    
-    # Aggregating data for the report
-    tasks = db.query(models.Task).filter(models.Task.project_id == project_id).all()
-    issues = db.query(models.Issue).filter(models.Issue.project_id == project_id).all()
-    
-    # 1. Total & Completed Tasks
-    tasks_total = len(tasks)
-    tasks_completed = len([t for t in tasks if t.actual_progress == 100])
-    
-    # 2. Weighted Progress
-    total_weight = sum(t.weight_score for t in tasks)
-    weighted_progress = sum((t.actual_progress / 100) * t.weight_score for t in tasks)
-    overall_progress = (weighted_progress / total_weight * 100) if total_weight > 0 else 0
-    
-    # 3. Remaining Hours
-    remaining_hours = sum(max(0, t.estimated_hours - t.actual_hours) for t in tasks)
-    
-    # 4. Issue Statistics
-    issues_open = len([i for i in issues if i.status.lower() != "closed"])
-    issues_critical = len([i for i in issues if i.severity.lower() in ["critical", "high"] and i.status.lower() != "closed"])
-    
-    # Issues resolved in the last 7 days
-    seven_days_ago = datetime.datetime.now() - datetime.timedelta(days=7)
-    issues_resolved_week = len([i for i in issues if i.status.lower() == "closed" and i.closed_at and i.closed_at >= seven_days_ago])
-    
-    # 5. Upcoming Milestones (Next 3 tasks/phases with deadlines)
-    now_date = datetime.date.today()
-    milestones_data = []
-    
-    # Get upcoming tasks with deadlines
-    upcoming_tasks = [t for t in tasks if t.planned_end and t.planned_end >= now_date and t.actual_progress < 100]
-    upcoming_tasks.sort(key=lambda x: x.planned_end)
-    for t in upcoming_tasks[:5]:
-        status = "Delayed" if t.planned_end < now_date else ("In Progress" if t.actual_progress > 0 else "Pending")
-        milestones_data.append({
-            "name": t.task_name,
-            "due_date": t.planned_end.strftime("%Y-%m-%d"),
-            "status": status
-        })
-
-    # 6. Resource Overview
-    # Find all resources assigned to this project's tasks
-    resource_ids = set()
-    for t in tasks:
-        if t.assigned_resource_id:
-            resource_ids.add(t.assigned_resource_id)
-        # Also check multi-assign
-        for tr in t.task_resources:
-            resource_ids.add(tr.resource_id)
-            
-    project_resources = []
-    for r_id in resource_ids:
-        res = db.query(models.Resource).filter(models.Resource.id == r_id).first()
-        if res:
-            # Count active tasks for this project
-            active_tasks = [t for t in tasks if (t.assigned_resource_id == r_id or any(tr.resource_id == r_id for tr in t.task_resources)) and t.actual_progress < 100]
-            project_resources.append({
-                "name": res.nickname or res.full_name,
-                "role": res.position or "Team Member",
-                "task_count": len(active_tasks)
-            })
-
-    # 7. AI Summary (Mocking or calling ai_assistant if it has a summary method)
-    ai_summary = f"Project is at {overall_progress:.1f}% completion. "
-    if issues_critical > 0:
-        ai_summary += f"Urgent attention required for {issues_critical} critical issues. "
-    if any(t.planned_end and t.planned_end < now_date and t.actual_progress < 100 for t in tasks):
-        ai_summary += "Some tasks are currently behind schedule. "
-    else:
-        ai_summary += "Scheduling appears healthy."
-
-    # Final data bundle
-    report_data = {
-        "name": project.name,
-        "customer": project.customer or "N/A",
-        "methodology": project.methodology,
-        "is_recovery_mode": project.is_recovery_mode,
-        "progress": overall_progress,
-        "tasks_total": tasks_total,
-        "tasks_completed": tasks_completed,
-        "remaining_hours": remaining_hours,
-        "issues_open": issues_open,
-        "issues_critical": issues_critical,
-        "issues_resolved_week": issues_resolved_week,
-        "milestones": milestones_data[:3], # Keep to top 3 for 1-page
-        "resources": project_resources,
-        "ai_summary": ai_summary
-    }
-
-    # Generate PDF
-    os.makedirs("exports", exist_ok=True)
-    filename = f"ProjectReport_{project_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    output_path = os.path.join("exports", filename)
-    
-    try:
-        report_engine.generate_project_pdf(report_data, output_path)
-        return FileResponse(output_path, filename=filename, media_type='application/pdf')
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating PDF report: {str(e)}")
+    return _report_job_response(report_jobs.queue.submit(db, "project_pdf", project_id=project_id))
+
+@app.get("/report/portfolio")
+def export_portfolio_report_endpoint(db: Session = Depends(get_db)):
+    """Project Performance PDF ของทุกโปรเจกต์ที่ active รวมเป็น zip (background job)"""
+    return _report_job_response(report_jobs.queue.submit(db, "portfolio_pdf"))
+
+@app.get("/api/reports/jobs/{job_id}")
+def get_report_job(job_id: str, db: Session = Depends(get_db)):
+    """สถานะของ report job"""
+    job = report_jobs.queue.get(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return report_jobs.job_info(job)
+
+@app.get("/api/reports/jobs/{job_id}/download")
+def download_report_job(job_id: str, db: Session = Depends(get_db)):
+    """ดาวน์โหลดไฟล์ของ report job ที่เสร็จแล้ว"""
+    job = report_jobs.queue.get(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job.status == report_jobs.FAILED:
+        raise HTTPException(status_code=500, detail=f"Error generating report: {job.error}")
+    if job.status != report_jobs.DONE:
+        raise HTTPException(status_code=409, detail=f"Report is not ready (status: {job.status})")
+    if not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=410, detail="Report file no longer exists")
+    return FileResponse(job.file_path, filename=job.filename, media_type=job.media_type)
 
 # ==================== Project Notes ====================
 
@@ -2783,6 +2699,271 @@ async def delete_project_note(project_id: int, note_id: int, db: Session = Depen
     
     return {"success": True, "message": "Note deleted successfully"}
 
+# ==================== Task Dependencies & Critical Path ====================
+
+@app.get("/api/tasks/{task_id}/dependencies")
+async def get_task_dependencies(task_id: int, db: Session = Depends(get_db)):
+    """API: Predecessors / Successors ของ Task"""
+    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    def link(dep, other):
+        return {
+            "id": dep.id,
+            "task_id": other.id,
+            "task_code": other.task_id,
+            "task_name": other.task_name,
+            "dependency_type": dep.dependency_type,
+            "lag_days": dep.lag_days
+        }
+    
+    return {
+        "predecessors": [link(d, d.predecessor) for d in task.predecessor_links],
+        "successors": [link(d, d.successor) for d in task.successor_links]
+    }
+
+@app.post("/api/tasks/{task_id}/dependencies")
+async def create_task_dependency(
+    task_id: int,
+    predecessor_id: int = Form(...),
+    lag_days: int = Form(0),
+    db: Session = Depends(get_db)
+):
+    """API: เพิ่ม Finish-to-Start dependency (predecessor ต้องเสร็จก่อน task_id เริ่ม)"""
+    successor = db.query(models.Task).filter(models.Task.id == task_id).first()
+    predecessor = db.query(models.Task).filter(models.Task.id == predecessor_id).first()
+    if not successor or not predecessor:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if predecessor.project_id != successor.project_id:
+        raise HTTPException(status_code=400, detail="Dependencies must be within the same project")
+    
+    existing = db.query(models.TaskDependency).filter(
+        models.TaskDependency.predecessor_id == predecessor_id,
+        models.TaskDependency.successor_id == task_id
+    ).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Dependency already exists")
+    if critical_path.would_create_cycle(db, successor.project_id, predecessor_id, task_id):
+        raise HTTPException(status_code=400, detail="Dependency would create a cycle")
+    
+    dependency = models.TaskDependency(predecessor_id=predecessor_id, successor_id=task_id, lag_days=lag_days)
+    db.add(dependency)
+    db.commit()
+    db.refresh(dependency)
+    
+    return {"success": True, "dependency_id": dependency.id}
+
+@app.delete("/api/task-dependencies/{dependency_id}")
+async def delete_task_dependency(dependency_id: int, db: Session = Depends(get_db)):
+    """API: ลบ dependency"""
+    dependency = db.query(models.TaskDependency).filter(models.TaskDependency.id == dependency_id).first()
+    if not dependency:
+        raise HTTPException(status_code=404, detail="Dependency not found")
+    
+    db.delete(dependency)
+    db.commit()
+    
+    return {"success": True, "message": "Dependency deleted successfully"}
+
+@app.get("/api/projects/{project_id}/critical-path")
+async def get_critical_path(project_id: int, db: Session = Depends(get_db)):
+    """API: Critical Path ของโปรเจกต์ (early/late dates และ slack เป็นวันทำงาน)"""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    try:
+        analysis = critical_path.analyze_project(db, project_id)
+    except critical_path.DependencyCycleError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    def fmt(d):
+        return d.strftime("%Y-%m-%d") if d else None
+    
+    return {
+        "success": True,
+        "project_id": project_id,
+        "project_start": fmt(analysis["project_start"]),
+        "project_finish": fmt(analysis["project_finish"]),
+        "critical_path": analysis["critical_path"],
+        "tasks": [
+            {
+                "task_id": task_id,
+                "duration": info["duration"],
+                "early_start": fmt(info["early_start"]),
+                "early_finish": fmt(info["early_finish"]),
+                "late_start": fmt(info["late_start"]),
+                "late_finish": fmt(info["late_finish"]),
+                "slack": info["slack"],
+                "is_critical": info["is_critical"],
+                "dependency_delay": info["dependency_delay"]
+            }
+            for task_id, info in analysis["tasks"].items()
+        ]
+    }
+
+# ==================== Resource Levelling ====================
+
+def _leveling_response(project_id: int, results: list) -> dict:
+    def fmt(d):
+        return d.strftime("%Y-%m-%d") if d else None
+    
+    changed = [r for r in results if r["changed"]]
+    old_ends = [r["task"].planned_end for r in results if r["task"].planned_end]
+    return {
+        "success": True,
+        "project_id": project_id,
+        "total_tasks": len(results),
+        "changed_tasks": len(changed),
+        "current_finish": fmt(max(old_ends)) if old_ends else None,
+        "leveled_finish": fmt(max(r["planned_end"] for r in results)) if results else None,
+        "tasks": [
+            {
+                "task_id": r["task"].id,
+                "task_code": r["task"].task_id,
+                "task_name": r["task"].task_name,
+                "resource_ids": r["resource_ids"],
+                "current_start": fmt(r["task"].planned_start),
+                "current_end": fmt(r["task"].planned_end),
+                "planned_start": fmt(r["planned_start"]),
+                "planned_end": fmt(r["planned_end"]),
+                "shift_days": r["shift_days"],
+                "changed": r["changed"]
+            }
+            for r in results
+        ]
+    }
+
+@app.get("/api/projects/{project_id}/leveling/preview")
+async def preview_resource_leveling(project_id: int, db: Session = Depends(get_db)):
+    """API: แสดงตารางงานหลังปรับตาม Resource (ยังไม่บันทึก)"""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    try:
+        results = resource_leveling.level_project(db, project_id)
+    except critical_path.DependencyCycleError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return _leveling_response(project_id, results)
+
+@app.post("/api/projects/{project_id}/leveling/apply")
+async def apply_resource_leveling(project_id: int, db: Session = Depends(get_db)):
+    """API: ปรับตารางงานตาม Resource และบันทึกวันที่ใหม่ของทุก Task ในครั้งเดียว"""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    try:
+        results = resource_leveling.level_project(db, project_id)
+    except critical_path.DependencyCycleError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    response = _leveling_response(project_id, results)
+    response["updated_tasks"] = resource_leveling.apply_leveling(db, results)
+    
+    # Log activity
+    db.add(models.ActivityLog(
+        project_id=project_id,
+        action_type="resource_leveling",
+        description=f"Resource levelling rescheduled {response['updated_tasks']} tasks",
+        user_name="System"
+    ))
+    db.commit()
+    
+    return response
+
+# ==================== Schedule Forecast ====================
+
+@app.get("/api/projects/{project_id}/forecast")
+def get_project_forecast(
+    project_id: int,
+    iterations: int = forecast_engine.DEFAULT_ITERATIONS,
+    seed: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """API: Monte Carlo forecast วันจบโปรเจกต์ (P50/P80/P95 และโอกาสเสร็จทัน planned_end)"""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    try:
+        forecast = forecast_engine.forecast_project(db, project_id, iterations=iterations, seed=seed)
+    except critical_path.DependencyCycleError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    def fmt(d):
+        return d.strftime("%Y-%m-%d") if d else None
+    
+    return {
+        "success": True,
+        "project_id": project_id,
+        "iterations": forecast["iterations"],
+        "remaining_tasks": forecast["remaining_tasks"],
+        "percentiles": {k: fmt(v) for k, v in forecast["percentiles"].items()},
+        "mean_finish": fmt(forecast["mean_finish"]),
+        "deterministic_finish": fmt(forecast["deterministic_finish"]),
+        "target_date": fmt(forecast["target_date"]),
+        "probability_on_time": round(forecast["probability_on_time"], 4)
+    }
+
+# ==================== Holidays (Working Calendar) ====================
+
+@app.get("/api/holidays")
+async def get_holidays(project_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """API: วันหยุดราชการ (project_id NULL) + วันหยุดเฉพาะโปรเจกต์"""
+    query = db.query(models.Holiday)
+    if project_id:
+        query = query.filter((models.Holiday.project_id.is_(None)) | (models.Holiday.project_id == project_id))
+    else:
+        query = query.filter(models.Holiday.project_id.is_(None))
+    
+    return {"holidays": [
+        {
+            "id": h.id,
+            "project_id": h.project_id,
+            "holiday_date": h.holiday_date.strftime("%Y-%m-%d"),
+            "name": h.name
+        }
+        for h in query.order_by(models.Holiday.holiday_date).all()
+    ]}
+
+@app.post("/api/holidays")
+async def create_holiday(
+    holiday_date: str = Form(...),
+    name: Optional[str] = Form(None),
+    project_id: Optional[int] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """API: เพิ่มวันหยุด (ไม่ระบุ project_id = วันหยุดราชการของทุกโปรเจกต์)"""
+    if project_id and not db.query(models.Project).filter(models.Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    try:
+        date_value = datetime.datetime.strptime(holiday_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="holiday_date must be YYYY-MM-DD")
+    
+    holiday = models.Holiday(project_id=project_id or None, holiday_date=date_value, name=name)
+    db.add(holiday)
+    db.commit()
+    db.refresh(holiday)
+    
+    return {"success": True, "holiday_id": holiday.id}
+
+@app.delete("/api/holidays/{holiday_id}")
+async def delete_holiday(holiday_id: int, db: Session = Depends(get_db)):
+    """API: ลบวันหยุด"""
+    holiday = db.query(models.Holiday).filter(models.Holiday.id == holiday_id).first()
+    if not holiday:
+        raise HTTPException(status_code=404, detail="Holiday not found")
+    
+    db.delete(holiday)
+    db.commit()
+    
+    return {"success": True, "message": "Holiday deleted successfully"}
+
 # ==================== Company Profile & Onsite Reports ====================
 
 @app.get("/projects/{project_id}/settings", response_class=HTMLResponse)
@@ -3041,13 +3222,13 @@ async def onsite_report_signoff(
     })
 
 @app.get("/projects/{project_id}/onsite-report/{report_id}/pdf")
-async def generate_onsite_report_pdf(
+def generate_onsite_report_pdf(
     project_id: int,
     report_id: int,
     db: Session = Depends(get_db)
 ):
-    """Generate PDF for onsite report"""
-    report = db.query(models.OnsiteReport).filter(
+    """Generate PDF for onsite report (background job)"""
+    report = db.query(models.OnsiteReport.id).filter(
         models.OnsiteReport.id == report_id,
         models.OnsiteReport.project_id == project_id
     ).first()
@@ -3055,52 +3236,9 @@ async def generate_onsite_report_pdf(
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
     
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    customer_profile = db.query(models.CompanyProfile).filter(
-        models.CompanyProfile.project_id == project_id,
-        models.CompanyProfile.profile_type == "customer"
-    ).first()
-    responder_profile = db.query(models.CompanyProfile).filter(
-        models.CompanyProfile.project_id == project_id,
-        models.CompanyProfile.profile_type == "responder"
-    ).first()
-    
-    # Get selected tasks and functions
-    selected_tasks = []
-    if report.selected_task_ids:
-        selected_tasks = db.query(models.Task).filter(
-            models.Task.id.in_(report.selected_task_ids)
-        ).all()
-    
-    selected_functions = []
-    if report.selected_function_ids:
-        selected_functions = db.query(models.ProjectFunction).filter(
-            models.ProjectFunction.id.in_(report.selected_function_ids)
-        ).all()
-    
-    # Prepare data for PDF
-    report_data = {
-        "project_name": project.name,
-        "customer_profile": customer_profile,
-        "responder_profile": responder_profile,
-        "selected_tasks": selected_tasks,
-        "selected_functions": selected_functions,
-        "description": report.description,
-        "customer_signature_name": report.customer_signature_name,
-        "responder_signature_name": report.responder_signature_name,
-        "report_date": report.report_date
-    }
-    
-    # Generate PDF
-    os.makedirs("exports", exist_ok=True)
-    filename = f"OnsiteReport_{project_id}_{report_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    output_path = os.path.join("exports", filename)
-    
-    try:
-        report_engine.generate_onsite_consensus_pdf(report_data, output_path)
-        return FileResponse(output_path, filename=filename, media_type='application/pdf')
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating PDF: {str(e)}")
+    return _report_job_response(
+        report_jobs.queue.submit(db, "onsite_pdf", project_id=project_id, report_id=report_id)
+    )
 
 # ==================== Server Run ====================
 
@@ -0,0 +1,295 @@
+"""
+Schema Migrations for aiD_PM
+Versioned, idempotent migrations applied automatically by database.init_db():
+- The `schema_version` table records every applied version
+- A new database is created from models.py and stamped with all versions
+- An existing database gets the pending versions in order, each in its own
+  transaction (the version row is written first, so two workers starting at
+  the same time cannot apply the same migration twice)
+- Data migrations are set-based SQL or batched executemany - never one
+  commit per row
+
+Replaces the one-off migrate_*.py / fix_db*.py scripts.
+
+Usage: python migrations.py            # apply pending migrations
+       python migrations.py --status   # list applied / pending versions
+"""
+
+import argparse
+import datetime
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from sqlalchemy import bindparam, inspect, literal, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+import id_allocator
+import models
+
+# Rows per executemany batch in data migrations
+BATCH_SIZE = 1000
+
+MIGRATIONS: List[tuple] = []
+
+
+def migration(version: int, description: str):
+    """ลงทะเบียน migration (version ต้องเรียงจากน้อยไปมากและห้ามซ้ำ)"""
+    def register(func: Callable[[Connection], None]):
+        assert not MIGRATIONS or MIGRATIONS[-1][0] < version, f"Migration {version} out of order"
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+# ===== Helpers =====
+
+def _columns(conn: Connection, table: str) -> set:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _add_columns(conn: Connection, model, names: List[str]):
+    """ALTER TABLE ADD COLUMN ตามนิยามใน models.py (ข้ามคอลัมน์ที่มีอยู่แล้ว)"""
+    table = model.__table__
+    existing = _columns(conn, table.name)
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(dialect=conn.dialect)}"
+        default = column.default.arg if column.default is not None and column.default.is_scalar else None
+        if default is not None:
+            rendered = literal(default, type_=column.type).compile(
+                dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+            )
+            ddl += f" DEFAULT {rendered}"
+        conn.execute(text(ddl))
+
+
+def _create_missing_indexes(conn: Connection, tables=None):
+    """สร้าง index ที่ประกาศใน models.py แต่ยังไม่มีในฐานข้อมูล"""
+    inspector = inspect(conn)
+    for table in tables or models.Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=conn)
+
+
+def _batched_update(conn: Connection, table, key: str, rows: List[Dict]):
+    """UPDATE table ... WHERE id = :b_id แบบ executemany ทีละ BATCH_SIZE แถว"""
+    statement = table.update().where(table.c.id == bindparam("b_id")).values(
+        {key: bindparam(f"b_{key}")}
+    )
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(statement, [
+            {"b_id": row["id"], f"b_{key}": row[key]} for row in rows[start:start + BATCH_SIZE]
+        ])
+
+
+# ===== Migrations =====
+
+@migration(1, "resources: company, comment, skills")
+def _resources_profile_columns(conn):
+    _add_columns(conn, models.Resource, ["company", "comment", "skills"])
+
+
+@migration(2, "projects.progress")
+def _project_progress(conn):
+    _add_columns(conn, models.Project, ["progress"])
+
+
+@migration(3, "activity_logs.project_id and nullable task_id")
+def _activity_log_project(conn):
+    _add_columns(conn, models.ActivityLog, ["project_id"])
+
+    task_id = next(c for c in inspect(conn).get_columns("activity_logs") if c["name"] == "task_id")
+    if task_id["nullable"] or conn.dialect.name != "sqlite":
+        if not task_id["nullable"]:
+            conn.execute(text("ALTER TABLE activity_logs ALTER COLUMN task_id DROP NOT NULL"))
+        return
+
+    # SQLite ไม่มี ALTER COLUMN: สร้างตารางใหม่แล้วคัดลอกด้วย INSERT ... SELECT
+    columns = ", ".join(sorted(_columns(conn, "activity_logs") & set(models.ActivityLog.__table__.c.keys())))
+    for index in inspect(conn).get_indexes("activity_logs"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+    conn.execute(text("ALTER TABLE activity_logs RENAME TO activity_logs_old"))
+    models.ActivityLog.__table__.create(bind=conn)
+    conn.execute(text(f"INSERT INTO activity_logs ({columns}) SELECT {columns} FROM activity_logs_old"))
+    conn.execute(text("DROP TABLE activity_logs_old"))
+
+
+@migration(4, "project_phases.is_recovery_mode")
+def _phase_recovery_mode(conn):
+    _add_columns(conn, models.ProjectPhase, ["is_recovery_mode"])
+
+
+@migration(5, "tasks.phase_id")
+def _task_phase(conn):
+    _add_columns(conn, models.Task, ["phase_id"])
+
+
+@migration(6, "tasks.task_id: backfill missing and duplicate IDs, unique index")
+def _task_ids(conn):
+    _add_columns(conn, models.Task, ["task_id"])
+
+    prefixes = {
+        row.id: id_allocator.task_id_prefix(row.customer, row.name)
+        for row in conn.execute(text("SELECT id, customer, name FROM projects"))
+    }
+
+    # เลขที่ใช้แล้วต่อ prefix + Tasks ที่ต้องออก ID ใหม่ (ไม่มี ID หรือ ID ซ้ำ) ใน 1 query
+    used = defaultdict(set)
+    seen = set()
+    pending = []
+    rows = conn.execute(text("SELECT id, project_id, task_id FROM tasks ORDER BY id"))
+    for row in rows:
+        if row.task_id is None or row.task_id in seen:
+            pending.append(row)
+            continue
+        seen.add(row.task_id)
+        if len(row.task_id) >= 6 and row.task_id[-3:].isdigit():
+            used[row.task_id[:-3]].add(int(row.task_id[-3:]))
+
+    next_free = defaultdict(lambda: 1)
+    updates = []
+    for row in pending:
+        prefix = prefixes.get(row.project_id) or id_allocator.task_id_prefix(None, None)
+        number = next_free[prefix]
+        while number in used[prefix]:
+            number += 1
+        used[prefix].add(number)
+        next_free[prefix] = number + 1
+        updates.append({"id": row.id, "task_id": f"{prefix}{number:03d}"})
+
+    _batched_update(conn, models.Task.__table__, "task_id", updates)
+    if "ix_tasks_task_id" not in {index["name"] for index in inspect(conn).get_indexes("tasks")}:
+        conn.execute(text("CREATE UNIQUE INDEX ix_tasks_task_id ON tasks (task_id)"))
+
+
+@migration(7, "project_functions: FUNC- codes renamed to FURE-")
+def _function_code_prefix(conn):
+    conn.execute(text(
+        "UPDATE project_functions SET function_code = 'FURE-' || substr(function_code, 6) "
+        "WHERE function_code LIKE 'FUNC-%' AND NOT EXISTS ("
+        "  SELECT 1 FROM project_functions f2 WHERE f2.function_code = 'FURE-' || substr(project_functions.function_code, 6)"
+        ")"
+    ))
+
+
+@migration(8, "company_profiles: project-specific profiles")
+def _company_profiles_project(conn):
+    # ตารางรุ่นแรกไม่ผูกกับโปรเจกต์ - สร้างใหม่ (เหมือน migrate_project_profiles.py เดิม)
+    if "project_id" not in _columns(conn, "company_profiles"):
+        conn.execute(text("DROP TABLE company_profiles"))
+        models.CompanyProfile.__table__.create(bind=conn)
+
+
+@migration(9, "projects: running progress totals")
+def _project_progress_totals(conn):
+    _add_columns(conn, models.Project, ["progress_weight_total", "progress_weighted_total"])
+    conn.execute(text(
+        "UPDATE projects SET "
+        "progress_weight_total = COALESCE((SELECT SUM(weight_score) FROM tasks WHERE tasks.project_id = projects.id), 0), "
+        "progress_weighted_total = COALESCE((SELECT SUM(actual_progress / 100.0 * weight_score) FROM tasks "
+        "                                    WHERE tasks.project_id = projects.id), 0)"
+    ))
+    conn.execute(text(
+        "UPDATE projects SET progress = CASE WHEN progress_weight_total > 0 "
+        "THEN progress_weighted_total / progress_weight_total * 100 ELSE 0 END"
+    ))
+
+
+@migration(10, "tasks: persisted AI risk score")
+def _task_risk_score(conn):
+    # คะแนนถูกคำนวณโดย risk_engine.worker ตอนเริ่มระบบ (full refresh รอบแรก)
+    _add_columns(conn, models.Task, ["ai_risk_score", "ai_risk_computed_at"])
+
+
+@migration(11, "indexes on foreign keys and filter columns")
+def _hot_indexes(conn):
+    _create_missing_indexes(conn)
+
+
+@migration(12, "report_jobs: owner, heartbeat and active dedupe key")
+def _report_job_owner(conn):
+    _add_columns(conn, models.ReportJob, ["owner", "heartbeat_at", "active_key"])
+    _create_missing_indexes(conn, [models.ReportJob.__table__])
+
+
+# ===== Runner =====
+
+def _applied_versions(conn: Connection) -> set:
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+
+
+def run_migrations(engine: Engine, verbose: bool = False) -> List[int]:
+    """
+    สร้างตารางที่ยังไม่มีแล้ว apply migrations ที่ค้างอยู่ (เรียกซ้ำได้)
+
+    Returns: versions ที่ apply ในรอบนี้
+    """
+    version_table = models.SchemaVersion.__table__
+
+    with engine.begin() as conn:
+        is_new = not inspect(conn).has_table("projects")
+        models.Base.metadata.create_all(bind=conn)
+        if is_new:
+            # ฐานข้อมูลใหม่สร้างจาก models.py ล่าสุดแล้ว
+            conn.execute(version_table.insert(), [
+                {"version": version, "description": description, "applied_at": datetime.datetime.now()}
+                for version, description, _ in MIGRATIONS
+            ])
+            return []
+        applied = _applied_versions(conn)
+
+    done = []
+    for version, description, func in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                # จอง version ก่อน: worker อื่นที่ apply พร้อมกันจะชน primary key
+                conn.execute(version_table.insert().values(
+                    version=version, description=description, applied_at=datetime.datetime.now()
+                ))
+                func(conn)
+        except IntegrityError:
+            with engine.connect() as conn:
+                if version in _applied_versions(conn):
+                    continue
+            raise
+        done.append(version)
+        if verbose:
+            print(f"✅ {version:>3}  {description}")
+    return done
+
+
+def migration_status(engine: Engine) -> List[Dict]:
+    """สถานะของทุก migration: [{version, description, applied_at}] (applied_at None = ค้างอยู่)"""
+    applied = {}
+    with engine.connect() as conn:
+        if inspect(conn).has_table("schema_version"):
+            applied = dict(conn.execute(text("SELECT version, applied_at FROM schema_version")).all())
+    return [
+        {"version": version, "description": description, "applied_at": applied.get(version)}
+        for version, description, _ in MIGRATIONS
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="aiD_PM schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied / pending migrations")
+    args = parser.parse_args()
+
+    from database import engine
+
+    if args.status:
+        for item in migration_status(engine):
+            state = item["applied_at"] or "pending"
+            print(f"{item['version']:>3}  {item['description']:<60} {state}")
+    else:
+        applied = run_migrations(engine, verbose=True)
+        print(f"🎉 {len(applied)} migrations applied" if applied else "ℹ️  Database is up to date")
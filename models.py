@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Boolean, JSON, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Boolean, JSON, DateTime, Text, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import datetime
@@ -14,6 +14,8 @@ class Project(Base):
     is_recovery_mode = Column(Boolean, default=False)
     budget_masked = Column(String, nullable=True)
     progress = Column(Float, default=0.0)  # Real-time calculated progress
+    progress_weight_total = Column(Float, default=0.0)  # Running SUM(weight_score) of tasks
+    progress_weighted_total = Column(Float, default=0.0)  # Running SUM(actual_progress/100 * weight_score)
     created_at = Column(DateTime, default=datetime.datetime.now)
 
     # Relationships
@@ -36,9 +38,16 @@ class Resource(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Open tasks of a project (progress < 100) and risk filter / sort per project
+        Index("ix_tasks_project_progress", "project_id", "actual_progress"),
+        Index("ix_tasks_project_risk", "project_id", "ai_risk_score"),
+        # Workload / levelling: a resource's dated tasks
+        Index("ix_tasks_resource_dates", "assigned_resource_id", "planned_start", "planned_end"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     task_id = Column(String, unique=True, nullable=False, index=True)  # NEW: Unique Task ID
-    project_id = Column(Integer, ForeignKey("projects.id"))
+    project_id = Column(Integer, ForeignKey("projects.id"))  # indexed by the composites above
     task_name = Column(String, nullable=False)
     task_type = Column(String, nullable=False)  # Dev, Admin, Procurement, Fix
     weight_score = Column(Float, default=1.0)
@@ -48,9 +57,11 @@ class Task(Base):
     planned_end = Column(Date, nullable=True)
     estimated_hours = Column(Float, default=0.0)
     actual_hours = Column(Float, default=0.0)
-    phase_id = Column(Integer, ForeignKey("project_phases.id"), nullable=True)  # NEW: Link to phase
-    function_id = Column(Integer, ForeignKey("project_functions.id"), nullable=True)  # Link to function
+    phase_id = Column(Integer, ForeignKey("project_phases.id"), nullable=True, index=True)  # NEW: Link to phase
+    function_id = Column(Integer, ForeignKey("project_functions.id"), nullable=True, index=True)  # Link to function
     function_text = Column(String, nullable=True)  # Free text function entry
+    ai_risk_score = Column(Float, default=0.0)  # Persisted risk score (0-100), refreshed in background
+    ai_risk_computed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.now)
 
     # Relationships
@@ -59,12 +70,33 @@ class Task(Base):
     phase = relationship("ProjectPhase", back_populates="tasks")  # NEW
     function = relationship("ProjectFunction", back_populates="tasks")
     task_resources = relationship("TaskResource", back_populates="task", cascade="all, delete-orphan")
+    predecessor_links = relationship("TaskDependency", foreign_keys="TaskDependency.successor_id",
+                                     back_populates="successor", cascade="all, delete-orphan")
+    successor_links = relationship("TaskDependency", foreign_keys="TaskDependency.predecessor_id",
+                                   back_populates="predecessor", cascade="all, delete-orphan")
+
+class TaskDependency(Base):
+    """Finish-to-start link: successor may start lag_days working days after predecessor finishes"""
+    __tablename__ = "task_dependencies"
+    __table_args__ = (UniqueConstraint("predecessor_id", "successor_id", name="uq_task_dependency"),)
+    id = Column(Integer, primary_key=True, index=True)
+    predecessor_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
+    successor_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
+    dependency_type = Column(String, default="FS")  # Finish-to-Start
+    lag_days = Column(Integer, default=0)  # Working days (negative = lead)
+    created_at = Column(DateTime, default=datetime.datetime.now)
+
+    # Relationships
+    predecessor = relationship("Task", foreign_keys=[predecessor_id], back_populates="successor_links")
+    successor = relationship("Task", foreign_keys=[successor_id], back_populates="predecessor_links")
 
 class TaskResource(Base):
     """Many-to-Many: Task <-> Resource (Multi-assign support)"""
     __tablename__ = "task_resources"
+    # resource -> tasks (workload); ครอบคลุม filter resource_id อย่างเดียวด้วย
+    __table_args__ = (Index("ix_task_resources_resource_task", "resource_id", "task_id"),)
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id"))
+    task_id = Column(Integer, ForeignKey("tasks.id"), index=True)
     resource_id = Column(Integer, ForeignKey("resources.id"))
     role = Column(String, nullable=True)  # Lead, Support, Reviewer, etc.
     assigned_at = Column(DateTime, default=datetime.datetime.now)
@@ -75,6 +107,7 @@ class TaskResource(Base):
 
 class WeeklySnapshot(Base):
     __tablename__ = "weekly_snapshots"
+    __table_args__ = (Index("ix_weekly_snapshots_project_week", "project_id", "week_number"),)
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"))
     week_number = Column(Integer)
@@ -84,13 +117,18 @@ class WeeklySnapshot(Base):
 
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
+    # History ของ Task / Project เรียงจากล่าสุด
+    __table_args__ = (
+        Index("ix_activity_logs_task_created", "task_id", "created_at"),
+        Index("ix_activity_logs_project_created", "project_id", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
     task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True)
     action_type = Column(String)  # created, updated, assigned, etc.
     description = Column(String)
     user_name = Column(String, default="System")
-    created_at = Column(DateTime, default=datetime.datetime.now)
+    created_at = Column(DateTime, default=datetime.datetime.now, index=True)
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -119,8 +157,14 @@ class ProjectPhase(Base):
 
 class Issue(Base):
     __tablename__ = "issues"
+    # Issue list: filter project / status / severity แล้วเรียง created_at (ไม่ต้อง sort เพิ่ม)
+    __table_args__ = (
+        Index("ix_issues_project_created", "project_id", "created_at"),
+        Index("ix_issues_status_created", "status", "created_at"),
+        Index("ix_issues_severity_created", "severity", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer, ForeignKey("projects.id"))
+    project_id = Column(Integer, ForeignKey("projects.id"))  # indexed by the composites above
     phase_id = Column(Integer, ForeignKey("project_phases.id"), nullable=True)
     issue_title = Column(String, nullable=False)
     issue_description = Column(String, nullable=True)
@@ -266,3 +310,53 @@ class OnsiteReport(Base):
     
     # Relationship
     project = relationship("Project", backref="onsite_reports")
+
+class Holiday(Base):
+    """Non-working days for the working calendar (project_id NULL = public holiday for all projects)"""
+    __tablename__ = "holidays"
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True, index=True)
+    holiday_date = Column(Date, nullable=False)
+    name = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.now)
+
+    # Relationship
+    project = relationship("Project", backref="holidays")
+
+class ReportJob(Base):
+    """Background report generation job (see report_jobs.py)"""
+    __tablename__ = "report_jobs"
+    id = Column(String, primary_key=True)  # uuid hex
+    kind = Column(String, nullable=False)  # project_pdf, onsite_pdf, weekly_excel, daily_excel
+    params = Column(JSON, nullable=True)
+    dedupe_key = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    file_path = Column(String, nullable=True)
+    filename = Column(String, nullable=True)
+    media_type = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    owner = Column(String, nullable=True)  # process running the job (report_jobs.PROCESS_ID)
+    heartbeat_at = Column(DateTime, nullable=True)  # refreshed by the owner while queued / running
+    active_key = Column(String, nullable=True)  # dedupe_key while queued / running, NULL afterwards
+
+    __table_args__ = (
+        Index("ix_report_jobs_dedupe_status", "dedupe_key", "status"),
+        # One queued/running job per kind + params across all server processes
+        Index("ux_report_jobs_active_key", "active_key", unique=True),
+    )
+
+class IdSequence(Base):
+    """Running number per code prefix, e.g. "task:CUSPRO" (see id_allocator.py)"""
+    __tablename__ = "id_sequences"
+    name = Column(String, primary_key=True)
+    last_value = Column(Integer, nullable=False, default=0)
+
+class SchemaVersion(Base):
+    """Applied schema migrations (see migrations.py)"""
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.datetime.now)
@@ -0,0 +1,104 @@
+"""
+Portfolio Report for aiD_PM
+Executive PDF (report_engine.generate_project_pdf) of every active project in
+one batch:
+- Report data of all projects comes from a fixed number of bulk queries
+  (report_jobs.build_project_report_data_map)
+- PDFs are rendered in parallel on a process pool (spawned workers, so the
+  server's threads and DB connections are never forked) and packed into a
+  single zip; each worker parses the report fonts once at start
+  (report_engine font registry)
+
+A project is active while its progress is below 100%.
+
+Used by the "portfolio_pdf" report job (GET /report/portfolio) and from the
+command line (e.g. a Monday cron job).
+
+Usage: python portfolio_report.py [--output portfolio.zip] [--workers 4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+import report_engine
+
+# Worker processes rendering PDFs
+PORTFOLIO_WORKERS = int(os.getenv("PM_PORTFOLIO_WORKERS", str(os.cpu_count() or 1)))
+# Projects handed to a worker at a time (also the minimum per worker)
+PORTFOLIO_CHUNK = 4
+
+
+def active_project_ids(db: Session) -> List[int]:
+    """โปรเจกต์ที่ยังไม่เสร็จ (progress < 100) เรียงตาม id"""
+    return [
+        project_id for (project_id,) in db.query(models.Project.id).filter(
+            func.coalesce(models.Project.progress, 0) < 100
+        ).order_by(models.Project.id)
+    ]
+
+
+def portfolio_entry_name(project_id: int, name: str) -> str:
+    """ชื่อไฟล์ใน zip: ProjectReport_<id>_<ชื่อโปรเจกต์>.pdf"""
+    safe_name = re.sub(r'[\\/:*?"<>|\s]+', "_", name or "").strip("_")
+    return f"ProjectReport_{project_id}_{safe_name}.pdf" if safe_name else f"ProjectReport_{project_id}.pdf"
+
+
+def _render_one(item: Tuple[int, dict, str]) -> str:
+    project_id, data, output_path = item
+    return report_engine.generate_project_pdf(data, output_path)
+
+
+def render_portfolio(items: List[Tuple[int, dict]], output_path: str, workers: Optional[int] = None):
+    """สร้าง PDF ของทุกโปรเจกต์ (ขนานกันบน process pool) แล้วรวมเป็น zip ที่ output_path"""
+    # แต่ละ worker ได้อย่างน้อย 1 chunk (portfolio เล็ก ๆ render ใน process นี้เลย ไม่ต้อง spawn)
+    workers = max(1, min(workers or PORTFOLIO_WORKERS, -(-len(items) // PORTFOLIO_CHUNK)))
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(output_path) or None) as tmp:
+        jobs = [(project_id, data, os.path.join(tmp, f"{project_id}.pdf")) for project_id, data in items]
+        if workers == 1:
+            paths = [_render_one(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=report_engine.load_fonts  # parse ฟอนต์ครั้งเดียวต่อ worker
+            ) as pool:
+                paths = list(pool.map(_render_one, jobs, chunksize=PORTFOLIO_CHUNK))
+
+        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_STORED) as archive:
+            for (project_id, data), path in zip(items, paths):
+                archive.write(path, portfolio_entry_name(project_id, data.get("name")))
+    return output_path
+
+
+if __name__ == "__main__":
+    import time
+
+    import report_jobs
+    from database import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="aiD_PM portfolio report (zip of project PDFs)")
+    parser.add_argument("--output", default="portfolio.zip")
+    parser.add_argument("--workers", type=int, default=PORTFOLIO_WORKERS)
+    args = parser.parse_args()
+
+    init_db()
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        items = report_jobs.build_portfolio_report_data(db)
+    finally:
+        db.close()
+    collected = time.perf_counter()
+    render_portfolio(items, args.output, args.workers)
+    print(f"✅ {len(items)} projects -> {args.output} "
+          f"(data {collected - started:.1f}s, render {time.perf_counter() - collected:.1f}s, {args.workers} workers)")
@@ -0,0 +1,243 @@
+"""
+Progress Service for aiD_PM
+Value-based (weighted) project progress aggregation:
+- Weight sums and weighted progress per project
+- Task / completed task counts per project
+- Function counts per project
+- Incremental maintenance of Project.progress (running totals + deltas)
+- Reconciliation of running totals against a full recompute
+
+All figures are computed with grouped SQL queries so pages that list many
+projects issue a constant number of queries instead of one per project.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import event, func, case, inspect, update
+from sqlalchemy.orm import Session
+import models
+
+# Task attributes that affect Project.progress
+TRACKED_TASK_FIELDS = ("project_id", "weight_score", "actual_progress")
+
+# Tolerance used when comparing running totals with a full recompute
+RECONCILE_TOLERANCE = 1e-6
+
+
+def _empty_summary() -> Dict[str, float]:
+    return {
+        "total_weight": 0.0,
+        "weighted_progress": 0.0,
+        "progress": 0.0,
+        "task_count": 0,
+        "completed_tasks": 0,
+    }
+
+
+def get_progress_map(db: Session, project_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, float]]:
+    """
+    คำนวณ Progress แบบถ่วงน้ำหนัก (Value-Based) ของทุกโปรเจกต์ใน 1 query
+
+    Returns: {project_id: {total_weight, weighted_progress, progress, task_count, completed_tasks}}
+             progress อยู่ในช่วง 0-100 (ยังไม่ปัดเศษ)
+    """
+    query = db.query(
+        models.Task.project_id,
+        func.coalesce(func.sum(models.Task.weight_score), 0.0),
+        func.coalesce(func.sum(models.Task.actual_progress / 100.0 * models.Task.weight_score), 0.0),
+        func.count(models.Task.id),
+        func.coalesce(func.sum(case((models.Task.actual_progress == 100, 1), else_=0)), 0),
+    )
+
+    if project_ids is not None:
+        project_ids = list(project_ids)
+        if not project_ids:
+            return {}
+        query = query.filter(models.Task.project_id.in_(project_ids))
+
+    result = {}
+    for project_id, total_weight, weighted_progress, task_count, completed_tasks in query.group_by(models.Task.project_id):
+        total_weight = float(total_weight)
+        weighted_progress = float(weighted_progress)
+        result[project_id] = {
+            "total_weight": total_weight,
+            "weighted_progress": weighted_progress,
+            "progress": (weighted_progress / total_weight * 100) if total_weight > 0 else 0.0,
+            "task_count": task_count,
+            "completed_tasks": int(completed_tasks),
+        }
+
+    # โปรเจกต์ที่ไม่มี Task ให้คืนค่า 0
+    if project_ids is not None:
+        for project_id in project_ids:
+            result.setdefault(project_id, _empty_summary())
+
+    return result
+
+
+def get_project_progress(db: Session, project_id: int) -> Dict[str, float]:
+    """Progress summary ของโปรเจกต์เดียว (รูปแบบเดียวกับ get_progress_map)"""
+    return get_progress_map(db, [project_id])[project_id]
+
+
+def get_function_count_map(db: Session, project_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+    """นับจำนวน Functions ของแต่ละโปรเจกต์ใน 1 query"""
+    query = db.query(models.ProjectFunction.project_id, func.count(models.ProjectFunction.id))
+    if project_ids is not None:
+        query = query.filter(models.ProjectFunction.project_id.in_(list(project_ids)))
+    return dict(query.group_by(models.ProjectFunction.project_id).all())
+
+
+# ==================== Incremental Project Progress ====================
+
+def task_contribution(weight, progress):
+    """(weight, weighted progress) ที่ Task หนึ่งส่งผลต่อโปรเจกต์"""
+    weight = weight or 0.0
+    progress = progress or 0.0
+    return weight, (progress / 100.0) * weight
+
+
+def _old_value(state, field):
+    """ค่าเดิม (ก่อนแก้ไข) ของ attribute จาก history ของ SQLAlchemy"""
+    history = state.attrs[field].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _task_project_id(task):
+    if task.project_id is not None:
+        return task.project_id
+    return task.project.id if task.project is not None else None
+
+
+def collect_task_deltas(session: Session) -> Dict[int, List[float]]:
+    """
+    รวบรวมการเปลี่ยนแปลงของ Tasks ที่รอ flush เป็น delta ต่อโปรเจกต์
+
+    Returns: {project_id: [weight_delta, weighted_delta]}
+    """
+    deltas = defaultdict(lambda: [0.0, 0.0])
+
+    def add(project_id, weight, progress, sign):
+        if project_id is None:
+            return
+        w, wp = task_contribution(weight, progress)
+        deltas[project_id][0] += sign * w
+        deltas[project_id][1] += sign * wp
+
+    for obj in session.new:
+        if isinstance(obj, models.Task):
+            add(_task_project_id(obj), obj.weight_score, obj.actual_progress, 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, models.Task):
+            state = inspect(obj)
+            add(_old_value(state, "project_id"), _old_value(state, "weight_score"),
+                _old_value(state, "actual_progress"), -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, models.Task) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[f].history.has_changes() for f in TRACKED_TASK_FIELDS):
+            continue
+        add(_old_value(state, "project_id"), _old_value(state, "weight_score"),
+            _old_value(state, "actual_progress"), -1)
+        add(_task_project_id(obj), obj.weight_score, obj.actual_progress, 1)
+
+    return {pid: d for pid, d in deltas.items() if d[0] != 0.0 or d[1] != 0.0}
+
+
+def apply_project_deltas(session: Session, deltas: Dict[int, List[float]]):
+    """
+    บวก delta เข้า running totals ของโปรเจกต์ด้วย UPDATE ระดับ SQL
+    (atomic ต่อแถว ไม่ต้องโหลด Tasks ทั้งโปรเจกต์)
+    """
+    project = models.Project.__table__
+    for project_id, (weight_delta, weighted_delta) in deltas.items():
+        new_weight = func.coalesce(project.c.progress_weight_total, 0.0) + weight_delta
+        new_weighted = func.coalesce(project.c.progress_weighted_total, 0.0) + weighted_delta
+        session.execute(
+            update(project)
+            .where(project.c.id == project_id)
+            .values(
+                progress_weight_total=new_weight,
+                progress_weighted_total=new_weighted,
+                progress=case((new_weight > 0, new_weighted / new_weight * 100), else_=0.0),
+            )
+        )
+
+
+def _before_flush(session, flush_context, instances):
+    deltas = collect_task_deltas(session)
+    if deltas:
+        apply_project_deltas(session, deltas)
+
+
+def _track_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+def register_progress_tracking(session_factory):
+    """
+    ติดตั้ง hook ให้ทุก Session ที่สร้างจาก session_factory อัพเดท Project.progress
+    แบบ incremental ทุกครั้งที่ Task ถูกสร้าง/แก้ไข/ลบ
+    """
+    # active_history ทำให้ SQLAlchemy โหลดค่าเดิมก่อน set เสมอ เพื่อให้คำนวณ delta ได้ถูกต้อง
+    for field in TRACKED_TASK_FIELDS:
+        attr = getattr(models.Task, field)
+        if not event.contains(attr, "set", _track_old_value):
+            event.listen(attr, "set", _track_old_value, active_history=True, retval=True)
+    if not event.contains(session_factory, "before_flush", _before_flush):
+        event.listen(session_factory, "before_flush", _before_flush)
+
+
+def reconcile_progress(db: Session, fix: bool = False) -> List[Dict[str, float]]:
+    """
+    ตรวจสอบ running totals ของทุกโปรเจกต์เทียบกับการคำนวณใหม่ทั้งหมด
+
+    Args:
+        fix: ถ้า True จะเขียนค่าที่ถูกต้องทับค่าที่คลาดเคลื่อน
+
+    Returns: รายการโปรเจกต์ที่ค่าไม่ตรง
+    """
+    actual = get_progress_map(db)
+    mismatches = []
+
+    for project in db.query(models.Project).all():
+        summary = actual.get(project.id, _empty_summary())
+        stored = (project.progress_weight_total or 0.0, project.progress_weighted_total or 0.0, project.progress or 0.0)
+        expected = (summary["total_weight"], summary["weighted_progress"], summary["progress"])
+
+        if all(abs(s - e) <= RECONCILE_TOLERANCE for s, e in zip(stored, expected)):
+            continue
+
+        mismatches.append({
+            "project_id": project.id,
+            "project_name": project.name,
+            "stored_weight_total": stored[0],
+            "stored_weighted_total": stored[1],
+            "stored_progress": stored[2],
+            "expected_weight_total": expected[0],
+            "expected_weighted_total": expected[1],
+            "expected_progress": expected[2],
+        })
+
+        if fix:
+            db.execute(
+                update(models.Project.__table__)
+                .where(models.Project.__table__.c.id == project.id)
+                .values(
+                    progress_weight_total=expected[0],
+                    progress_weighted_total=expected[1],
+                    progress=expected[2],
+                )
+            )
+
+    if fix and mismatches:
+        db.commit()
+
+    return mismatches
@@ -0,0 +1,356 @@
+"""
+Resource Recommendation Engine for aiD_PM
+Vectorized scoring for AIAssistant.recommend_resources:
+- Precomputed resource x skill matrix (NumPy)
+- Current open-task workload vector
+- Top-N selection with partial sort (argpartition)
+
+The matrix is built once and then patched incrementally: resources and
+assignments changed by a committed session are marked dirty and only
+those rows are re-read on the next recommendation.
+"""
+
+import json
+import threading
+from typing import Dict, Iterable, List
+
+import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+import models
+import workload_service
+
+# Positions that are never recommended (same rule as the old SQL filter)
+EXCLUDED_POSITIONS = ("Customer", "Vendor", "Other")
+
+
+def parse_skills(skills) -> Dict[str, float]:
+    """แปลง Resource.skills (JSON string หรือ dict) เป็น {skill: level}"""
+    if isinstance(skills, str):
+        try:
+            skills = json.loads(skills)
+        except (json.JSONDecodeError, TypeError):
+            return {}
+    if not isinstance(skills, dict):
+        return {}
+
+    parsed = {}
+    for name, level in skills.items():
+        try:
+            parsed[name] = float(level)
+        except (TypeError, ValueError):
+            continue
+    return parsed
+
+
+def _is_eligible(resource: models.Resource) -> bool:
+    # position IS NULL ถูกตัดออกเหมือน NOT IN ของ SQL
+    return bool(resource.is_active) and resource.position is not None and resource.position not in EXCLUDED_POSITIONS
+
+
+def _format_level(level: float) -> str:
+    return str(int(level)) if float(level).is_integer() else str(level)
+
+
+class ResourceRecommendationEngine:
+    """In-memory resource x skill matrix with vectorized scoring"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._full_refresh = False
+        self._dirty_resources = set()
+        self._dirty_workload = set()
+        self._dirty_tasks = set()
+
+        self.resource_ids = np.zeros(0, dtype=np.int64)
+        self.skill_matrix = np.zeros((0, 0), dtype=np.float64)
+        self.speed = np.zeros(0, dtype=np.float64)
+        self.quality = np.zeros(0, dtype=np.float64)
+        self.workload = np.zeros(0, dtype=np.int64)
+        self.eligible = np.zeros(0, dtype=bool)
+        self.skill_index: Dict[str, int] = {}
+        self._row_of: Dict[int, int] = {}
+
+    # ==================== Change Tracking ====================
+
+    def mark_resources_dirty(self, resource_ids: Iterable[int]):
+        with self._lock:
+            self._dirty_resources.update(rid for rid in resource_ids if rid is not None)
+
+    def mark_workload_dirty(self, resource_ids: Iterable[int] = (), task_ids: Iterable[int] = ()):
+        with self._lock:
+            self._dirty_workload.update(rid for rid in resource_ids if rid is not None)
+            self._dirty_tasks.update(tid for tid in task_ids if tid is not None)
+
+    def invalidate(self):
+        """บังคับให้โหลด workload ใหม่ทั้งหมด (เช่นหลัง bulk update/delete)"""
+        with self._lock:
+            self._full_refresh = True
+
+    # ==================== Build / Refresh ====================
+
+    def _rebuild(self, db: Session):
+        resources = db.query(models.Resource).order_by(models.Resource.id).all()
+        parsed = [parse_skills(r.skills) for r in resources]
+
+        skill_index = {}
+        for skills in parsed:
+            for name in skills:
+                skill_index.setdefault(name, len(skill_index))
+
+        matrix = np.zeros((len(resources), len(skill_index)), dtype=np.float64)
+        for row, skills in enumerate(parsed):
+            for name, level in skills.items():
+                matrix[row, skill_index[name]] = level
+
+        self.resource_ids = np.array([r.id for r in resources], dtype=np.int64)
+        self.skill_matrix = matrix
+        self.skill_index = skill_index
+        self.speed = np.array([r.speed_score or 0 for r in resources], dtype=np.float64)
+        self.quality = np.array([r.quality_score or 0 for r in resources], dtype=np.float64)
+        self.eligible = np.array([_is_eligible(r) for r in resources], dtype=bool)
+        self._row_of = {r.id: row for row, r in enumerate(resources)}
+
+        workload_map = workload_service.get_workload_counts(db)
+        self.workload = np.array(
+            [workload_map.get(r.id, {}).get("open_count", 0) for r in resources], dtype=np.int64
+        )
+
+        self._built = True
+        self._full_refresh = False
+        self._dirty_resources.clear()
+        self._dirty_workload.clear()
+        self._dirty_tasks.clear()
+
+    def _ensure_skill_column(self, name: str) -> int:
+        if name not in self.skill_index:
+            self.skill_index[name] = len(self.skill_index)
+            self.skill_matrix = np.pad(self.skill_matrix, ((0, 0), (0, 1)))
+        return self.skill_index[name]
+
+    def _append_row(self, resource_id: int) -> int:
+        row = len(self.resource_ids)
+        self.resource_ids = np.append(self.resource_ids, resource_id)
+        self.skill_matrix = np.vstack([self.skill_matrix, np.zeros((1, self.skill_matrix.shape[1]))])
+        self.speed = np.append(self.speed, 0.0)
+        self.quality = np.append(self.quality, 0.0)
+        self.workload = np.append(self.workload, 0)
+        self.eligible = np.append(self.eligible, False)
+        self._row_of[resource_id] = row
+        return row
+
+    def _refresh_resources(self, db: Session, resource_ids: List[int]):
+        resources = db.query(models.Resource).filter(models.Resource.id.in_(resource_ids)).all()
+        found = set()
+        for resource in resources:
+            found.add(resource.id)
+            row = self._row_of.get(resource.id)
+            if row is None:
+                row = self._append_row(resource.id)
+                self._dirty_workload.add(resource.id)
+
+            self.skill_matrix[row, :] = 0.0
+            for name, level in parse_skills(resource.skills).items():
+                self.skill_matrix[row, self._ensure_skill_column(name)] = level
+            self.speed[row] = resource.speed_score or 0
+            self.quality[row] = resource.quality_score or 0
+            self.eligible[row] = _is_eligible(resource)
+
+        # Resource ที่ถูกลบออกจากฐานข้อมูล
+        for resource_id in set(resource_ids) - found:
+            row = self._row_of.get(resource_id)
+            if row is not None:
+                self.eligible[row] = False
+
+    def _refresh_workload(self, db: Session, resource_ids: set):
+        if self._dirty_tasks:
+            task_ids = list(self._dirty_tasks)
+            resource_ids.update(rid for (rid,) in db.query(models.TaskResource.resource_id).filter(
+                models.TaskResource.task_id.in_(task_ids)).distinct())
+            resource_ids.update(rid for (rid,) in db.query(models.Task.assigned_resource_id).filter(
+                models.Task.id.in_(task_ids), models.Task.assigned_resource_id.isnot(None)))
+
+        resource_ids = [rid for rid in resource_ids if rid in self._row_of]
+        if not resource_ids:
+            return
+        counts = workload_service.get_workload_counts(db, resource_ids)
+        for resource_id in resource_ids:
+            self.workload[self._row_of[resource_id]] = counts[resource_id]["open_count"]
+
+    def refresh(self, db: Session):
+        """สร้าง matrix ครั้งแรก หรืออัพเดทเฉพาะแถวที่เปลี่ยน"""
+        if not self._built or self._full_refresh:
+            self._rebuild(db)
+            return
+
+        if self._dirty_resources:
+            self._refresh_resources(db, list(self._dirty_resources))
+        if self._dirty_workload or self._dirty_tasks:
+            self._refresh_workload(db, set(self._dirty_workload))
+
+        self._dirty_resources.clear()
+        self._dirty_workload.clear()
+        self._dirty_tasks.clear()
+
+    # ==================== Scoring ====================
+
+    def score(self, required_skills: List[str]) -> np.ndarray:
+        """คะแนนของทุก Resource (vectorized) - สูตรเดียวกับ AIAssistant เดิม"""
+        n = len(self.resource_ids)
+        scores = np.zeros(n, dtype=np.float64)
+
+        if required_skills and n:
+            cols = [self.skill_index[s] for s in required_skills if s in self.skill_index]
+            levels = self.skill_matrix[:, cols] if cols else np.zeros((n, 0))
+            positive = levels > 0
+            matched = positive.sum(axis=1)
+            total_level = np.where(positive, levels, 0.0).sum(axis=1)
+            has_match = matched > 0
+            safe_matched = np.maximum(matched, 1)
+            # 1. Skill Match (0-50 points)
+            scores += np.where(has_match, matched / len(required_skills) * 30 + total_level / safe_matched * 2, 0.0)
+
+        # 2-3. Speed & Quality (0-20 points each)
+        scores += self.speed * 2 + self.quality * 2
+
+        # 4. Workload Factor
+        scores += np.select(
+            [self.workload == 0, self.workload <= 2, self.workload <= 5],
+            [10.0, 5.0, 0.0],
+            default=-10.0,
+        )
+        return scores
+
+    def recommend(self, db: Session, required_skills: List[str], top_n: int = 3) -> List[Dict[str, any]]:
+        """
+        Top-N Resources สำหรับ skills ที่ต้องการ
+
+        Returns: [{"resource", "score", "reasons", "current_workload", "match_percentage"}]
+        """
+        with self._lock:
+            self.refresh(db)
+
+            candidates = np.flatnonzero(self.eligible)
+            if candidates.size == 0 or top_n <= 0:
+                return []
+
+            scores = self.score(required_skills)[candidates]
+            k = min(top_n, candidates.size)
+            # Partial sort: เลือก k อันดับแรกแบบ O(n) แล้วเรียงเฉพาะ k ตัว (tie -> id น้อยก่อน)
+            top = np.argpartition(-scores, k - 1)[:k] if k < candidates.size else np.arange(candidates.size)
+            top = top[np.lexsort((candidates[top], -scores[top]))]
+
+            rows = candidates[top]
+            top_scores = scores[top]
+            top_ids = [int(self.resource_ids[row]) for row in rows]
+            skill_levels = {
+                s: self.skill_matrix[rows, self.skill_index[s]] for s in required_skills if s in self.skill_index
+            }
+            speed = self.speed[rows]
+            quality = self.quality[rows]
+            workload = self.workload[rows]
+
+        resources = {r.id: r for r in db.query(models.Resource).filter(models.Resource.id.in_(top_ids))}
+
+        results = []
+        for i, resource_id in enumerate(top_ids):
+            reasons = []
+            for skill in required_skills:
+                if skill in skill_levels and skill_levels[skill][i] > 0:
+                    reasons.append(f"{skill}: {_format_level(skill_levels[skill][i])}/10")
+            if speed[i]:
+                reasons.append(f"Speed: {int(speed[i])}/10")
+            if quality[i]:
+                reasons.append(f"Quality: {int(quality[i])}/10")
+            reasons.append(f"Current tasks: {int(workload[i])}")
+
+            score = float(top_scores[i])
+            results.append({
+                "resource": resources.get(resource_id),
+                "score": score,
+                "reasons": reasons,
+                "current_workload": int(workload[i]),
+                "match_percentage": min(score, 100)
+            })
+
+        return [r for r in results if r["resource"] is not None]
+
+
+# Export singleton instance
+engine = ResourceRecommendationEngine()
+
+
+# ==================== Session Hooks ====================
+# การเปลี่ยนแปลงถูกสะสมไว้ใน session.info และส่งให้ engine ตอน commit เท่านั้น
+# เพื่อไม่ให้ request อื่นโหลดข้อมูลที่ยังไม่ commit แล้วล้าง dirty set ทิ้ง
+
+_PENDING_KEY = "recommendation_engine_pending"
+
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, {"resources": set(), "workload": set(), "tasks": set(), "full": False})
+
+
+def _after_flush(session, flush_context):
+    pending = _pending(session)
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Resource):
+            pending["resources"].add(obj.id)
+        elif isinstance(obj, models.TaskResource):
+            history = inspect(obj).attrs.resource_id.history
+            pending["workload"].update(history.sum())
+        elif isinstance(obj, models.Task):
+            history = inspect(obj).attrs.assigned_resource_id.history
+            pending["workload"].update(history.sum())
+            pending["tasks"].add(obj.id)
+
+
+def _do_orm_execute(orm_execute_state):
+    """UPDATE / DELETE แบบมีเงื่อนไข -> โหลดใหม่ทั้งหมด
+    ORM bulk UPDATE by primary key (list ของ parameters) ผู้เรียกแจ้งเองด้วย mark_workload_changed"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete) or orm_execute_state.is_executemany:
+        return
+    tracked = (models.Task, models.TaskResource, models.Resource)
+    if any(m.class_ in tracked for m in orm_execute_state.all_mappers):
+        _pending(orm_execute_state.session)["full"] = True
+
+
+def mark_workload_changed(session: Session, resource_ids: Iterable[int] = (), task_ids: Iterable[int] = (),
+                          full: bool = False):
+    """แจ้ง assignment ที่ถูกเขียนแบบ bulk (ไม่ผ่าน flush) ให้ engine หลัง commit (full = โหลดใหม่ทั้งหมด)"""
+    pending = _pending(session)
+    if full:
+        pending["full"] = True
+        pending["workload"].clear()
+        pending["tasks"].clear()
+    elif not pending["full"]:
+        pending["workload"].update(rid for rid in resource_ids if rid is not None)
+        pending["tasks"].update(tid for tid in task_ids if tid is not None)
+
+
+def _after_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    if pending["full"]:
+        engine.invalidate()
+    if pending["resources"]:
+        engine.mark_resources_dirty(pending["resources"])
+    if pending["workload"] or pending["tasks"]:
+        engine.mark_workload_dirty(pending["workload"], pending["tasks"])
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def register_change_tracking(session_factory):
+    """ติดตั้ง hook ให้ engine รู้ว่า Resource / Assignment ใดเปลี่ยนไป"""
+    if not event.contains(session_factory, "after_flush", _after_flush):
+        event.listen(session_factory, "after_flush", _after_flush)
+        event.listen(session_factory, "do_orm_execute", _do_orm_execute)
+        event.listen(session_factory, "after_commit", _after_commit)
+        event.listen(session_factory, "after_rollback", _after_rollback)
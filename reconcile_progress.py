@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Verify incrementally maintained project progress against a full recompute
+
+Usage:
+    python reconcile_progress.py          # report mismatches only
+    python reconcile_progress.py --fix    # overwrite drifted totals
+"""
+
+import sys
+from database import SessionLocal
+import progress_service
+
+def main():
+    fix = "--fix" in sys.argv[1:]
+    db = SessionLocal()
+    try:
+        mismatches = progress_service.reconcile_progress(db, fix=fix)
+    finally:
+        db.close()
+    
+    if not mismatches:
+        print("✅ All project progress totals match a full recompute")
+        return 0
+    
+    for m in mismatches:
+        print(f"⚠️  Project {m['project_id']} '{m['project_name']}': "
+              f"stored {m['stored_progress']:.2f}% (weight {m['stored_weight_total']:.2f}), "
+              f"expected {m['expected_progress']:.2f}% (weight {m['expected_weight_total']:.2f})")
+    
+    if fix:
+        print(f"✅ Fixed {len(mismatches)} project(s)")
+        return 0
+    print(f"❌ {len(mismatches)} project(s) out of sync - run with --fix to repair")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,90 @@
 from fpdf import FPDF
+from fpdf.fonts import SubsetMap, TTFFont
+from fontTools import ttLib
+import copy
 import datetime
+import io
 import os
+import threading
+
+# ==================== Font Registry ====================
+# FPDF.add_font() อ่านและ parse ไฟล์ TTF ใหม่ทุกครั้ง (สร้างตาราง cmap / ความกว้างตัวอักษรทั้งฟอนต์)
+# Registry นี้ parse ครั้งเดียวต่อ process แล้วแชร์ข้อมูลที่อ่านอย่างเดียว (metrics, cmap, widths)
+# ให้ทุก PDF - ส่วนที่แต่ละเอกสารแก้ไข (subset ของ glyph ที่ใช้, TTFont ที่ถูกตัดตอน output)
+# สร้างใหม่ต่อเอกสารจาก bytes ในหน่วยความจำ ไฟล์จึงยังฝังเฉพาะ glyph ที่ใช้จริงเหมือนเดิม
+
+FONT_FAMILY = "Sarabun"  # Sarabun supports both Latin and Thai
+FONT_FILES = {"": "static/fonts/Sarabun-Regular.ttf", "B": "static/fonts/Sarabun-Bold.ttf"}
+FALLBACK_FONT_FAMILY = "helvetica"
+
+_font_cache = {}  # absolute path -> (parsed TTFFont, file bytes)
+_font_lock = threading.Lock()
+
+
+def _load_font(path: str, style: str):
+    with _font_lock:
+        if path not in _font_cache:
+            with open(path, "rb") as f:
+                data = f.read()
+            shared = TTFFont(FPDF(), path, f"{FONT_FAMILY.lower()}{style}", style)
+            shared.ttfont.close()  # แต่ละเอกสารใช้ TTFont ของตัวเอง (ถูกตัด subset ตอน output)
+            _font_cache[path] = (shared, data)
+        return _font_cache[path]
+
+
+def load_fonts():
+    """Parse ฟอนต์ทั้งหมดล่วงหน้า (เช่น ตอนเริ่ม worker process) - Returns: path ที่โหลดได้"""
+    paths = []
+    for style, relative_path in FONT_FILES.items():
+        path = os.path.join(os.getcwd(), relative_path)
+        if os.path.exists(path):
+            _load_font(path, style)
+            paths.append(path)
+    return paths
+
+
+def clear_font_cache():
+    with _font_lock:
+        _font_cache.clear()
+
+
+def register_fonts(pdf: FPDF) -> str:
+    """
+    เพิ่มฟอนต์ Sarabun (จาก registry) ให้ pdf แทน add_font()
+
+    Returns: ชื่อ font family ที่ใช้ได้ (Sarabun หรือ helvetica ถ้าไม่มีไฟล์ฟอนต์)
+    """
+    family = FALLBACK_FONT_FAMILY
+    for style, relative_path in FONT_FILES.items():
+        path = os.path.join(os.getcwd(), relative_path)
+        if not os.path.exists(path):
+            if not style:
+                return family
+            continue
+        shared, data = _load_font(path, style)
+
+        # ค่าที่ output ของ fpdf2 แก้ระหว่างเขียนไฟล์ต้องเป็นของ pdf นี้เอง
+        # (desc ได้ object id / font_name / font_file2, ttfont ถูก subset, missing_glyphs, subset)
+        # ส่วน cw / glyph_ids / cmap อ่านอย่างเดียว ใช้ร่วมกันได้
+        font = copy.copy(shared)
+        font.desc = copy.deepcopy(shared.desc)
+        font.i = len(pdf.fonts) + 1
+        font.ttfont = ttLib.TTFont(io.BytesIO(data), recalcTimestamp=False, recalcBBoxes=False, fontNumber=0, lazy=True)
+        font.missing_glyphs = []
+        reserved = "\x00 \r\n"
+        if pdf.str_alias_nb_pages:
+            reserved += "0123456789" + pdf.str_alias_nb_pages
+        font.subset = SubsetMap(font, [ord(char) for char in reserved])
+        pdf.fonts[font.fontkey] = font
+        family = FONT_FAMILY
+    return family
+
 
 class ProjectReport(FPDF):
     def __init__(self, project_name=""):
         super().__init__()
         self.project_name = project_name
-        
-        # Register Unicode Font (Sarabun supports both Latin and Thai)
-        font_path = os.path.join(os.getcwd(), "static/fonts/Sarabun-Regular.ttf")
-        bold_font_path = os.path.join(os.getcwd(), "static/fonts/Sarabun-Bold.ttf")
-        
-        if os.path.exists(font_path):
-            self.add_font("Sarabun", "", font_path)
-            if os.path.exists(bold_font_path):
-                self.add_font("Sarabun", "B", bold_font_path)
-            self.font_family_main = "Sarabun"
-        else:
-            self.font_family_main = "helvetica" # Fallback
+        self.font_family_main = register_fonts(self)
 
     def header(self):
         # Title
@@ -143,18 +210,7 @@ def generate_project_pdf(project_data: dict, output_path: str):
 def generate_onsite_consensus_pdf(report_data: dict, output_path: str):
     """Generate Onsite Consensus Report PDF matching the exact design provided"""
     pdf = FPDF()
-    
-    # Register Unicode Font (Sarabun supports both Latin and Thai)
-    font_path = os.path.join(os.getcwd(), "static/fonts/Sarabun-Regular.ttf")
-    bold_font_path = os.path.join(os.getcwd(), "static/fonts/Sarabun-Bold.ttf")
-    
-    if os.path.exists(font_path):
-        pdf.add_font("Sarabun", "", font_path)
-        if os.path.exists(bold_font_path):
-            pdf.add_font("Sarabun", "B", bold_font_path)
-        font_family = "Sarabun"
-    else:
-        font_family = "helvetica"
+    font_family = register_fonts(pdf)
 
     pdf.add_page()
     
@@ -0,0 +1,559 @@
+"""
+Report Jobs for aiD_PM
+Background generation of report files (PDF / Excel):
+- Report endpoints enqueue a job and return its id right away; a thread pool
+  renders the file outside the request (and outside the event loop)
+- Jobs are persisted in `report_jobs` (status, file, error) so status and
+  download work from any later request
+- An identical request while a job is still queued/running returns that job
+  instead of rendering the same file twice
+- Rendered files are content-addressed: the file name is a hash of the
+  report's input data plus the renderer / template version, so a report whose
+  data has not changed is served from exports/ without rendering, and
+  exports/ is kept under a size limit by evicting least recently used files
+
+Several server processes can share the queue: each job records its owner
+process, which keeps a heartbeat on it. Jobs whose owner stopped (crash or
+restart) are marked failed once the heartbeat is stale, and the client simply
+requests the report again.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import excel_engine
+import models
+import portfolio_report
+import progress_service
+import report_engine
+
+EXPORT_DIR = "exports"
+WEEKLY_TEMPLATE = "templates_excel/WeeklyReport_PH(PU).xlsx"
+# Daily Progress: ใช้เลือก layout ใน excel_engine.DAILY_LAYOUTS (ไม่ได้เปิดไฟล์ .xls)
+DAILY_TEMPLATE = "templates_excel/Daily_Progress_PH(PU).xls"
+
+# Reports rendered at the same time (per server process)
+REPORT_WORKERS = int(os.getenv("PM_REPORT_WORKERS", "2"))
+# Owners refresh their jobs every HEARTBEAT_SECONDS; a job without a heartbeat for
+# STALE_SECONDS belongs to a stopped process and is marked failed
+HEARTBEAT_SECONDS = int(os.getenv("PM_REPORT_HEARTBEAT", "10"))
+STALE_SECONDS = HEARTBEAT_SECONDS * 3
+# Identifies this server process as job owner
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+PDF_MEDIA_TYPE = "application/pdf"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_MEDIA_TYPE = "application/zip"
+
+# Size limit of exports/ (least recently used files are removed first)
+CACHE_MAX_BYTES = int(os.getenv("PM_REPORT_CACHE_MB", "500")) * 1024 * 1024
+# Bump to invalidate every cached report (e.g. after changing the data builders)
+ARTIFACT_VERSION = 1
+
+
+class ReportKind(NamedTuple):
+    collect: Callable[..., any]            # collect(db, **params) -> data
+    render: Callable[[any, str], any]      # render(data, output_path)
+    filename: str                          # download name, formatted with params + timestamp
+    suffix: str
+    media_type: str
+    sources: Tuple[str, ...] = ()          # engine / template files that shape the output
+    # fingerprint(db, **params) -> str: cache key input computed without keeping the data
+    # in memory (collect then returns a lazy iterator that render consumes)
+    fingerprint: Optional[Callable[..., str]] = None
+
+
+JOB_KINDS: Dict[str, ReportKind] = {}
+
+
+def _timestamp() -> str:
+    return datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+
+
+# ==================== Report Builders ====================
+
+def build_project_report_data_map(db: Session, project_ids: List[int]) -> Dict[int, Dict[str, any]]:
+    """
+    ข้อมูลสำหรับ 1-page Project Performance PDF ของหลายโปรเจกต์ใน query ชุดเดียว
+    (จำนวน query คงที่ ไม่ขึ้นกับจำนวนโปรเจกต์)
+
+    Returns: {project_id: report data}
+    """
+    project_ids = list(project_ids)
+    if not project_ids:
+        return {}
+
+    projects = db.query(models.Project).filter(models.Project.id.in_(project_ids)).all()
+    summaries = progress_service.get_progress_map(db, project_ids)
+
+    task = models.Task
+    tasks_by_project = defaultdict(list)
+    for row in db.query(
+        task.id, task.project_id, task.task_name, task.planned_end, task.actual_progress,
+        task.estimated_hours, task.actual_hours, task.assigned_resource_id
+    ).filter(task.project_id.in_(project_ids)).order_by(task.id):
+        tasks_by_project[row.project_id].append(row)
+
+    assignees = defaultdict(set)
+    for task_id, resource_id in db.query(models.TaskResource.task_id, models.TaskResource.resource_id).join(
+        task, task.id == models.TaskResource.task_id
+    ).filter(task.project_id.in_(project_ids)):
+        assignees[task_id].add(resource_id)
+
+    issues_by_project = defaultdict(list)
+    for row in db.query(
+        models.Issue.project_id, models.Issue.status, models.Issue.severity, models.Issue.closed_at
+    ).filter(models.Issue.project_id.in_(project_ids)):
+        issues_by_project[row.project_id].append(row)
+
+    resource_ids = {t.assigned_resource_id for tasks in tasks_by_project.values() for t in tasks if t.assigned_resource_id}
+    resource_ids.update(r_id for r_ids in assignees.values() for r_id in r_ids)
+    resources = {
+        res.id: res for res in db.query(models.Resource).filter(models.Resource.id.in_(resource_ids))
+    } if resource_ids else {}
+
+    now_date = datetime.date.today()
+    seven_days_ago = datetime.datetime.now() - datetime.timedelta(days=7)
+    result = {}
+    for project in projects:
+        tasks = tasks_by_project[project.id]
+        issues = issues_by_project[project.id]
+
+        # 1-2. Total & Completed Tasks + Weighted Progress
+        summary = summaries[project.id]
+        overall_progress = summary["progress"]
+
+        # 3. Remaining Hours
+        remaining_hours = sum(max(0, (t.estimated_hours or 0) - (t.actual_hours or 0)) for t in tasks)
+
+        # 4. Issue Statistics (issues resolved in the last 7 days)
+        issues_open = len([i for i in issues if i.status.lower() != "closed"])
+        issues_critical = len([i for i in issues if i.severity.lower() in ["critical", "high"] and i.status.lower() != "closed"])
+        issues_resolved_week = len([i for i in issues if i.status.lower() == "closed" and i.closed_at and i.closed_at >= seven_days_ago])
+
+        # 5. Upcoming Milestones (Next 3 tasks with deadlines)
+        upcoming_tasks = [t for t in tasks if t.planned_end and t.planned_end >= now_date and (t.actual_progress or 0) < 100]
+        upcoming_tasks.sort(key=lambda x: x.planned_end)
+        milestones_data = [{
+            "name": t.task_name,
+            "due_date": t.planned_end.strftime("%Y-%m-%d"),
+            "status": "In Progress" if (t.actual_progress or 0) > 0 else "Pending"
+        } for t in upcoming_tasks[:3]]
+
+        # 6. Resource Overview: primary + multi-assign, active tasks per resource
+        active_tasks = defaultdict(int)
+        project_resource_ids = set()
+        for t in tasks:
+            task_resource_ids = assignees[t.id] | ({t.assigned_resource_id} if t.assigned_resource_id else set())
+            project_resource_ids |= task_resource_ids
+            if (t.actual_progress or 0) < 100:
+                for r_id in task_resource_ids:
+                    active_tasks[r_id] += 1
+        project_resources = [{
+            "name": resources[r_id].nickname or resources[r_id].full_name,
+            "role": resources[r_id].position or "Team Member",
+            "task_count": active_tasks[r_id]
+        } for r_id in sorted(project_resource_ids) if r_id in resources]
+
+        # 7. AI Summary
+        ai_summary = f"Project is at {overall_progress:.1f}% completion. "
+        if issues_critical > 0:
+            ai_summary += f"Urgent attention required for {issues_critical} critical issues. "
+        if any(t.planned_end and t.planned_end < now_date and (t.actual_progress or 0) < 100 for t in tasks):
+            ai_summary += "Some tasks are currently behind schedule. "
+        else:
+            ai_summary += "Scheduling appears healthy."
+
+        result[project.id] = {
+            "name": project.name,
+            "customer": project.customer or "N/A",
+            "methodology": project.methodology,
+            "is_recovery_mode": project.is_recovery_mode,
+            "progress": overall_progress,
+            "tasks_total": summary["task_count"],
+            "tasks_completed": summary["completed_tasks"],
+            "remaining_hours": remaining_hours,
+            "issues_open": issues_open,
+            "issues_critical": issues_critical,
+            "issues_resolved_week": issues_resolved_week,
+            "milestones": milestones_data,  # Keep to top 3 for 1-page
+            "resources": project_resources,
+            "ai_summary": ai_summary
+        }
+    return result
+
+
+def build_project_report_data(db: Session, project_id: int) -> Dict[str, any]:
+    """ข้อมูลสำหรับ 1-page Project Performance PDF"""
+    return build_project_report_data_map(db, [project_id])[project_id]
+
+
+def build_portfolio_report_data(db: Session) -> List[Tuple[int, Dict[str, any]]]:
+    """ข้อมูล Project Performance PDF ของทุกโปรเจกต์ที่ active: [(project_id, report data)]"""
+    data = build_project_report_data_map(db, portfolio_report.active_project_ids(db))
+    return sorted(data.items())
+
+
+def build_onsite_report_data(db: Session, project_id: int, report_id: int) -> Dict[str, any]:
+    """ข้อมูลสำหรับ Onsite / Consensus PDF"""
+    report = db.query(models.OnsiteReport).filter(
+        models.OnsiteReport.id == report_id,
+        models.OnsiteReport.project_id == project_id
+    ).first()
+
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    customer_profile = db.query(models.CompanyProfile).filter(
+        models.CompanyProfile.project_id == project_id,
+        models.CompanyProfile.profile_type == "customer"
+    ).first()
+    responder_profile = db.query(models.CompanyProfile).filter(
+        models.CompanyProfile.project_id == project_id,
+        models.CompanyProfile.profile_type == "responder"
+    ).first()
+
+    # Get selected tasks and functions
+    selected_tasks = []
+    if report.selected_task_ids:
+        selected_tasks = db.query(models.Task).filter(
+            models.Task.id.in_(report.selected_task_ids)
+        ).all()
+
+    selected_functions = []
+    if report.selected_function_ids:
+        selected_functions = db.query(models.ProjectFunction).filter(
+            models.ProjectFunction.id.in_(report.selected_function_ids)
+        ).all()
+
+    return {
+        "project_name": project.name,
+        "customer_profile": customer_profile,
+        "responder_profile": responder_profile,
+        "selected_tasks": selected_tasks,
+        "selected_functions": selected_functions,
+        "description": report.description,
+        "customer_signature_name": report.customer_signature_name,
+        "responder_signature_name": report.responder_signature_name,
+        "report_date": report.report_date
+    }
+
+
+JOB_KINDS.update({
+    "project_pdf": ReportKind(
+        build_project_report_data, report_engine.generate_project_pdf,
+        "ProjectReport_{project_id}_{timestamp}.pdf", ".pdf", PDF_MEDIA_TYPE, (report_engine.__file__,)
+    ),
+    "onsite_pdf": ReportKind(
+        build_onsite_report_data, report_engine.generate_onsite_consensus_pdf,
+        "OnsiteReport_{project_id}_{report_id}_{timestamp}.pdf", ".pdf", PDF_MEDIA_TYPE, (report_engine.__file__,)
+    ),
+    "portfolio_pdf": ReportKind(
+        build_portfolio_report_data, portfolio_report.render_portfolio,
+        "PortfolioReport_{timestamp}.zip", ".zip", ZIP_MEDIA_TYPE, (report_engine.__file__,)
+    ),
+    "weekly_excel": ReportKind(
+        excel_engine.collect_weekly_data,
+        lambda snapshots, output_path: excel_engine.render_weekly_report(snapshots, WEEKLY_TEMPLATE, output_path),
+        "WeeklyReport_Project_{project_id}_{timestamp}.xlsx", ".xlsx", XLSX_MEDIA_TYPE,
+        (excel_engine.__file__, WEEKLY_TEMPLATE)
+    ),
+    "daily_excel": ReportKind(
+        excel_engine.collect_daily_data,
+        lambda data, output_path: excel_engine.render_daily_progress(data, DAILY_TEMPLATE, output_path),
+        "DailyProgress_Project_{project_id}_{timestamp}.xlsx", ".xlsx", XLSX_MEDIA_TYPE,
+        (excel_engine.__file__,), excel_engine.daily_data_digest
+    ),
+})
+
+
+# ==================== Artifact Cache ====================
+# ไฟล์ใน exports/ ตั้งชื่อตาม hash ของข้อมูล (content-addressed) - ข้อมูลเดิม = ไฟล์เดิม
+# mtime ของไฟล์ใช้เป็นเวลาใช้งานล่าสุดสำหรับ LRU eviction
+
+_source_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def _source_digest(path: str) -> str:
+    """sha256 ของไฟล์ engine / template (cache ตาม mtime + size)"""
+    if not os.path.exists(path):
+        return "missing"
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _source_digests:
+        with open(path, "rb") as f:
+            _source_digests[key] = hashlib.sha256(f.read()).hexdigest()
+    return _source_digests[key]
+
+
+def _canonical(value):
+    """แปลงค่าที่ json ไม่รู้จัก (วันที่, ORM objects, Row) ให้ hash ได้คงที่"""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    if hasattr(value, "_asdict"):
+        return list(value)
+    mapper = getattr(type(value), "__mapper__", None)
+    if mapper is not None:
+        return {attr.key: getattr(value, attr.key) for attr in mapper.column_attrs}
+    return repr(value)
+
+
+def artifact_key(kind: str, data) -> str:
+    """Hash ของข้อมูลรายงาน + เวอร์ชันของ renderer / template + วันที่ (รายงานอ้างอิงวันนี้)"""
+    report_kind = JOB_KINDS[kind]
+    payload = json.dumps({
+        "kind": kind,
+        "version": ARTIFACT_VERSION,
+        "date": datetime.date.today(),
+        "sources": [_source_digest(path) for path in report_kind.sources],
+        "data": data,
+    }, sort_keys=True, default=_canonical)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def artifact_path(kind: str, key: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{key}{JOB_KINDS[kind].suffix}")
+
+
+def touch_artifact(path: str) -> bool:
+    """ทำเครื่องหมายว่าเพิ่งถูกใช้ (LRU) - Returns: False ถ้าไม่มีไฟล์แล้ว"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def evict_artifacts(max_bytes: int = None, keep: str = None) -> int:
+    """
+    ลบไฟล์ใน exports/ ที่ใช้ล่าสุดนานที่สุดจนขนาดรวมไม่เกิน max_bytes
+    (รวมถึงไฟล์ timestamp แบบเก่า) - Returns: จำนวนไฟล์ที่ลบ
+    """
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    files = []
+    for entry in os.scandir(EXPORT_DIR) if os.path.isdir(EXPORT_DIR) else ():
+        if entry.is_file() and not entry.name.startswith("."):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def render_report(db: Session, kind: str, **params) -> Tuple[str, bool]:
+    """
+    สร้างไฟล์รายงาน (หรือใช้ไฟล์เดิมถ้าข้อมูลไม่เปลี่ยน)
+
+    Returns: (file_path, cache_hit)
+    """
+    report_kind = JOB_KINDS[kind]
+    if report_kind.fingerprint:
+        data = None
+        path = artifact_path(kind, artifact_key(kind, report_kind.fingerprint(db, **params)))
+    else:
+        data = report_kind.collect(db, **params)
+        path = artifact_path(kind, artifact_key(kind, data))
+    if touch_artifact(path):
+        return path, True
+    if data is None:
+        data = report_kind.collect(db, **params)
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    # เขียนไฟล์ชั่วคราวก่อนแล้ว rename: ไม่มีใครเห็นไฟล์ที่เขียนไม่เสร็จ
+    tmp_path = os.path.join(EXPORT_DIR, f".{uuid.uuid4().hex}{report_kind.suffix}")
+    try:
+        report_kind.render(data, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    evict_artifacts(keep=path)
+    return path, False
+
+
+# ==================== Job Queue ====================
+
+def job_info(job: models.ReportJob) -> Dict[str, any]:
+    """สถานะของ job ในรูปแบบที่ API ส่งกลับ"""
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "filename": job.filename,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": f"/api/reports/jobs/{job.id}",
+        "download_url": f"/api/reports/jobs/{job.id}/download",
+    }
+
+
+class ReportJobQueue:
+    """
+    Thread pool ที่สร้างไฟล์รายงานจาก job ใน report_jobs
+
+    หลาย process (uvicorn --workers N) ใช้ตารางเดียวกันได้: แต่ละ job มี owner และ owner
+    ต่อเวลา heartbeat_at ให้ job ของตัวเองเป็นระยะ - job ที่ heartbeat หยุดเกิน STALE_SECONDS
+    (process ตาย / restart) ถูกปิดเป็น failed โดย process ใดก็ได้
+    การกันสร้าง job ซ้ำใช้ unique index บน active_key จึงได้ผลข้าม process
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._session_factory = None
+        self._heartbeat = None
+
+    def start(self, session_factory):
+        """เริ่ม worker pool และ heartbeat thread (เรียกซ้ำได้ จะเริ่มแค่ครั้งเดียว)"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._session_factory = session_factory
+            self._executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report-job")
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True, name="report-job-heartbeat")
+        self.beat()
+        self._heartbeat.start()
+
+    def beat(self) -> int:
+        """
+        ต่อ heartbeat ให้ job ของ process นี้ แล้วปิด job ที่ owner หยุดส่ง heartbeat
+
+        Returns: จำนวน job ที่ถูกปิดเป็น failed
+        """
+        now = datetime.datetime.now()
+        job = models.ReportJob
+        db = self._session_factory()
+        try:
+            db.query(job).filter(job.owner == PROCESS_ID, job.status.in_(ACTIVE_STATUSES)).update(
+                {"heartbeat_at": now}, synchronize_session=False
+            )
+            reaped = db.query(job).filter(
+                job.status.in_(ACTIVE_STATUSES),
+                or_(job.heartbeat_at.is_(None), job.heartbeat_at < now - datetime.timedelta(seconds=STALE_SECONDS))
+            ).update({
+                "status": FAILED,
+                "error": "Interrupted: the server process running this report stopped",
+                "active_key": None,
+                "finished_at": now,
+            }, synchronize_session=False)
+            db.commit()
+            return reaped
+        finally:
+            db.close()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                self.beat()
+            except Exception as e:
+                print(f"[REPORT-JOB HEARTBEAT ERROR] {e}")
+
+    def _active_job(self, db: Session, dedupe_key: str) -> Optional[models.ReportJob]:
+        return db.query(models.ReportJob).filter(models.ReportJob.active_key == dedupe_key).first()
+
+    def submit(self, db: Session, kind: str, **params) -> models.ReportJob:
+        """
+        สร้าง job ใหม่ (หรือคืน job เดิมที่ยัง queued/running ด้วย kind + params เดียวกัน)
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown report kind: {kind}")
+        if self._executor is None:
+            raise RuntimeError("Report job queue is not started")
+
+        dedupe_key = f"{kind}:{json.dumps(params, sort_keys=True)}"
+        now = datetime.datetime.now()
+        job = self._active_job(db, dedupe_key)
+        if job is not None:
+            if job.heartbeat_at and job.heartbeat_at >= now - datetime.timedelta(seconds=STALE_SECONDS):
+                return job
+            # job ค้างของ process ที่หยุดไปแล้ว: ปิดก่อนแล้วสร้างใหม่
+            self.beat()
+            db.expire_all()
+
+        job = models.ReportJob(
+            id=uuid.uuid4().hex, kind=kind, params=params, dedupe_key=dedupe_key, status=QUEUED,
+            filename=JOB_KINDS[kind].filename.format(timestamp=_timestamp(), **params),
+            media_type=JOB_KINDS[kind].media_type,
+            owner=PROCESS_ID, heartbeat_at=now, active_key=dedupe_key
+        )
+        # request คืนทันที: การอ่านข้อมูล / ตรวจ cache / render ทำใน worker (_run)
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # request อื่น (process ใดก็ได้) สร้าง job เดียวกันไปก่อน
+            db.rollback()
+            existing = self._active_job(db, dedupe_key)
+            if existing is None:
+                raise
+            return existing
+
+        self._executor.submit(self._run, job.id)
+        return job
+
+    def _run(self, job_id: str):
+        db = self._session_factory()
+        try:
+            job = db.query(models.ReportJob).filter(models.ReportJob.id == job_id).first()
+            if job is None or job.status != QUEUED:
+                # ถูกลบ / ถูก beat ปิดเป็น failed ไปก่อน worker ได้ทำ
+                return
+            job.status = RUNNING
+            job.started_at = datetime.datetime.now()
+            db.commit()
+
+            try:
+                file_path, _ = render_report(db, job.kind, **(job.params or {}))
+            except Exception as e:
+                db.rollback()
+                print(f"[REPORT-JOB ERROR] {job.kind} {job_id}: {e}")
+                job.status = FAILED
+                job.error = str(e)
+            else:
+                job.status = DONE
+                job.file_path = file_path
+                job.error = None  # job ที่ถูก beat ปิดไปก่อนแต่ render เสร็จ ไม่ค้าง error เดิม
+            job.active_key = None
+            job.finished_at = datetime.datetime.now()
+            db.commit()
+        finally:
+            db.close()
+
+    def get(self, db: Session, job_id: str) -> Optional[models.ReportJob]:
+        return db.query(models.ReportJob).filter(models.ReportJob.id == job_id).first()
+
+
+queue = ReportJobQueue()
@@ -0,0 +1,213 @@
+"""
+Resource Levelling Scheduler for aiD_PM
+Resource-constrained re-scheduling of a project's tasks:
+- Each resource works on one task at a time (bookings from other projects included)
+- Finish-to-start dependencies and lags are respected (critical_path)
+- Priority-queue list scheduling (serial schedule generation): among the tasks
+  whose predecessors are placed, the one with the least CPM slack goes first
+  and takes the earliest window in which all of its resources are free
+
+All arithmetic is in working days on the project's calendar (working_calendar).
+Completed tasks keep their dates and do not book resources.
+"""
+
+import bisect
+import datetime
+import heapq
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import critical_path
+import models
+import recommendation_engine
+import risk_engine
+import workload_service
+import working_calendar
+
+
+class ResourceTimeline:
+    """ช่วงเวลาที่ Resource ถูกจอง (เก็บเป็นช่วงไม่ซ้อนกัน เรียงตามวันเริ่ม, end-exclusive)"""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def first_free(self, start: int, duration: int) -> int:
+        """วันแรก >= start ที่ว่างต่อเนื่อง duration วัน"""
+        i = bisect.bisect_right(self.starts, start) - 1
+        if i >= 0 and self.ends[i] > start:
+            start = self.ends[i]
+        i += 1
+        while i < len(self.starts) and self.starts[i] < start + duration:
+            start = max(start, self.ends[i])
+            i += 1
+        return start
+
+    def book(self, start: int, end: int):
+        """จองช่วง [start, end) และรวมกับช่วงที่ติดกัน/ซ้อนกัน"""
+        if end <= start:
+            return
+        i = bisect.bisect_left(self.ends, start)
+        j = i
+        while j < len(self.starts) and self.starts[j] <= end:
+            start = min(start, self.starts[j])
+            end = max(end, self.ends[j])
+            j += 1
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+
+def _earliest_common_slot(timelines: List[ResourceTimeline], start: int, duration: int) -> int:
+    """วันแรก >= start ที่ทุก Resource ว่างพร้อมกัน duration วัน"""
+    while True:
+        moved = False
+        for timeline in timelines:
+            free = timeline.first_free(start, duration)
+            if free != start:
+                start, moved = free, True
+        if not moved:
+            return start
+
+
+def level_tasks(
+    tasks: List[models.Task],
+    dependencies: List[tuple],
+    assignments: Dict[int, set],
+    bookings: List[tuple],
+    calendar: Optional[working_calendar.WorkingCalendar] = None,
+    today: Optional[datetime.date] = None
+) -> List[Dict[str, any]]:
+    """
+    จัดตาราง Tasks ใหม่ตามข้อจำกัด Resource
+
+    Args:
+        dependencies: [(predecessor_id, successor_id, lag_days), ...]
+        assignments: {task_id: {resource_id, ...}}
+        bookings: [(resource_id, planned_start, planned_end), ...] งานที่จองไว้แล้วนอกโปรเจกต์
+        today: Tasks ที่ยังไม่เริ่มจะไม่ถูกจัดก่อนวันนี้
+
+    Returns: [{task, resource_ids, planned_start, planned_end, changed, shift_days}, ...] ตามลำดับที่จัด
+    Raises: critical_path.DependencyCycleError
+    """
+    calendar = calendar or working_calendar.DEFAULT_CALENDAR
+    today_index = calendar.working_day_index(today or datetime.date.today())
+    if not tasks:
+        return []
+
+    # Priority: CPM slack (น้อย = สำคัญกว่า), แล้ว early start
+    cpm = critical_path.compute_schedule(tasks, dependencies, calendar)["tasks"]
+
+    by_id = {task.id: task for task in tasks}
+    predecessors = defaultdict(list)
+    successors = defaultdict(list)
+    for predecessor_id, successor_id, lag in dependencies:
+        if predecessor_id in by_id and successor_id in by_id:
+            predecessors[successor_id].append((predecessor_id, lag or 0))
+            successors[predecessor_id].append(successor_id)
+
+    timelines = defaultdict(ResourceTimeline)
+    for resource_id, start, end in bookings:
+        timelines[resource_id].book(
+            calendar.working_day_index(start),
+            calendar.working_day_index(end + datetime.timedelta(days=1))
+        )
+
+    planned_starts = [t.planned_start for t in tasks if t.planned_start]
+    base = calendar.working_day_index(min(planned_starts)) if planned_starts else today_index
+
+    def priority(task_id):
+        info = cpm[task_id]
+        return (info["slack"], calendar.working_day_index(info["early_start"]), task_id)
+
+    waiting = {task_id: len(predecessors[task_id]) for task_id in by_id}
+    ready = [(priority(task_id), task_id) for task_id, count in waiting.items() if count == 0]
+    heapq.heapify(ready)
+
+    finish = {}
+    results = []
+    while ready:
+        _, task_id = heapq.heappop(ready)
+        task = by_id[task_id]
+        duration = cpm[task_id]["duration"]
+        old_start = calendar.working_day_index(task.planned_start) if task.planned_start else None
+
+        if (task.actual_progress or 0) >= 100:
+            # งานเสร็จแล้วคงวันเดิมตามที่บันทึกไว้ (แม้ตรงกับวันหยุด / ไม่มีวันที่) และไม่จอง Resource
+            if task.planned_end:
+                finish[task_id] = calendar.working_day_index(task.planned_end + datetime.timedelta(days=1))
+            else:
+                finish[task_id] = (old_start if old_start is not None else base) + duration
+            results.append({
+                "task": task,
+                "resource_ids": sorted(assignments.get(task_id, ())),
+                "planned_start": task.planned_start,
+                "planned_end": task.planned_end,
+                "changed": False,
+                "shift_days": 0,
+            })
+        else:
+            release = old_start if old_start is not None else base
+            if not task.actual_progress:
+                release = max(release, today_index)
+            for predecessor_id, lag in predecessors[task_id]:
+                release = max(release, finish[predecessor_id] + lag)
+            resources = [timelines[rid] for rid in sorted(assignments.get(task_id, ()))]
+            start = _earliest_common_slot(resources, release, duration)
+            for timeline in resources:
+                timeline.book(start, start + duration)
+
+            finish[task_id] = start + duration
+            new_start = calendar.date_of_index(start)
+            new_end = calendar.date_of_index(start + duration - 1)
+            results.append({
+                "task": task,
+                "resource_ids": sorted(assignments.get(task_id, ())),
+                "planned_start": new_start,
+                "planned_end": new_end,
+                "changed": new_start != task.planned_start or new_end != task.planned_end,
+                "shift_days": start - old_start if old_start is not None else 0,
+            })
+
+        for successor_id in successors[task_id]:
+            waiting[successor_id] -= 1
+            if waiting[successor_id] == 0:
+                heapq.heappush(ready, (priority(successor_id), successor_id))
+
+    return results
+
+
+def level_project(db: Session, project_id: int, today: Optional[datetime.date] = None) -> List[Dict[str, any]]:
+    """
+    โหลดข้อมูลโปรเจกต์ (จำนวน query คงที่) แล้วจัดตารางแบบ Resource Levelling
+
+    Raises: critical_path.DependencyCycleError
+    """
+    tasks = db.query(models.Task).filter(models.Task.project_id == project_id).order_by(models.Task.id).all()
+    dependencies = critical_path.load_dependencies(db, [project_id]).get(project_id, [])
+    assignments = workload_service.get_task_assignments(db, [t.id for t in tasks])
+    resource_ids = set().union(*assignments.values()) if assignments else set()
+    bookings = workload_service.get_resource_bookings(db, resource_ids, exclude_project_id=project_id)
+    calendar = working_calendar.get_calendar(db, project_id)
+    return level_tasks(tasks, dependencies, assignments, bookings, calendar, today)
+
+
+def apply_leveling(db: Session, results: List[Dict[str, any]]) -> int:
+    """
+    บันทึกวันที่ใหม่ด้วย ORM bulk UPDATE ครั้งเดียว (ยังไม่ commit - ผู้เรียก commit พร้อม ActivityLog)
+
+    Returns: จำนวน Tasks ที่เปลี่ยน
+    """
+    changes = [
+        {"id": r["task"].id, "planned_start": r["planned_start"], "planned_end": r["planned_end"]}
+        for r in results if r["changed"]
+    ]
+    if changes:
+        db.execute(update(models.Task), changes)
+        # bulk UPDATE by primary key ไม่ผ่าน flush hooks: แจ้ง Tasks ที่เลื่อนเอง
+        task_ids = [change["id"] for change in changes]
+        risk_engine.mark_tasks_changed(db, task_ids)
+        recommendation_engine.mark_workload_changed(db, task_ids=task_ids)
+    return len(changes)
@@ -0,0 +1,462 @@
+"""
+Risk Engine for aiD_PM
+Batch task risk scoring shared by:
+- AIAssistant.predict_risk (single task)
+- AIAssistant.generate_insights (whole project)
+- /api/ai/risk (project or all projects)
+- Persisted Task.ai_risk_score (background refresh)
+
+Schedule and progress-gap rules are evaluated with NumPy over all tasks at
+once, and resource risk uses a single pre-aggregated assignment-count map.
+Days remaining are counted in working days on each project's calendar
+(weekends and holidays excluded, see working_calendar). In projects with task
+dependencies, critical-path slack (critical_path) adds dependency risk.
+
+Persisted scores are refreshed by a background worker: in full when the date
+rolls over (schedule risk depends on today), and per task whenever a commit
+touches a task's dates, progress or assignments.
+"""
+
+import datetime
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import bindparam, event, func, inspect, or_, update
+from sqlalchemy.orm import Session
+
+import critical_path
+import models
+import working_calendar
+
+# Risk points per factor
+OVERDUE_POINTS = 40
+DUE_CRITICAL_POINTS = 30   # due within 2 days
+DUE_SOON_POINTS = 15       # due within 7 days
+GAP_HIGH_POINTS = 30       # > 30% behind expected progress
+GAP_MEDIUM_POINTS = 15     # > 15% behind expected progress
+UNASSIGNED_POINTS = 20
+DEPENDENCY_DELAY_POINTS = 25  # predecessors push early finish past planned_end
+CRITICAL_PATH_POINTS = 10     # zero slack, any slip delays the project
+
+# Task attributes that affect the risk score (holiday changes trigger a full refresh)
+RISK_TASK_FIELDS = ("planned_start", "planned_end", "actual_progress", "assigned_resource_id", "estimated_hours")
+
+# Background refresh
+CHECK_INTERVAL = 60        # seconds between date-rollover checks
+DEBOUNCE_SECONDS = 0.5     # รวบการแก้ไขที่มาติดๆ กันเป็นรอบเดียว
+
+_NO_DATE = np.iinfo(np.int64).min
+
+
+def get_assignment_counts(db: Session, project_id: Optional[int] = None, task_ids: Optional[List[int]] = None) -> Dict[int, int]:
+    """จำนวน TaskResource ของแต่ละ Task ใน 1 query (กรองตามโปรเจกต์หรือ task_ids ได้)"""
+    query = db.query(models.TaskResource.task_id, func.count(models.TaskResource.id))
+    if project_id is not None:
+        query = query.join(models.Task, models.Task.id == models.TaskResource.task_id).filter(
+            models.Task.project_id == project_id
+        )
+    if task_ids is not None:
+        if not task_ids:
+            return {}
+        query = query.filter(models.TaskResource.task_id.in_(task_ids))
+    return dict(query.group_by(models.TaskResource.task_id).all())
+
+
+def risk_level(score: float):
+    """แปลงคะแนนเป็น (risk_level, risk_color)"""
+    if score >= 70:
+        return "Critical", "red"
+    if score >= 50:
+        return "High", "orange"
+    if score >= 30:
+        return "Medium", "yellow"
+    return "Low", "green"
+
+
+def risk_recommendations(risk_factors: List[str]) -> List[str]:
+    """Generate recommendations based on risk factors"""
+    recommendations = []
+
+    for factor in risk_factors:
+        if "Overdue" in factor or "Due in" in factor:
+            recommendations.append("🎯 Consider extending deadline or adding resources")
+        if "behind schedule" in factor:
+            recommendations.append("⚡ Increase task priority and check blockers")
+        if "No resource assigned" in factor:
+            recommendations.append("👥 Assign qualified resource immediately")
+        if "Predecessors" in factor:
+            recommendations.append("🔗 Unblock or fast-track predecessor tasks")
+        if "critical path" in factor:
+            recommendations.append("🛤️ Protect this task from reassignment and scope changes")
+
+    if not recommendations:
+        recommendations.append("✅ Continue monitoring task progress")
+
+    return recommendations
+
+
+def _ordinals(dates) -> np.ndarray:
+    return np.array([d.toordinal() if d else _NO_DATE for d in dates], dtype=np.int64)
+
+
+def _working_days_remaining(tasks, end, has_end, today, calendars):
+    """จำนวนวันทำงานจาก today ถึง planned_end ตามปฏิทินของแต่ละโปรเจกต์ (ติดลบ = เลยกำหนด)"""
+    remaining = np.zeros(len(tasks), dtype=np.int64)
+    today_ord = today.toordinal()
+    project_ids = np.array([t.project_id or 0 for t in tasks], dtype=np.int64)
+
+    for project_id in np.unique(project_ids[has_end]):
+        calendar = calendars[int(project_id)] if calendars is not None else working_calendar.DEFAULT_CALENDAR
+        mask = has_end & (project_ids == project_id)
+        remaining[mask] = calendar.working_day_indices(end[mask]) - calendar.working_day_index(today)
+
+    # เลยกำหนดตามปฏิทินจริงนับอย่างน้อย 1 วัน (เช่น ครบกำหนดวันอาทิตย์ ดูวันจันทร์)
+    overdue = has_end & (end < today_ord)
+    return np.where(overdue, np.minimum(remaining, -1), remaining)
+
+
+def assess_tasks(
+    tasks: List[models.Task],
+    assignment_counts: Dict[int, int],
+    today: Optional[datetime.date] = None,
+    calendars: Optional[Dict[int, "working_calendar.WorkingCalendar"]] = None,
+    schedule: Optional[Dict[int, Dict[str, any]]] = None
+) -> List[Dict[str, any]]:
+    """
+    ประเมินความเสี่ยงของ Tasks ทั้งหมดในครั้งเดียว (vectorized)
+
+    Args:
+        calendars: {project_id: WorkingCalendar} (None = ตัดเฉพาะเสาร์-อาทิตย์)
+        schedule: ผล CPM ต่อ Task จาก critical_path.schedule_map (None = ไม่คิด dependency risk)
+
+    Returns: List of risk assessments (same order as tasks)
+    """
+    if not tasks:
+        return []
+    today = today or datetime.date.today()
+    today_ord = today.toordinal()
+
+    start = _ordinals(t.planned_start for t in tasks)
+    end = _ordinals(t.planned_end for t in tasks)
+    progress = np.array([t.actual_progress or 0.0 for t in tasks], dtype=np.float64)
+    assigned = np.array(
+        [assignment_counts.get(t.id, 0) > 0 or bool(t.assigned_resource_id) for t in tasks], dtype=bool
+    )
+
+    has_start = start != _NO_DATE
+    has_end = end != _NO_DATE
+    scores = np.zeros(len(tasks), dtype=np.int64)
+
+    # 1. Schedule Risk (working days)
+    days_remaining = _working_days_remaining(tasks, end, has_end, today, calendars)
+    overdue = has_end & (days_remaining < 0)
+    due_critical = has_end & (days_remaining >= 0) & (days_remaining <= 2)
+    due_soon = has_end & (days_remaining > 2) & (days_remaining <= 7)
+    scores += np.select([overdue, due_critical, due_soon], [OVERDUE_POINTS, DUE_CRITICAL_POINTS, DUE_SOON_POINTS], 0)
+
+    # 2. Progress Risk
+    total_duration = np.where(has_start & has_end, end - start, 0)
+    elapsed = np.where(has_start, today_ord - start, 0)
+    measurable = (total_duration > 0) & (elapsed > 0)
+    expected = np.where(measurable, elapsed / np.maximum(total_duration, 1) * 100, 0.0)
+    gap = np.where(measurable, expected - progress, 0.0)
+    gap_high = measurable & (gap > 30)
+    gap_medium = measurable & (gap > 15) & ~gap_high
+    scores += np.select([gap_high, gap_medium], [GAP_HIGH_POINTS, GAP_MEDIUM_POINTS], 0)
+
+    # 3. Resource Risk
+    scores += np.where(assigned, 0, UNASSIGNED_POINTS)
+
+    # 4. Dependency Risk (เฉพาะ Tasks ที่ยังไม่เสร็จ)
+    schedule = schedule or {}
+    open_task = progress < 100
+    dependency_delay = np.array([schedule.get(t.id, {}).get("dependency_delay", 0) for t in tasks], dtype=np.int64)
+    on_critical_path = np.array([schedule.get(t.id, {}).get("is_critical", False) for t in tasks], dtype=bool)
+    delayed = open_task & (dependency_delay > 0)
+    critical = open_task & on_critical_path
+    scores += np.where(delayed, DEPENDENCY_DELAY_POINTS, 0) + np.where(critical, CRITICAL_PATH_POINTS, 0)
+
+    results = []
+    for i, task in enumerate(tasks):
+        risk_factors = []
+        if overdue[i]:
+            risk_factors.append(f"⚠️ Overdue by {abs(int(days_remaining[i]))} working days")
+        elif due_critical[i]:
+            risk_factors.append(f"⚠️ Due in {int(days_remaining[i])} working days")
+        elif due_soon[i]:
+            risk_factors.append(f"⏰ Due in {int(days_remaining[i])} working days")
+        if gap_high[i]:
+            risk_factors.append(f"📉 {gap[i]:.0f}% behind schedule")
+        elif gap_medium[i]:
+            risk_factors.append(f"📊 {gap[i]:.0f}% behind schedule")
+        if not assigned[i]:
+            risk_factors.append("👤 No resource assigned")
+        if delayed[i]:
+            risk_factors.append(f"🔗 Predecessors push finish {int(dependency_delay[i])} working days past plan")
+        if critical[i]:
+            risk_factors.append("🛤️ On the critical path (no slack)")
+
+        score = int(scores[i])
+        level, color = risk_level(score)
+        results.append({
+            "risk_score": min(score, 100),
+            "risk_level": level,
+            "risk_color": color,
+            "risk_factors": risk_factors,
+            "recommendations": risk_recommendations(risk_factors)
+        })
+
+    return results
+
+
+def score_tasks(db: Session, tasks: List[models.Task], today: Optional[datetime.date] = None) -> List[Dict[str, any]]:
+    """ประเมินความเสี่ยงของ Tasks ที่โหลดมาแล้ว (1 query สำหรับ assignment counts)"""
+    counts = get_assignment_counts(db, task_ids=[t.id for t in tasks])
+    project_ids = {t.project_id for t in tasks}
+    calendars = working_calendar.get_calendars(db, project_ids)
+    schedule = critical_path.schedule_map(db, project_ids, calendars)
+    return assess_tasks(tasks, counts, today, calendars, schedule)
+
+
+def score_project(db: Session, project_id: Optional[int] = None, today: Optional[datetime.date] = None):
+    """
+    ประเมินความเสี่ยงของทุก Task ในโปรเจกต์ (หรือทุกโปรเจกต์ถ้า project_id เป็น None)
+
+    Returns: List of (task, risk_assessment)
+    """
+    query = db.query(models.Task)
+    if project_id is not None:
+        query = query.filter(models.Task.project_id == project_id)
+    tasks = query.all()
+
+    counts = get_assignment_counts(db, project_id=project_id)
+    project_ids = {t.project_id for t in tasks}
+    calendars = working_calendar.get_calendars(db, project_ids)
+    schedule = critical_path.schedule_map(db, project_ids, calendars)
+    return list(zip(tasks, assess_tasks(tasks, counts, today, calendars, schedule)))
+
+
+# ==================== Persisted Risk Scores ====================
+
+def refresh_risk_scores(
+    db: Session,
+    project_id: Optional[int] = None,
+    task_ids: Optional[Iterable[int]] = None,
+    today: Optional[datetime.date] = None
+) -> int:
+    """
+    คำนวณและบันทึก Task.ai_risk_score / ai_risk_computed_at
+    (ทุก Task, เฉพาะโปรเจกต์ หรือเฉพาะ task_ids) ด้วย UPDATE แบบ executemany ครั้งเดียว
+    task_ids ในโปรเจกต์ที่มี dependency จะ refresh ทั้งโปรเจกต์ (slack ของ Tasks อื่นเปลี่ยนตาม)
+
+    Returns: จำนวน Tasks ที่อัพเดท
+    """
+    query = db.query(models.Task)
+    if project_id is not None:
+        query = query.filter(models.Task.project_id == project_id)
+    if task_ids is not None:
+        task_ids = list(task_ids)
+        if not task_ids:
+            return 0
+        touched = db.query(models.Task.project_id).filter(models.Task.id.in_(task_ids)).distinct()
+        linked = critical_path.projects_with_dependencies(db, [pid for (pid,) in touched])
+        condition = models.Task.id.in_(task_ids)
+        if linked:
+            condition = or_(condition, models.Task.project_id.in_(linked))
+        query = query.filter(condition)
+    tasks = query.all()
+    if not tasks:
+        return 0
+
+    if task_ids is not None:
+        task_ids = [t.id for t in tasks]
+    counts = get_assignment_counts(db, project_id=project_id, task_ids=task_ids)
+    project_ids = {t.project_id for t in tasks}
+    calendars = working_calendar.get_calendars(db, project_ids)
+    schedule = critical_path.schedule_map(db, project_ids, calendars)
+    risks = assess_tasks(tasks, counts, today, calendars, schedule)
+
+    # UPDATE ระดับ Core ไม่ผ่าน ORM events จึงไม่กระตุ้นการ refresh ซ้ำ
+    table = models.Task.__table__
+    computed_at = datetime.datetime.now()
+    db.execute(
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(ai_risk_score=bindparam("b_score"), ai_risk_computed_at=bindparam("b_computed_at")),
+        [
+            {"b_id": task.id, "b_score": float(risk["risk_score"]), "b_computed_at": computed_at}
+            for task, risk in zip(tasks, risks)
+        ]
+    )
+    db.commit()
+    return len(tasks)
+
+
+def apply_risk_query(query, min_risk: Optional[float] = None, sort: Optional[str] = None):
+    """
+    กรอง/เรียง Task query ตามคะแนนความเสี่ยงที่บันทึกไว้
+
+    Args:
+        min_risk: แสดงเฉพาะ Tasks ที่ ai_risk_score >= min_risk
+        sort: "risk" = เสี่ยงมากไปน้อย, "risk_asc" = น้อยไปมาก
+    """
+    if min_risk is not None:
+        query = query.filter(models.Task.ai_risk_score >= min_risk)
+    if sort == "risk":
+        query = query.order_by(models.Task.ai_risk_score.desc().nulls_last(), models.Task.id)
+    elif sort == "risk_asc":
+        query = query.order_by(models.Task.ai_risk_score.asc().nulls_last(), models.Task.id)
+    return query
+
+
+class RiskRefreshWorker:
+    """Background worker ที่อัพเดทคะแนนความเสี่ยงเมื่อวันเปลี่ยนหรือเมื่อ Task ถูกแก้ไข"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending_tasks = set()
+        self._full = True          # รอบแรกคำนวณทั้งหมด
+        self._scored_date = None
+        self._thread = None
+
+    def request(self, task_ids: Iterable[int] = (), full: bool = False):
+        """ขอให้ refresh Tasks ที่ระบุ (หรือทั้งหมด) ในรอบถัดไป"""
+        with self._lock:
+            self._pending_tasks.update(tid for tid in task_ids if tid is not None)
+            self._full = self._full or full
+        self._wake.set()
+
+    def run_once(self, session_factory, today: Optional[datetime.date] = None) -> int:
+        """ประมวลผลงานที่ค้างอยู่ 1 รอบ - Returns: จำนวน Tasks ที่อัพเดท"""
+        today = today or datetime.date.today()
+        with self._lock:
+            full = self._full or self._scored_date != today
+            task_ids = self._pending_tasks
+            self._pending_tasks = set()
+            self._full = False
+
+        if not full and not task_ids:
+            return 0
+
+        db = session_factory()
+        try:
+            if full:
+                updated = refresh_risk_scores(db, today=today)
+                self._scored_date = today
+            else:
+                updated = refresh_risk_scores(db, task_ids=task_ids, today=today)
+        except Exception:
+            db.rollback()
+            self.request(task_ids, full=full)
+            raise
+        finally:
+            db.close()
+        return updated
+
+    def _run(self, session_factory):
+        while True:
+            self._wake.wait(CHECK_INTERVAL)
+            if self._wake.is_set():
+                time.sleep(DEBOUNCE_SECONDS)
+                self._wake.clear()
+            try:
+                self.run_once(session_factory)
+            except Exception as e:
+                print(f"[RISK-REFRESH ERROR] {e}")
+                time.sleep(CHECK_INTERVAL)
+
+    def start(self, session_factory):
+        """เริ่ม daemon thread (เรียกซ้ำได้ จะเริ่มแค่ครั้งเดียว)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(session_factory,), daemon=True)
+        self._thread.start()
+        self._wake.set()
+
+
+worker = RiskRefreshWorker()
+
+
+# ==================== Session Hooks ====================
+# Task ที่ต้อง refresh ถูกสะสมไว้ใน session.info และส่งให้ worker ตอน commit เท่านั้น
+
+_PENDING_KEY = "risk_engine_pending"
+
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, {"tasks": set(), "full": False})
+
+
+def _after_flush(session, flush_context):
+    pending = _pending(session)
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Holiday):
+            pending["full"] = True
+        elif isinstance(obj, models.TaskDependency):
+            state = inspect(obj)
+            pending["tasks"].update(state.attrs.predecessor_id.history.sum())
+            pending["tasks"].update(state.attrs.successor_id.history.sum())
+
+    for obj in session.new:
+        if isinstance(obj, models.Task):
+            pending["tasks"].add(obj.id)
+        elif isinstance(obj, models.TaskResource):
+            pending["tasks"].add(obj.task_id)
+
+    for obj in session.dirty:
+        if isinstance(obj, models.Task):
+            state = inspect(obj)
+            if any(state.attrs[f].history.has_changes() for f in RISK_TASK_FIELDS):
+                pending["tasks"].add(obj.id)
+        elif isinstance(obj, models.TaskResource):
+            pending["tasks"].update(inspect(obj).attrs.task_id.history.sum())
+
+    for obj in session.deleted:
+        if isinstance(obj, models.TaskResource):
+            pending["tasks"].update(inspect(obj).attrs.task_id.history.sum())
+
+
+def _do_orm_execute(orm_execute_state):
+    """UPDATE / DELETE แบบมีเงื่อนไข (ไม่รู้ว่าโดนแถวไหน) -> refresh ทั้งหมด
+    ORM bulk UPDATE by primary key (list ของ parameters) ผู้เรียกแจ้ง id เองด้วย mark_tasks_changed"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    classes = {m.class_ for m in orm_execute_state.all_mappers}
+    if models.Holiday in classes:
+        _pending(orm_execute_state.session)["full"] = True
+    elif not orm_execute_state.is_executemany and classes & {models.Task, models.TaskResource, models.TaskDependency}:
+        _pending(orm_execute_state.session)["full"] = True
+
+
+def mark_tasks_changed(session: Session, task_ids: Iterable[int] = (), full: bool = False):
+    """แจ้ง Tasks ที่ถูกเขียนแบบ bulk (ไม่ผ่าน flush) ให้ refresh หลัง commit (full = ทั้งหมด)"""
+    pending = _pending(session)
+    if full:
+        pending["full"] = True
+        pending["tasks"].clear()
+    elif not pending["full"]:
+        pending["tasks"].update(tid for tid in task_ids if tid is not None)
+
+
+def _after_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending and (pending["full"] or pending["tasks"]):
+        worker.request(pending["tasks"], full=pending["full"])
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def register_change_tracking(session_factory):
+    """ติดตั้ง hook ให้ worker รู้ว่า Task ใดต้องคำนวณความเสี่ยงใหม่"""
+    if not event.contains(session_factory, "after_flush", _after_flush):
+        event.listen(session_factory, "after_flush", _after_flush)
+        event.listen(session_factory, "do_orm_execute", _do_orm_execute)
+        event.listen(session_factory, "after_commit", _after_commit)
+        event.listen(session_factory, "after_rollback", _after_rollback)
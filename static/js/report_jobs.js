@@ -0,0 +1,37 @@
+// Report downloads run as background jobs: links marked with data-report-job
+// start (or join) a job, poll its status and then download the file.
+(function () {
+    const POLL_INTERVAL = 1000;
+
+    async function runReportJob(link) {
+        const label = link.textContent;
+        link.classList.add('opacity-60', 'pointer-events-none');
+        link.textContent = 'Preparing...';
+        try {
+            let response = await fetch(link.href);
+            let job = await response.json();
+            if (!response.ok) throw new Error(job.detail || 'Could not start report');
+
+            while (job.status === 'queued' || job.status === 'running') {
+                await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL));
+                response = await fetch(job.status_url);
+                job = await response.json();
+                if (!response.ok) throw new Error(job.detail || 'Report job not found');
+            }
+            if (job.status !== 'done') throw new Error(job.error || 'Report generation failed');
+            window.location = job.download_url;
+        } catch (error) {
+            alert(`Error generating report: ${error.message}`);
+        } finally {
+            link.textContent = label;
+            link.classList.remove('opacity-60', 'pointer-events-none');
+        }
+    }
+
+    document.addEventListener('click', event => {
+        const link = event.target.closest('a[data-report-job]');
+        if (!link) return;
+        event.preventDefault();
+        runReportJob(link);
+    });
+})();
@@ -0,0 +1,20 @@
+"""
+Test setup: the suite runs against the database in DATABASE_URL.
+
+By default it uses a throw-away SQLite file. To run it against PostgreSQL, point
+DATABASE_URL at an empty scratch database, because the tests overwrite its data:
+
+    DATABASE_URL=postgresql+psycopg2://pm:pm@localhost/pm_test python -m pytest
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# fonts / templates use paths relative to the project directory
+os.chdir(ROOT)
+
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='pm_test_'), 'pm_test.db')}"
+)
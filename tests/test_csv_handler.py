@@ -0,0 +1,83 @@
+"""CSV task import: nothing is locked or written while the upload is parsed"""
+import io
+
+import pytest
+from sqlalchemy import text
+
+import csv_handler
+import database
+import id_allocator
+import models
+
+HEADER = "Task ID,Task Name,Task Type,Weight Score,Phase,Assigned Resources,Planned Start,Planned End,Progress\n"
+
+
+@pytest.fixture
+def project_id():
+    database.init_db()
+    db = database.SessionLocal()
+    try:
+        project = models.Project(name="Import", customer="Customer")
+        db.add(project)
+        db.commit()
+        yield project.id
+    finally:
+        db.close()
+
+
+class _ConcurrentWriteUpload(io.BytesIO):
+    """Upload ที่ระหว่างถูกอ่าน (หลังผ่าน IMPORT_CHUNK_SIZE แถวไปแล้ว) มี request อื่นจอง Task ID และ commit"""
+
+    def __init__(self, data: bytes, at_read: int):
+        super().__init__(data)
+        self.reads = 0
+        self.at_read = at_read
+        self.concurrent_codes = None
+
+    def read1(self, size=-1):
+        self.reads += 1
+        if self.reads == self.at_read:
+            other = database.SessionLocal()
+            try:
+                if database.IS_SQLITE:
+                    other.execute(text("PRAGMA busy_timeout = 200"))
+                self.concurrent_codes = id_allocator.allocate_task_ids(other, "Customer", "Import")
+                other.commit()
+            finally:
+                other.close()
+        return super().read1(size)
+
+
+def _rows(count: int, bad_row: bool = False) -> bytes:
+    body = "".join(f",Task {i},Dev,1,,,20260101,20260110,0\n" for i in range(count))
+    if bad_row:
+        body += ",,Dev,1,,,20260101,20260110,0\n"
+    return (HEADER + body).encode("utf-8")
+
+
+def test_other_writes_proceed_while_upload_is_parsed(project_id):
+    rows = csv_handler.IMPORT_CHUNK_SIZE * 3
+    upload = _ConcurrentWriteUpload(_rows(rows), at_read=10)
+    db = database.SessionLocal()
+    try:
+        result = csv_handler.import_tasks_from_csv(project_id, upload, db)
+        codes = [code for (code,) in db.query(models.Task.task_id).filter(models.Task.project_id == project_id)]
+    finally:
+        db.close()
+
+    assert upload.reads > upload.at_read
+    assert upload.concurrent_codes
+    assert result["success"] and result["created_count"] == rows
+    assert len(codes) == rows and upload.concurrent_codes[0] not in codes
+
+
+def test_invalid_upload_writes_nothing(project_id):
+    db = database.SessionLocal()
+    try:
+        result = csv_handler.import_tasks_from_csv(project_id, io.BytesIO(_rows(2500, bad_row=True)), db)
+        count = db.query(models.Task).filter(models.Task.project_id == project_id).count()
+    finally:
+        db.close()
+
+    assert not result["success"] and result["error_count"] == 1
+    assert count == 0
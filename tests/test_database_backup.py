@@ -0,0 +1,106 @@
+"""Backup -> restore round-trip on the configured backend (see conftest.py)"""
+import pytest
+
+import database
+import id_allocator
+import models
+
+
+@pytest.fixture(params=["native", "snapshot"])
+def backup_path_kind(request, monkeypatch):
+    """native: SQLite backup API / snapshot: copy tables into a SQLite file (server databases)"""
+    if request.param == "native" and not database.IS_SQLITE:
+        pytest.skip("native backup is SQLite only")
+    if request.param == "snapshot":
+        # On SQLite this is the PostgreSQL stand-in: same snapshot copy, SQLite target
+        monkeypatch.setattr(database, "IS_SQLITE", False)
+    return request.param
+
+
+@pytest.fixture
+def db():
+    database.init_db()
+    session = database.SessionLocal()
+    try:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            if table.name != "schema_version":
+                session.execute(table.delete())
+        session.commit()
+        yield session
+    finally:
+        session.close()
+
+
+def _add_project(db, name: str, task_count: int) -> models.Project:
+    project = models.Project(name=name, customer="Acme")
+    db.add(project)
+    db.flush()
+    resource = models.Resource(full_name=f"{name} owner")
+    db.add(resource)
+    db.flush()
+    for task_id in id_allocator.allocate_task_ids(db, project.customer, project.name, task_count):
+        db.add(models.Task(
+            task_id=task_id, project_id=project.id, task_name=task_id, task_type="Dev",
+            weight_score=2.0, actual_progress=50.0, assigned_resource_id=resource.id
+        ))
+    db.commit()
+    return project
+
+
+def _snapshot(db):
+    return {
+        "projects": sorted((p.id, p.name, p.progress) for p in db.query(models.Project)),
+        "tasks": sorted((t.id, t.task_id, t.project_id, t.assigned_resource_id) for t in db.query(models.Task)),
+        "resources": sorted((r.id, r.full_name) for r in db.query(models.Resource)),
+    }
+
+
+def test_backup_restore_round_trip(db, backup_path_kind, tmp_path):
+    _add_project(db, "Alpha", 5)
+    _add_project(db, "Beta", 3)
+    expected = _snapshot(db)
+
+    backup_file = str(tmp_path / "backup.db")
+    database.backup_database(backup_file)
+
+    # เปลี่ยนข้อมูลหลัง backup
+    db.query(models.Task).filter(models.Task.task_id.like("ACMALP%")).delete(synchronize_session=False)
+    _add_project(db, "Gamma", 2)
+    db.close()
+
+    database.restore_database(backup_file)
+
+    restored = database.SessionLocal()
+    try:
+        assert _snapshot(restored) == expected
+    finally:
+        restored.close()
+
+
+def test_sequences_continue_after_restore(db, backup_path_kind, tmp_path):
+    project_id = _add_project(db, "Alpha", 4).id
+    max_task_pk = max(t.id for t in db.query(models.Task))
+    max_code = max(t.task_id for t in db.query(models.Task))
+
+    backup_file = str(tmp_path / "backup.db")
+    database.backup_database(backup_file)
+    db.close()
+    database.restore_database(backup_file)
+
+    session = database.SessionLocal()
+    try:
+        # id (autoincrement / PostgreSQL sequence) ต่อจากค่าที่ restore เข้ามา
+        new_project = models.Project(name="Delta")
+        session.add(new_project)
+        session.flush()
+        assert new_project.id > project_id
+
+        # Task ID ที่อ่านได้ (id_sequences) ไม่ซ้ำกับของเดิม
+        (task_code,) = id_allocator.allocate_task_ids(session, "Acme", "Alpha", 1)
+        assert task_code > max_code
+        task = models.Task(task_id=task_code, project_id=project_id, task_name="new", task_type="Dev")
+        session.add(task)
+        session.commit()
+        assert task.id > max_task_pk
+    finally:
+        session.close()
@@ -0,0 +1,41 @@
+"""recommendation_engine change tracking: bulk UPDATE by primary key does not reload everything"""
+import datetime
+
+from sqlalchemy import update
+
+import database
+import models
+import recommendation_engine
+import resource_leveling
+
+
+def test_leveling_marks_moved_tasks_without_full_reload(monkeypatch):
+    calls = []
+    monkeypatch.setattr(recommendation_engine.engine, "invalidate", lambda: calls.append("full"))
+    monkeypatch.setattr(recommendation_engine.engine, "mark_workload_dirty",
+                        lambda resource_ids, task_ids: calls.append(set(task_ids)))
+
+    database.init_db()
+    db = database.SessionLocal()
+    try:
+        project = models.Project(name="Recommend")
+        db.add(project)
+        db.flush()
+        task = models.Task(task_id=f"REC{project.id}", project_id=project.id, task_name="Task", task_type="Dev",
+                           planned_start=datetime.date(2026, 10, 5), planned_end=datetime.date(2026, 10, 6))
+        db.add(task)
+        db.commit()
+        calls.clear()
+
+        results = [{"task": task, "planned_start": datetime.date(2026, 10, 12),
+                    "planned_end": datetime.date(2026, 10, 13), "changed": True}]
+        resource_leveling.apply_leveling(db, results)
+        db.commit()
+        assert calls == [{task.id}]
+
+        calls.clear()
+        db.execute(update(models.Task).where(models.Task.id == task.id).values(weight_score=2.0))
+        db.commit()
+        assert "full" in calls
+    finally:
+        db.close()
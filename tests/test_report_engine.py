@@ -0,0 +1,61 @@
+"""report_engine: PDFs rendered concurrently from the shared font registry"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import report_engine
+
+PROJECT_DATA = {
+    "name": "ระบบบริหารโครงการ (Project Control Tower)",
+    "customer": "บริษัท ตัวอย่าง จำกัด",
+    "methodology": "Waterfall",
+    "is_recovery_mode": False,
+    "progress": 62.5,
+    "tasks_total": 120,
+    "tasks_completed": 71,
+    "issues_open": 8,
+    "issues_critical": 2,
+    "milestones": [
+        {"name": f"ส่งมอบงานงวดที่ {i} / Delivery {i}", "due_date": f"2026-1{i}-15", "status": "In Progress"}
+        for i in range(3)
+    ],
+    "resources": [{"name": f"สมชาย {i}", "role": "Developer", "task_count": i + 2} for i in range(6)],
+    "ai_summary": "Project is at 62.5% completion. Urgent attention required for 2 critical issues. ",
+}
+
+ONSITE_DATA = {
+    "project_name": PROJECT_DATA["name"],
+    "customer_profile": SimpleNamespace(company_name="บริษัท ตัวอย่าง จำกัด", address="กรุงเทพฯ 10110"),
+    "responder_profile": SimpleNamespace(company_name="aiD Co., Ltd.", address="Bangkok 10500"),
+    "selected_tasks": [SimpleNamespace(task_id=f"CUSPRO{i:03d}", task_name=f"ทดสอบระบบ {i}") for i in range(8)],
+    "selected_functions": [SimpleNamespace(function_code=f"FURE-{i:03d}", function_name=f"รายงาน {i}") for i in range(5)],
+    "description": "สรุปผลการประชุมและข้อตกลงร่วมกัน / Meeting summary and agreed actions.",
+    "customer_signature_name": "ผู้แทนลูกค้า",
+    "responder_signature_name": "ผู้จัดการโครงการ",
+}
+
+pytestmark = pytest.mark.skipif(
+    not os.path.exists(report_engine.FONT_FILES[""]), reason="Sarabun font files not available"
+)
+
+
+def test_concurrent_renders_share_font_registry(tmp_path):
+    report_engine.clear_font_cache()
+    jobs = [
+        (report_engine.generate_project_pdf, PROJECT_DATA) if i % 2 else
+        (report_engine.generate_onsite_consensus_pdf, ONSITE_DATA)
+        for i in range(16)
+    ]
+    for round_number in range(5):
+        paths = [str(tmp_path / f"{round_number}_{i}.pdf") for i in range(len(jobs))]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda job, path: job[0](job[1], path), jobs, paths))
+
+        assert results == paths
+        for path in paths:
+            with open(path, "rb") as f:
+                content = f.read()
+            assert content.startswith(b"%PDF") and content.rstrip().endswith(b"%%EOF")
+            assert report_engine.FONT_FAMILY.encode() in content
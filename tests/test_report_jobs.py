@@ -0,0 +1,75 @@
+"""Report job queue: dedupe and ownership when several server processes share report_jobs"""
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import database
+import models
+import report_jobs
+
+
+@pytest.fixture
+def db():
+    database.init_db()
+    session = database.SessionLocal()
+    try:
+        session.query(models.ReportJob).delete()
+        session.commit()
+        yield session
+    finally:
+        session.close()
+
+
+def _job(owner: str, heartbeat_at, key: str = None, status: str = report_jobs.RUNNING) -> models.ReportJob:
+    return models.ReportJob(
+        id=uuid.uuid4().hex, kind="project_pdf", params={"project_id": 1}, dedupe_key=key or uuid.uuid4().hex,
+        status=status, owner=owner, heartbeat_at=heartbeat_at, active_key=key
+    )
+
+
+def test_beat_only_reaps_jobs_without_heartbeat(db):
+    queue = report_jobs.ReportJobQueue()
+    queue._session_factory = database.SessionLocal
+    now = datetime.datetime.now()
+    stale = now - datetime.timedelta(seconds=report_jobs.STALE_SECONDS + 5)
+    mine = _job(report_jobs.PROCESS_ID, stale, "mine")
+    other_live = _job("other-host:1:abcd", now, "other")
+    other_dead = _job("other-host:2:dcba", stale, "dead")
+    db.add_all([mine, other_live, other_dead])
+    db.commit()
+
+    assert queue.beat() == 1
+
+    db.expire_all()
+    assert mine.status == report_jobs.RUNNING and mine.heartbeat_at > stale
+    assert other_live.status == report_jobs.RUNNING
+    assert other_dead.status == report_jobs.FAILED and other_dead.active_key is None
+
+
+def test_active_key_is_unique_across_processes(db):
+    db.add(_job("process-a", datetime.datetime.now(), "project_pdf:{}"))
+    db.commit()
+    db.add(_job("process-b", datetime.datetime.now(), "project_pdf:{}"))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    # job ที่จบแล้ว (active_key = NULL) ไม่กันการสร้าง job ใหม่
+    db.add_all([_job("process-a", None, None, report_jobs.DONE), _job("process-b", None, None, report_jobs.DONE)])
+    db.commit()
+
+
+def test_run_skips_jobs_that_are_gone_or_reaped(db):
+    queue = report_jobs.ReportJobQueue()
+    queue._session_factory = database.SessionLocal
+    reaped = _job("other-host:2:dcba", None, None, report_jobs.FAILED)
+    db.add(reaped)
+    db.commit()
+
+    queue._run(uuid.uuid4().hex)
+    queue._run(reaped.id)
+
+    db.expire_all()
+    assert reaped.status == report_jobs.FAILED and reaped.started_at is None
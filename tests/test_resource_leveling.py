@@ -0,0 +1,55 @@
+"""resource_leveling.level_tasks: completed tasks keep their recorded dates"""
+import datetime
+
+import models
+import resource_leveling
+
+TODAY = datetime.date(2026, 10, 1)
+
+
+def _task(task_id: int, start, end, progress: float = 0.0) -> models.Task:
+    return models.Task(
+        id=task_id, task_id=f"T{task_id}", task_name=f"Task {task_id}", task_type="Dev",
+        planned_start=start, planned_end=end, actual_progress=progress
+    )
+
+
+def _level(tasks, dependencies=(), assignments=None):
+    results = resource_leveling.level_tasks(tasks, list(dependencies), assignments or {}, [], today=TODAY)
+    return {r["task"].id: r for r in results}
+
+
+def test_completed_task_on_weekend_keeps_its_dates():
+    saturday, sunday = datetime.date(2026, 10, 3), datetime.date(2026, 10, 4)
+    results = _level([_task(1, saturday, sunday, progress=100)])
+
+    assert results[1]["planned_start"] == saturday
+    assert results[1]["planned_end"] == sunday
+    assert results[1]["changed"] is False
+    assert results[1]["shift_days"] == 0
+
+
+def test_completed_task_without_dates_is_left_alone():
+    results = _level([_task(1, None, None, progress=100)])
+
+    assert results[1]["planned_start"] is None
+    assert results[1]["planned_end"] is None
+    assert results[1]["changed"] is False
+
+
+def test_successor_follows_completed_task_recorded_end():
+    done = _task(1, datetime.date(2026, 10, 5), datetime.date(2026, 10, 9), progress=100)  # Mon..Fri
+    follow = _task(2, datetime.date(2026, 10, 6), datetime.date(2026, 10, 7))
+    results = _level([done, follow], dependencies=[(1, 2, 0)])
+
+    assert results[1]["changed"] is False
+    assert results[2]["planned_start"] == datetime.date(2026, 10, 12)
+    assert results[2]["planned_end"] == datetime.date(2026, 10, 13)
+    assert results[2]["changed"] is True
+
+
+def test_apply_leveling_skips_completed_tasks():
+    saturday, sunday = datetime.date(2026, 10, 3), datetime.date(2026, 10, 4)
+    results = resource_leveling.level_tasks([_task(1, saturday, sunday, progress=100)], [], {}, [], today=TODAY)
+
+    assert resource_leveling.apply_leveling(None, results) == 0
@@ -0,0 +1,58 @@
+"""risk_engine change tracking: which commits ask the worker for a full refresh"""
+import datetime
+
+import pytest
+from sqlalchemy import update
+
+import database
+import models
+import resource_leveling
+import risk_engine
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    calls = []
+    monkeypatch.setattr(risk_engine.worker, "request", lambda task_ids=(), full=False: calls.append((set(task_ids), full)))
+    return calls
+
+
+@pytest.fixture
+def db():
+    database.init_db()
+    session = database.SessionLocal()
+    try:
+        project = models.Project(name="Risk")
+        session.add(project)
+        session.flush()
+        session.add_all([
+            models.Task(task_id=f"RSK{project.id}-{i}", project_id=project.id, task_name=f"Task {i}", task_type="Dev",
+                        planned_start=datetime.date(2026, 10, 5), planned_end=datetime.date(2026, 10, 6))
+            for i in range(3)
+        ])
+        session.commit()
+        yield session
+    finally:
+        session.close()
+
+
+def test_bulk_update_by_primary_key_refreshes_only_marked_tasks(db, requests):
+    tasks = db.query(models.Task).order_by(models.Task.id).limit(2).all()
+    results = [
+        {"task": task, "planned_start": datetime.date(2026, 10, 12), "planned_end": datetime.date(2026, 10, 13),
+         "changed": True}
+        for task in tasks
+    ]
+    requests.clear()
+    assert resource_leveling.apply_leveling(db, results) == 2
+    db.commit()
+
+    assert requests == [({task.id for task in tasks}, False)]
+
+
+def test_criteria_update_refreshes_everything(db, requests):
+    requests.clear()
+    db.execute(update(models.Task).where(models.Task.task_type == "Dev").values(weight_score=2.0))
+    db.commit()
+
+    assert requests and requests[-1][1] is True
@@ -2,6 +2,7 @@ import csv
 from io import StringIO
 from fastapi.responses import StreamingResponse
 from fastapi import UploadFile, File
+import id_allocator
 
 @app.get("/functions/download_template")
 async def download_function_template():
@@ -34,8 +35,7 @@ async def upload_functions(
     decoded = content.decode("utf-8")
     csv_reader = csv.DictReader(StringIO(decoded))
     
-    import random
-    
+    functions = []
     for row in csv_reader:
         function_name = row.get("function_name", "").strip()
         if not function_name:
@@ -51,11 +51,8 @@ async def upload_functions(
             
         description = row.get("description", "").strip()
         
-        function_code = generate_function_code(project_id, db)
-        
         func = models.ProjectFunction(
             project_id=project_id,
-            function_code=function_code,
             function_name=function_name,
             category=category,
             priority=priority,
@@ -63,7 +60,12 @@ async def upload_functions(
             description=description,
             status="not_started"
         )
-        db.add(func)
-        
+        functions.append(func)
+    
+    # One block of function codes for the whole file
+    if functions:
+        for func, function_code in zip(functions, id_allocator.allocate_function_codes(db, len(functions))):
+            func.function_code = function_code
+        db.add_all(functions)
     db.commit()
     return RedirectResponse(url=f"/functions?project_id={project_id}", status_code=303)
@@ -0,0 +1,160 @@
+"""
+Working Calendar for aiD_PM
+Business-day arithmetic shared by:
+- AIAssistant.suggest_schedule (half-day scheduling)
+- Calendar pages (/calendar, /calendar-grid)
+- risk_engine (working days remaining)
+
+Working days are numbered in closed form: whole weeks times the number of
+working days per week plus the remainder, minus the holidays before the date
+(bisect on a sorted ordinal array). Adding N working days is the inverse of
+that numbering, so nothing walks the calendar one day at a time.
+
+Holidays come from the `holidays` table: rows with project_id NULL are public
+holidays for every project, rows with a project_id apply to that project only.
+"""
+
+import bisect
+import datetime
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+import models
+
+# Monday-Friday (date.weekday() < 5); ordinal 1 (0001-01-01) is a Monday
+WORKDAYS_PER_WEEK = 5
+
+# Half-day granularity for scheduling (AM / PM)
+SLOTS_PER_DAY = 2
+
+
+class WorkingCalendar:
+    """ปฏิทินวันทำงาน (ตัดเสาร์-อาทิตย์และวันหยุด) พร้อมการคำนวณแบบ closed form"""
+
+    def __init__(self, holidays: Iterable[datetime.date] = (), skip_weekends: bool = True):
+        self.skip_weekends = skip_weekends
+        self._workdays = WORKDAYS_PER_WEEK if skip_weekends else 7
+        # เก็บเฉพาะวันหยุดที่ตรงกับวันทำงาน (วันหยุดที่ตรงเสาร์-อาทิตย์ไม่มีผล)
+        self._holidays = sorted({
+            d.toordinal() for d in holidays if self._is_weekday_ordinal(d.toordinal())
+        })
+        self._holiday_array = np.array(self._holidays, dtype=np.int64)
+
+    # ===== Closed-form weekday arithmetic =====
+
+    def _is_weekday_ordinal(self, ordinal: int) -> bool:
+        return (ordinal - 1) % 7 < self._workdays
+
+    def _weekdays_before(self, ordinal: int) -> int:
+        weeks, rem = divmod(ordinal - 1, 7)
+        return weeks * self._workdays + min(rem, self._workdays)
+
+    def _nth_weekday(self, n: int) -> int:
+        weeks, rem = divmod(n, self._workdays)
+        return 1 + weeks * 7 + rem
+
+    # ===== Working days =====
+
+    def is_holiday(self, d: datetime.date) -> bool:
+        ordinal = d.toordinal()
+        i = bisect.bisect_left(self._holidays, ordinal)
+        return i < len(self._holidays) and self._holidays[i] == ordinal
+
+    def is_working_day(self, d: datetime.date) -> bool:
+        return self._is_weekday_ordinal(d.toordinal()) and not self.is_holiday(d)
+
+    def working_day_index(self, d: datetime.date) -> int:
+        """ลำดับวันทำงานของ d (= จำนวนวันทำงานก่อนวันที่ d)"""
+        ordinal = d.toordinal()
+        return self._weekdays_before(ordinal) - bisect.bisect_left(self._holidays, ordinal)
+
+    def date_of_index(self, index: int) -> datetime.date:
+        """วันทำงานลำดับที่ index (inverse ของ working_day_index)"""
+        ordinal = self._nth_weekday(index)
+        # เลื่อนตามจำนวนวันหยุดที่ข้าม (วนเท่ากับจำนวนวันหยุดติดกันเท่านั้น)
+        while True:
+            shifted = self._nth_weekday(index + bisect.bisect_right(self._holidays, ordinal))
+            if shifted == ordinal:
+                return datetime.date.fromordinal(ordinal)
+            ordinal = shifted
+
+    def next_working_day(self, d: datetime.date) -> datetime.date:
+        """d เองถ้าเป็นวันทำงาน ไม่เช่นนั้นวันทำงานถัดไป"""
+        return self.date_of_index(self.working_day_index(d))
+
+    def add_working_days(self, d: datetime.date, n: int) -> datetime.date:
+        """วันทำงานที่อยู่ถัดจาก next_working_day(d) ไป n วันทำงาน"""
+        return self.date_of_index(self.working_day_index(d) + n)
+
+    def working_days_between(self, start: datetime.date, end: datetime.date) -> int:
+        """จำนวนวันทำงานในช่วง [start, end) (ติดลบถ้า end < start)"""
+        return self.working_day_index(end) - self.working_day_index(start)
+
+    def working_day_indices(self, ordinals: np.ndarray) -> np.ndarray:
+        """working_day_index แบบ vectorized สำหรับ array ของ date ordinals"""
+        weeks, rem = np.divmod(ordinals - 1, 7)
+        before = weeks * self._workdays + np.minimum(rem, self._workdays)
+        return before - np.searchsorted(self._holiday_array, ordinals, side="left")
+
+    # ===== Half-day slots =====
+
+    def slot_of(self, d: datetime.date, half: int = 0) -> int:
+        """ช่องครึ่งวันของ d (half=0 เช้า, 1 บ่าย) นับจากวันทำงานถัดไปถ้า d เป็นวันหยุด"""
+        return self.working_day_index(d) * SLOTS_PER_DAY + half
+
+    def date_of_slot(self, slot: int) -> datetime.date:
+        return self.date_of_index(slot // SLOTS_PER_DAY)
+
+    @staticmethod
+    def duration_slots(days) -> int:
+        """จำนวนช่องครึ่งวันของระยะเวลา days (ปัดขึ้นเป็นครึ่งวัน, อย่างน้อย 1 ช่อง)"""
+        return max(1, math.ceil(float(days) * SLOTS_PER_DAY - 1e-9))
+
+
+DEFAULT_CALENDAR = WorkingCalendar()
+
+
+# ===== Holiday loading =====
+
+def load_holidays(db: Session, project_ids: Optional[Iterable[int]] = None) -> Dict[Optional[int], List[datetime.date]]:
+    """
+    โหลดวันหยุดใน 1 query
+
+    Returns: {None: [public holidays], project_id: [project holidays], ...}
+    """
+    query = db.query(models.Holiday.project_id, models.Holiday.holiday_date)
+    if project_ids is not None:
+        project_ids = list(project_ids)
+        query = query.filter(or_(models.Holiday.project_id.is_(None), models.Holiday.project_id.in_(project_ids)))
+
+    holidays = defaultdict(list)
+    for project_id, holiday_date in query.all():
+        holidays[project_id].append(holiday_date)
+    return holidays
+
+
+def get_calendar(db: Session, project_id: Optional[int] = None, skip_weekends: bool = True) -> WorkingCalendar:
+    """ปฏิทินของโปรเจกต์ (วันหยุดราชการ + วันหยุดเฉพาะโปรเจกต์)"""
+    holidays = load_holidays(db, [project_id] if project_id is not None else [])
+    return WorkingCalendar(holidays[None] + holidays.get(project_id, []), skip_weekends=skip_weekends)
+
+
+def get_calendars(db: Session, project_ids: Iterable[Optional[int]]) -> Dict[Optional[int], WorkingCalendar]:
+    """ปฏิทินของหลายโปรเจกต์ใน 1 query (key None = วันหยุดราชการเท่านั้น)"""
+    project_ids = {pid for pid in project_ids if pid is not None}
+    holidays = load_holidays(db, project_ids)
+    if not holidays:
+        return defaultdict(lambda: DEFAULT_CALENDAR)
+
+    public = WorkingCalendar(holidays[None])
+    calendars = defaultdict(lambda: public)
+    calendars[None] = public
+    for project_id in project_ids:
+        if holidays.get(project_id):
+            calendars[project_id] = WorkingCalendar(holidays[None] + holidays[project_id])
+    return calendars
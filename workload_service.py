@@ -0,0 +1,178 @@
+"""
+Workload Service for aiD_PM
+Per-resource workload aggregation across both assignment mechanisms:
+- Legacy single assignment (Task.assigned_resource_id)
+- Multi-assign table (TaskResource)
+
+A task assigned to a resource through both mechanisms is counted once.
+Every function runs a constant number of queries regardless of team size.
+"""
+
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, case, select, union
+from sqlalchemy.orm import Session
+import models
+
+
+def _assignment_pairs(resource_ids: Optional[List[int]] = None, task_ids: Optional[List[int]] = None):
+    """
+    Subquery ของคู่ (resource_id, task_id) ที่ไม่ซ้ำกัน จากทั้งระบบเก่าและ Multi-Assign
+    (UNION ตัดคู่ที่ซ้ำให้ในระดับ SQL)
+    """
+    legacy = select(
+        models.Task.assigned_resource_id.label("resource_id"),
+        models.Task.id.label("task_id"),
+    ).where(models.Task.assigned_resource_id.isnot(None))
+
+    multi = select(
+        models.TaskResource.resource_id.label("resource_id"),
+        models.TaskResource.task_id.label("task_id"),
+    ).where(models.TaskResource.resource_id.isnot(None), models.TaskResource.task_id.isnot(None))
+
+    if resource_ids is not None:
+        legacy = legacy.where(models.Task.assigned_resource_id.in_(resource_ids))
+        multi = multi.where(models.TaskResource.resource_id.in_(resource_ids))
+    if task_ids is not None:
+        legacy = legacy.where(models.Task.id.in_(task_ids))
+        multi = multi.where(models.TaskResource.task_id.in_(task_ids))
+
+    return union(legacy, multi).subquery("assignments")
+
+
+def _empty_counts() -> Dict[str, int]:
+    return {
+        "task_count": 0,
+        "todo_count": 0,
+        "in_progress_count": 0,
+        "completed_count": 0,
+        "open_count": 0,
+    }
+
+
+def get_workload_counts(db: Session, resource_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, int]]:
+    """
+    นับงานของแต่ละ Resource (ไม่นับซ้ำ) ใน 1 query
+
+    Returns: {resource_id: {task_count, todo_count, in_progress_count, completed_count, open_count}}
+             open_count = งานที่ยังไม่เสร็จ (actual_progress < 100)
+    """
+    if resource_ids is not None:
+        resource_ids = list(resource_ids)
+        if not resource_ids:
+            return {}
+
+    pairs = _assignment_pairs(resource_ids)
+    progress = models.Task.actual_progress
+
+    rows = db.query(
+        pairs.c.resource_id,
+        func.count(models.Task.id),
+        func.sum(case((progress == 0, 1), else_=0)),
+        func.sum(case(((progress > 0) & (progress < 100), 1), else_=0)),
+        func.sum(case((progress == 100, 1), else_=0)),
+        func.sum(case((progress < 100, 1), else_=0)),
+    ).join(models.Task, models.Task.id == pairs.c.task_id).group_by(pairs.c.resource_id).all()
+
+    result = {}
+    for resource_id, task_count, todo, in_progress, completed, open_count in rows:
+        result[resource_id] = {
+            "task_count": task_count,
+            "todo_count": int(todo or 0),
+            "in_progress_count": int(in_progress or 0),
+            "completed_count": int(completed or 0),
+            "open_count": int(open_count or 0),
+        }
+
+    if resource_ids is not None:
+        for resource_id in resource_ids:
+            result.setdefault(resource_id, _empty_counts())
+
+    return result
+
+
+def get_resource_tasks(db: Session, resource_ids: Iterable[int]) -> Dict[int, List[models.Task]]:
+    """
+    ดึง Tasks ของแต่ละ Resource (ไม่ซ้ำ) ใน 1 query
+
+    Returns: {resource_id: [Task, ...]} เรียงตาม Task.id
+    """
+    resource_ids = list(resource_ids)
+    result = {resource_id: [] for resource_id in resource_ids}
+    if not resource_ids:
+        return result
+
+    pairs = _assignment_pairs(resource_ids)
+    rows = db.query(pairs.c.resource_id, models.Task).join(
+        models.Task, models.Task.id == pairs.c.task_id
+    ).order_by(models.Task.id).all()
+
+    for resource_id, task in rows:
+        result[resource_id].append(task)
+
+    return result
+
+
+def get_workload_data(db: Session, resources: List[models.Resource]) -> List[Dict]:
+    """
+    สร้างข้อมูล Workload สำหรับหน้า /workload (Resource + Tasks + สถิติ)
+    เรียงตามจำนวนงานจากมากไปน้อย
+    """
+    resource_ids = [r.id for r in resources]
+    tasks_map = get_resource_tasks(db, resource_ids)
+    counts_map = get_workload_counts(db, resource_ids)
+
+    workload_data = []
+    for resource in resources:
+        counts = counts_map[resource.id]
+        workload_data.append({
+            'resource': resource,
+            'tasks': tasks_map[resource.id],
+            'task_count': counts['task_count'],
+            'todo_count': counts['todo_count'],
+            'in_progress_count': counts['in_progress_count'],
+            'completed_count': counts['completed_count']
+        })
+
+    workload_data.sort(key=lambda x: x['task_count'], reverse=True)
+    return workload_data
+
+
+def get_task_assignments(db: Session, task_ids: Iterable[int]) -> Dict[int, set]:
+    """
+    Resources ของแต่ละ Task (รวมทั้งระบบเก่าและ Multi-Assign) ใน 1 query
+
+    Returns: {task_id: {resource_id, ...}}
+    """
+    task_ids = list(task_ids)
+    result = {task_id: set() for task_id in task_ids}
+    if not task_ids:
+        return result
+
+    pairs = _assignment_pairs(task_ids=task_ids)
+    rows = db.query(pairs.c.task_id, pairs.c.resource_id).all()
+    for task_id, resource_id in rows:
+        result[task_id].add(resource_id)
+    return result
+
+
+def get_resource_bookings(db: Session, resource_ids: Iterable[int], exclude_project_id: Optional[int] = None) -> List:
+    """
+    งานที่ Resources ถูกจองไว้แล้ว (Tasks ที่ยังไม่เสร็จและมีวันที่ครบ) ใน 1 query
+
+    Returns: [(resource_id, planned_start, planned_end), ...]
+    """
+    resource_ids = list(resource_ids)
+    if not resource_ids:
+        return []
+
+    pairs = _assignment_pairs(resource_ids)
+    query = db.query(pairs.c.resource_id, models.Task.planned_start, models.Task.planned_end).join(
+        models.Task, models.Task.id == pairs.c.task_id
+    ).filter(
+        models.Task.actual_progress < 100,
+        models.Task.planned_start.isnot(None),
+        models.Task.planned_end.isnot(None),
+    )
+    if exclude_project_id is not None:
+        query = query.filter(models.Task.project_id != exclude_project_id)
+    return query.all()